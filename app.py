@@ -1,13 +1,57 @@
+import time
+
+# Instante de carga do módulo, antes de importar customtkinter, tkinter e
+# PIL, referência para medir o tempo de abertura
+INICIO_PROCESSO = time.perf_counter()
+
 import os
-import re
-import json
+import contextlib
 import customtkinter as ctk
-from tkinter import filedialog, messagebox, simpledialog, PhotoImage
-import glob
-from PIL import Image, ImageTk
-import base64
+from tkinter import filedialog, messagebox, simpledialog, Menu, PhotoImage, ttk
+import multiprocessing
+import re
+import sqlite3
+import subprocess
 from io import BytesIO
 import sys
+import threading
+import queue
+
+import telemetria
+from telemetria import logger, etapa
+
+from engine import (
+    ARQUIVO_SUFIXOS,
+    NOME_QUARENTENA,
+    SEPARADOR_PASTAS,
+    STATUS_VINCULADO,
+    ResultadoAnalise,
+    abrir_cache,
+    analisar,
+    caminho_cache,
+    PREFIXO_GLOB,
+    PREFIXO_REGEX,
+    carregar_sufixos,
+    compilar_regras,
+    detectar_sufixos,
+    excluir_arquivos,
+    reescrever_compactados,
+    salvar_sufixos,
+    separar_pastas,
+    validar_regra,
+    varrer_pastas,
+)
+from limites import regulador
+from monitor import ACAO_LISTAR, ACAO_QUARENTENA, Monitor
+from paginacao import TAMANHO_PAGINA, PaginacaoResultados
+from quarentena import (
+    listar_lotes,
+    mover_compactados_para_quarentena,
+    mover_para_quarentena,
+    novo_lote,
+    restaurar_lote,
+)
+from vinculos import consolidar
 
 # Logos em formato SVG (usado apenas se as imagens reais não estiverem disponíveis)
 # Logo da Sociedade (azul com forma circular e texto interno)
@@ -37,192 +81,125 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
+# Intervalo (ms) entre as leituras da fila de eventos do trabalho em segundo plano
+INTERVALO_FILA_MS = 100
+
+# Intervalo (ms) entre as atualizações da taxa de E/S durante o trabalho
+INTERVALO_TAXA_MS = 1000
+
+# Largura das logos exibidas (a altura segue a proporção da imagem) e
+# atraso (ms) entre a primeira exibição da janela e a carga das imagens
+LARGURA_LOGO = 120
+ATRASO_IMAGENS_MS = 50
+
+# Regras mostradas no label de sufixos antes de resumir o restante e
+# sufixos detectados oferecidos na janela de seleção
+SUFIXOS_VISIVEIS = 10
+SUFIXOS_DETECTADOS_VISIVEIS = 50
+
+# Linhas mantidas na área de informações durante o monitoramento de pastas
+LINHAS_MONITOR = 1000
+
 # Caminhos para os arquivos de imagem
 SOCIEDADE_LOGO_PATH = resource_path("Sociedade_sem pilares.png")
 EINSTEIN_LOGO_PATH = resource_path("Logo centro de serviços einstein.png")
 
+def pasta_cache_imagens():
+    """Pasta com as imagens já redimensionadas, reaproveitadas entre aberturas"""
+    return os.path.join(telemetria.pasta_dados(), "imagens")
+
+class ListaResultados(PaginacaoResultados):
+    """Lista paginada de resultados: apenas as linhas da página atual viram itens do Treeview"""
+
+    def __init__(self, parent, tamanho_pagina=TAMANHO_PAGINA):
+        super().__init__(tamanho_pagina)
+
+        self.frame = ctk.CTkFrame(parent)
+
+        # Controles de filtro e paginação
+        controles = ctk.CTkFrame(self.frame, fg_color="transparent")
+        controles.pack(fill="x", pady=(0, 5))
+
+        ctk.CTkLabel(controles, text="Mostrar:").pack(side="left", padx=(0, 5))
+        self.filtro_menu = ctk.CTkOptionMenu(
+            controles,
+            values=list(self.FILTROS),
+            command=self.filtrar,
+            width=200
+        )
+        self.filtro_menu.pack(side="left")
+
+        self.proxima_button = ctk.CTkButton(controles, text="Próxima ▶", command=self.proxima_pagina, width=100)
+        self.proxima_button.pack(side="right")
+        self.pagina_label = ctk.CTkLabel(controles, text="", width=220)
+        self.pagina_label.pack(side="right", padx=5)
+        self.anterior_button = ctk.CTkButton(controles, text="◀ Anterior", command=self.pagina_anterior, width=100)
+        self.anterior_button.pack(side="right")
+
+        # Treeview com as linhas da página atual
+        tabela = ctk.CTkFrame(self.frame, fg_color="transparent")
+        tabela.pack(fill="both", expand=True)
+
+        self.tree = ttk.Treeview(
+            tabela,
+            columns=[coluna for coluna, _, _ in self.COLUNAS],
+            show="headings",
+            selectmode="extended"
+        )
+        for coluna, titulo, largura in self.COLUNAS:
+            self.tree.heading(coluna, text=titulo, command=lambda c=coluna: self.ordenar(c))
+            self.tree.column(coluna, width=largura, anchor="e" if coluna == "tamanho" else "w")
+        self.tree.pack(side="left", fill="both", expand=True)
+
+        scrollbar = ttk.Scrollbar(tabela, orient="vertical", command=self.tree.yview)
+        scrollbar.pack(side="right", fill="y")
+        self.tree.configure(yscrollcommand=scrollbar.set)
+
+        self.renderizar()
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+
 class ExclusaoArquivosApp:
-    def __init__(self, root):
+    def __init__(self, root, perfilar=False):
         self.root = root
         self.root.title("Exclusão de Arquivos XML Duplicados")
         self.root.geometry("1100x790")
         self.root.resizable(False, False)
         
-        # Definir ícone da janela a partir do arquivo .ico, se existir
+        # Definir ícone da janela a partir do arquivo .ico, se existir; o
+        # ícone gerado por código só é desenhado depois da primeira exibição
+        self.icone = None
+        self.icone_definido = False
         ico_path = os.path.join(os.path.dirname(__file__), "logo.ico")
         if os.path.exists(ico_path):
             try:
                 self.root.iconbitmap(ico_path)
+                self.icone_definido = True
             except Exception as e:
-                print(f"Erro ao definir o ícone .ico: {e}")
-                self.set_window_icon()
-        else:
-            self.set_window_icon()
+                logger.warning(f"Erro ao definir o ícone .ico: {e}")
         
+        # Menu de diagnóstico: perfil de execução e pasta de logs
+        self.perfilar_var = ctk.BooleanVar(value=perfilar)
+        self.criar_menu()
+
         # Configuração do tema
         ctk.set_appearance_mode("light")
         ctk.set_default_color_theme("blue")
         
         # Arquivo de banco de dados de sufixos
-        self.db_file = "sufixos_duplicados.txt"
+        self.db_file = ARQUIVO_SUFIXOS
+
+        # Cache de hashes por arquivo, ao lado do arquivo de sufixos
+        self.cache_file = caminho_cache(self.db_file)
         self.sufixos = self.carregar_sufixos()
         
-        # Carregar logos embutidas no código
+        # As logos são carregadas depois que a janela aparece (carregar_imagens)
         self.logo = None
         self.small_logo = None
         self.einstein_logo = None
         
-        # Carregar logo da Sociedade (primeiro do arquivo, se não existir, usar SVG)
-        try:
-            # Primeiro tenta carregar do arquivo físico
-            if os.path.exists(SOCIEDADE_LOGO_PATH):
-                print(f"Carregando logo da Sociedade do arquivo: {SOCIEDADE_LOGO_PATH}")
-                print(f"Caminho completo: {os.path.abspath(SOCIEDADE_LOGO_PATH)}")
-                
-                # Tentar abrir a imagem
-                try:
-                    sociedade_img = Image.open(SOCIEDADE_LOGO_PATH)
-                except Exception as img_error:
-                    print(f"Erro ao abrir imagem da Sociedade: {img_error}")
-                    raise
-                
-                # Redimensionar mantendo a proporção
-                basewidth = 120
-                wpercent = (basewidth / float(sociedade_img.size[0]))
-                hsize = int((float(sociedade_img.size[1]) * float(wpercent)))
-                
-                try:
-                    sociedade_resized = sociedade_img.resize((basewidth, hsize), Image.Resampling.LANCZOS)
-                except AttributeError:
-                    # Fallback para versões mais antigas do Pillow
-                    sociedade_resized = sociedade_img.resize((basewidth, hsize), Image.LANCZOS)
-                
-                # Criar imagem CTk
-                self.logo = ctk.CTkImage(
-                    light_image=sociedade_resized,
-                    dark_image=sociedade_resized,
-                    size=(basewidth, hsize)
-                )
-                print("Logo da Sociedade carregado com sucesso!")
-            else:
-                print(f"Arquivo de logo da Sociedade não encontrado: {SOCIEDADE_LOGO_PATH}")
-                print(f"Diretório atual: {os.getcwd()}")
-                print(f"Arquivos no diretório: {os.listdir('.')}")
-                raise FileNotFoundError(f"Arquivo não encontrado: {SOCIEDADE_LOGO_PATH}")
-                
-        except Exception as e:
-            print(f"Erro ao carregar logo da Sociedade do arquivo: {e}")
-            print("Usando imagem de fallback para logo da Sociedade")
-            # Fallback para SVG ou imagem gerada
-            try:
-                # Importar librsvg se disponível para renderizar SVG
-                try:
-                    import cairosvg
-                    # Converter SVG para PNG usando cairosvg
-                    png_bytes = cairosvg.svg2png(bytestring=SOCIEDADE_LOGO_SVG.encode('utf-8'))
-                    sociedade_bytes_io = BytesIO(png_bytes)
-                    sociedade_img = Image.open(sociedade_bytes_io)
-                except ImportError:
-                    # Fallback para imagem gerada se cairosvg não estiver disponível
-                    sociedade_img = self.create_society_logo_image()
-                
-                # Redimensionar mantendo a proporção
-                basewidth = 120
-                wpercent = (basewidth / float(sociedade_img.size[0]))
-                hsize = int((float(sociedade_img.size[1]) * float(wpercent)))
-                
-                try:
-                    sociedade_resized = sociedade_img.resize((basewidth, hsize), Image.Resampling.LANCZOS)
-                except AttributeError:
-                    # Fallback para versões mais antigas do Pillow
-                    sociedade_resized = sociedade_img.resize((basewidth, hsize), Image.LANCZOS)
-                
-                # Criar imagem CTk
-                self.logo = ctk.CTkImage(
-                    light_image=sociedade_resized,
-                    dark_image=sociedade_resized,
-                    size=(basewidth, hsize)
-                )
-            except Exception as e:
-                print(f"Erro ao criar logo da Sociedade alternativo: {e}")
-                # Último recurso: criar um placeholder de imagem azul com SBS
-                self.logo = self.create_text_logo("SBS", "#1a73e8")
-        
-        # Carregar logo do Einstein (primeiro do arquivo, se não existir, usar SVG)
-        try:
-            # Primeiro tenta carregar do arquivo físico
-            if os.path.exists(EINSTEIN_LOGO_PATH):
-                print(f"Carregando logo do Einstein do arquivo: {EINSTEIN_LOGO_PATH}")
-                print(f"Caminho completo: {os.path.abspath(EINSTEIN_LOGO_PATH)}")
-                
-                # Tentar abrir a imagem
-                try:
-                    einstein_img = Image.open(EINSTEIN_LOGO_PATH)
-                except Exception as img_error:
-                    print(f"Erro ao abrir imagem do Einstein: {img_error}")
-                    raise
-                
-                # Redimensionar mantendo a proporção
-                bottom_width = 120
-                wpercent = (bottom_width / float(einstein_img.size[0]))
-                bottom_height = int((float(einstein_img.size[1]) * float(wpercent)))
-                
-                try:
-                    einstein_resized = einstein_img.resize((bottom_width, bottom_height), Image.Resampling.LANCZOS)
-                except AttributeError:
-                    # Fallback para versões mais antigas do Pillow
-                    einstein_resized = einstein_img.resize((bottom_width, bottom_height), Image.LANCZOS)
-                
-                # Criar imagem CTk
-                self.einstein_logo = ctk.CTkImage(
-                    light_image=einstein_resized,
-                    dark_image=einstein_resized,
-                    size=(bottom_width, bottom_height)
-                )
-                print("Logo do Einstein carregado com sucesso!")
-            else:
-                print(f"Arquivo de logo do Einstein não encontrado: {EINSTEIN_LOGO_PATH}")
-                print(f"Diretório atual: {os.getcwd()}")
-                print(f"Arquivos no diretório: {os.listdir('.')}")
-                raise FileNotFoundError(f"Arquivo não encontrado: {EINSTEIN_LOGO_PATH}")
-        except Exception as e:
-            print(f"Erro ao carregar logo do Einstein do arquivo: {e}")
-            print("Usando imagem de fallback para logo do Einstein")
-            # Fallback para SVG ou imagem gerada
-            try:
-                # Importar librsvg se disponível para renderizar SVG
-                try:
-                    import cairosvg
-                    # Converter SVG para PNG usando cairosvg
-                    png_bytes = cairosvg.svg2png(bytestring=EINSTEIN_LOGO_SVG.encode('utf-8'))
-                    einstein_bytes_io = BytesIO(png_bytes)
-                    einstein_img = Image.open(einstein_bytes_io)
-                except ImportError:
-                    # Fallback para imagem gerada se cairosvg não estiver disponível
-                    einstein_img = self.create_einstein_logo_image()
-                    
-                # Redimensionar mantendo a proporção
-                bottom_width = 120
-                wpercent = (bottom_width / float(einstein_img.size[0]))
-                bottom_height = int((float(einstein_img.size[1]) * float(wpercent)))
-                
-                try:
-                    einstein_resized = einstein_img.resize((bottom_width, bottom_height), Image.Resampling.LANCZOS)
-                except AttributeError:
-                    # Fallback para versões mais antigas do Pillow
-                    einstein_resized = einstein_img.resize((bottom_width, bottom_height), Image.LANCZOS)
-                
-                # Criar imagem CTk
-                self.einstein_logo = ctk.CTkImage(
-                    light_image=einstein_resized,
-                    dark_image=einstein_resized,
-                    size=(bottom_width, bottom_height)
-                )
-            except Exception as e:
-                print(f"Erro ao criar logo do Einstein alternativo: {e}")
-                # Último recurso: criar um placeholder de imagem azul com "HSE"
-                self.einstein_logo = self.create_text_logo("HSE", "#0056b3")
-        
         # Frame principal
         self.frame = ctk.CTkFrame(self.root)
         self.frame.pack(fill="both", expand=True, padx=20, pady=20)
@@ -236,10 +213,9 @@ class ExclusaoArquivosApp:
         self.header_frame.columnconfigure(1, weight=10)  # Coluna central (título)
         self.header_frame.columnconfigure(2, weight=1)  # Coluna direita (espaço vazio)
         
-        # Exibindo a logo na coluna esquerda (se foi carregada)
-        if self.logo:
-            self.logo_label = ctk.CTkLabel(self.header_frame, image=self.logo, text="")
-            self.logo_label.grid(row=0, column=0, padx=(10, 0), pady=10, sticky="w")
+        # Espaço da logo na coluna esquerda (a imagem chega em carregar_imagens)
+        self.logo_label = ctk.CTkLabel(self.header_frame, text="", width=LARGURA_LOGO)
+        self.logo_label.grid(row=0, column=0, padx=(10, 0), pady=10, sticky="w")
         
         # Título centralizado na coluna do meio
         self.title_label = ctk.CTkLabel(
@@ -256,7 +232,7 @@ class ExclusaoArquivosApp:
         # Entrada para o caminho da pasta
         self.path_entry = ctk.CTkEntry(
             self.folder_frame, 
-            placeholder_text="Caminho da pasta com arquivos XML",
+            placeholder_text="Caminho da pasta com arquivos XML (separe várias pastas com ;)",
             width=400
         )
         self.path_entry.pack(side="left", padx=(0, 10), fill="x", expand=True)
@@ -268,6 +244,60 @@ class ExclusaoArquivosApp:
             command=self.browse_folder
         )
         self.browse_button.pack(side="right")
+
+        # Botão para incluir mais uma pasta na análise
+        self.add_folder_button = ctk.CTkButton(
+            self.folder_frame,
+            text="Adicionar Pasta",
+            command=self.adicionar_pasta,
+            width=120
+        )
+        self.add_folder_button.pack(side="right", padx=(0, 10))
+
+        # Opção de varrer também as subpastas (ano/mês/CNPJ)
+        self.recursivo_var = ctk.BooleanVar(value=False)
+        self.recursivo_checkbox = ctk.CTkCheckBox(
+            self.folder_frame,
+            text="Incluir subpastas",
+            variable=self.recursivo_var
+        )
+        self.recursivo_checkbox.pack(side="right", padx=(0, 10))
+
+        # Opção de comparar também o conteúdo dos arquivos (nomes arbitrários)
+        self.conteudo_var = ctk.BooleanVar(value=False)
+        self.conteudo_checkbox = ctk.CTkCheckBox(
+            self.folder_frame,
+            text="Comparar conteúdo",
+            variable=self.conteudo_var
+        )
+        self.conteudo_checkbox.pack(side="right", padx=(0, 10))
+
+        # Opção de ler a chave de acesso (chNFe/tpEvento/nSeqEvento) do XML
+        self.chave_var = ctk.BooleanVar(value=False)
+        self.chave_checkbox = ctk.CTkCheckBox(
+            self.folder_frame,
+            text="Ler chave de acesso",
+            variable=self.chave_var
+        )
+        self.chave_checkbox.pack(side="right", padx=(0, 10))
+
+        # Opção de comparar o XML canônico (ignora espaços, ordem de atributos e declaração)
+        self.canonico_var = ctk.BooleanVar(value=False)
+        self.canonico_checkbox = ctk.CTkCheckBox(
+            self.folder_frame,
+            text="Ignorar formatação",
+            variable=self.canonico_var
+        )
+        self.canonico_checkbox.pack(side="right", padx=(0, 10))
+
+        # Opção de ler os XMLs dentro dos arquivos .zip, sem extraí-los
+        self.zip_var = ctk.BooleanVar(value=False)
+        self.zip_checkbox = ctk.CTkCheckBox(
+            self.folder_frame,
+            text="Ler arquivos ZIP",
+            variable=self.zip_var
+        )
+        self.zip_checkbox.pack(side="right", padx=(0, 10))
         
         # Frame para os sufixos
         self.sufixos_frame = ctk.CTkFrame(self.frame)
@@ -276,7 +306,7 @@ class ExclusaoArquivosApp:
         # Label para os sufixos
         self.sufixos_label = ctk.CTkLabel(
             self.sufixos_frame,
-            text=f"Sufixos de arquivos duplicados: {', '.join(self.sufixos) if self.sufixos else 'Nenhum sufixo cadastrado'}"
+            text=self.texto_sufixos()
         )
         self.sufixos_label.pack(side="left", fill="x", expand=True)
         
@@ -309,12 +339,42 @@ class ExclusaoArquivosApp:
         self.info_frame = ctk.CTkFrame(self.frame)
         self.info_frame.pack(fill="both", expand=True, padx=10, pady=10)
         
-        # Texto para mostrar informações
-        self.info_text = ctk.CTkTextbox(self.info_frame, height=300)
-        self.info_text.pack(fill="both", expand=True, padx=10, pady=10)
+        # Texto para mostrar o resumo da análise e das exclusões
+        self.info_text = ctk.CTkTextbox(self.info_frame, height=90)
+        self.info_text.pack(fill="x", padx=10, pady=(10, 5))
         self.info_text.insert("1.0", "Selecione uma pasta para analisar os arquivos XML duplicados.\n")
         self.info_text.configure(state="disabled")
-        
+
+        # Lista paginada dos arquivos analisados
+        self.lista_resultados = ListaResultados(self.info_frame)
+        self.lista_resultados.pack(fill="both", expand=True, padx=10, pady=(5, 10))
+
+        # Frame de progresso do trabalho em segundo plano
+        self.progress_frame = ctk.CTkFrame(self.frame)
+        self.progress_frame.pack(fill="x", padx=10, pady=(0, 10))
+
+        self.progress_bar = ctk.CTkProgressBar(self.progress_frame)
+        self.progress_bar.pack(side="left", fill="x", expand=True, padx=10, pady=10)
+        self.progress_bar.set(0)
+
+        # Contador de arquivos processados
+        self.progress_label = ctk.CTkLabel(self.progress_frame, text="Arquivos processados: 0", width=220)
+        self.progress_label.pack(side="left", padx=10)
+
+        # Taxa atual de arquivos e MB por segundo (e a concorrência, se adaptativa)
+        self.rate_label = ctk.CTkLabel(self.progress_frame, text="", width=260)
+        self.rate_label.pack(side="left", padx=10)
+
+        # Botão para cancelar o trabalho em andamento
+        self.cancel_button = ctk.CTkButton(
+            self.progress_frame,
+            text="Cancelar",
+            command=self.cancelar_trabalho,
+            width=120,
+            state="disabled"
+        )
+        self.cancel_button.pack(side="right", padx=10)
+
         # Botões de ação - usando grid para controle preciso do posicionamento
         self.buttons_frame = ctk.CTkFrame(self.frame)
         self.buttons_frame.pack(fill="x", padx=10, pady=10)
@@ -333,14 +393,13 @@ class ExclusaoArquivosApp:
         )
         self.analyze_button.grid(row=0, column=0, padx=20, pady=10, sticky="ew")
         
-        # Logo Einstein no centro inferior
-        if self.einstein_logo:
-            self.footer_logo_label = ctk.CTkLabel(
-                self.buttons_frame, 
-                image=self.einstein_logo, 
-                text=""
-            )
-            self.footer_logo_label.grid(row=0, column=1, padx=10, pady=10)
+        # Logo Einstein no centro inferior (a imagem chega em carregar_imagens)
+        self.footer_logo_label = ctk.CTkLabel(
+            self.buttons_frame, 
+            text="",
+            width=LARGURA_LOGO
+        )
+        self.footer_logo_label.grid(row=0, column=1, padx=10, pady=10)
         
         # Botão de exclusão à direita
         self.delete_button = ctk.CTkButton(
@@ -352,11 +411,56 @@ class ExclusaoArquivosApp:
             height=35
         )
         self.delete_button.grid(row=0, column=2, padx=20, pady=10, sticky="ew")
+
+        # Restauração do último lote de quarentena, à esquerda
+        self.restore_button = ctk.CTkButton(
+            self.buttons_frame,
+            text="Restaurar Quarentena",
+            command=self.restaurar_quarentena,
+            height=28
+        )
+        self.restore_button.grid(row=1, column=0, padx=20, pady=(0, 10), sticky="ew")
+
+        # Monitoramento das pastas até o cancelamento, no centro
+        self.monitor_button = ctk.CTkButton(
+            self.buttons_frame,
+            text="Monitorar Pastas",
+            command=self.monitorar_pastas,
+            height=28
+        )
+        self.monitor_button.grid(row=1, column=1, padx=10, pady=(0, 10))
+
+        # Com a quarentena, os arquivos são movidos para uma pasta datada
+        # dentro da pasta analisada e podem ser restaurados
+        self.quarentena_var = ctk.BooleanVar(value=True)
+        self.quarentena_checkbox = ctk.CTkCheckBox(
+            self.buttons_frame,
+            text="Mover para a quarentena em vez de excluir",
+            variable=self.quarentena_var
+        )
+        self.quarentena_checkbox.grid(row=1, column=2, padx=20, pady=(0, 10), sticky="w")
+
+        # Troca das cópias de conteúdo idêntico por links físicos, mantendo os nomes
+        self.link_button = ctk.CTkButton(
+            self.buttons_frame,
+            text="Trocar Cópias por Links",
+            command=self.vincular_duplicados,
+            height=28
+        )
+        self.link_button.grid(row=2, column=2, padx=20, pady=(0, 10), sticky="ew")
+
+        # Nome da operação em andamento, mostrado no progresso em lotes
+        self.operacao = "Exclusão"
         
-        # Armazenar arquivos encontrados
-        self.xml_files = []
-        self.files_to_delete = []
-        
+        # Armazenar o resultado da última análise
+        self.resultado = ResultadoAnalise()
+
+        # Comunicação com o trabalho em segundo plano: a thread de trabalho
+        # nunca toca nos widgets, apenas publica eventos nesta fila
+        self.fila_eventos = queue.Queue()
+        self.cancelar_evento = threading.Event()
+        self.trabalho_thread = None
+
         # Adicionar label de copyright no rodapé, centralizado
         self.copyright_label = ctk.CTkLabel(
             self.frame,
@@ -366,8 +470,182 @@ class ExclusaoArquivosApp:
         )
         self.copyright_label.pack(side="bottom", pady=(0, 5))
 
+        # Decodificar as imagens só depois que a janela já foi desenhada
+        self.root.after(ATRASO_IMAGENS_MS, self.carregar_imagens)
+
+    def criar_menu(self):
+        """Cria a barra de menus com as opções de diagnóstico"""
+        menu = Menu(self.root)
+        diagnostico = Menu(menu, tearoff=0)
+        diagnostico.add_checkbutton(label="Perfilar análise e exclusão", variable=self.perfilar_var)
+        diagnostico.add_command(label="Abrir pasta de logs", command=self.abrir_pasta_logs)
+        menu.add_cascade(label="Diagnóstico", menu=diagnostico)
+        desempenho = Menu(menu, tearoff=0)
+        desempenho.add_command(label="Limites de E/S...", command=self.configurar_limites)
+        menu.add_cascade(label="Desempenho", menu=desempenho)
+        self.root.configure(menu=menu)
+
+    def configurar_limites(self):
+        """Mostra a janela dos limites de arquivos e MB por segundo e da concorrência adaptativa"""
+        limites_window = ctk.CTkToplevel(self.root)
+        limites_window.title("Limites de E/S")
+        limites_window.geometry("460x260")
+        limites_window.grab_set()  # Modal
+
+        label = ctk.CTkLabel(
+            limites_window,
+            text="Limites para não sobrecarregar o servidor de arquivos (vazio = sem limite):"
+        )
+        label.pack(pady=10)
+
+        campos_frame = ctk.CTkFrame(limites_window)
+        campos_frame.pack(fill="x", padx=10, pady=5)
+        campos = {}
+        for linha, (chave, texto, valor) in enumerate((
+            ("arquivos", "Arquivos por segundo:", regulador.arquivos_por_segundo),
+            ("mb", "MB lidos por segundo:", regulador.mb_por_segundo),
+        )):
+            ctk.CTkLabel(campos_frame, text=texto).grid(row=linha, column=0, padx=10, pady=5, sticky="w")
+            campo = ctk.CTkEntry(campos_frame, width=120)
+            if valor:
+                campo.insert(0, f"{valor:g}")
+            campo.grid(row=linha, column=1, padx=10, pady=5, sticky="w")
+            campos[chave] = campo
+
+        adaptativo_var = ctk.BooleanVar(value=regulador.adaptativo)
+        ctk.CTkCheckBox(
+            limites_window,
+            text="Ajustar as operações simultâneas pela latência do servidor",
+            variable=adaptativo_var
+        ).pack(anchor="w", padx=20, pady=10)
+
+        def confirmar_limites():
+            valores = {}
+            for chave, campo in campos.items():
+                texto = campo.get().strip().replace(",", ".")
+                try:
+                    valores[chave] = float(texto) if texto else None
+                except ValueError:
+                    valores[chave] = -1
+                if valores[chave] is not None and valores[chave] <= 0:
+                    messagebox.showerror(
+                        "Erro", "Informe um número positivo ou deixe o campo vazio.", parent=limites_window
+                    )
+                    return
+            regulador.configurar(valores["arquivos"], valores["mb"], adaptativo_var.get())
+            limites_window.destroy()
+
+        ctk.CTkButton(limites_window, text="Aplicar", command=confirmar_limites).pack(pady=10)
+
+    def abrir_pasta_logs(self):
+        """Abre no gerenciador de arquivos a pasta do log e dos perfis gravados"""
+        pasta = os.path.dirname(telemetria.arquivo_log() or os.path.join(telemetria.pasta_log(), telemetria.NOME_LOG))
+        try:
+            os.makedirs(pasta, exist_ok=True)
+            if sys.platform == "win32":
+                os.startfile(pasta)
+            else:
+                subprocess.Popen(["open" if sys.platform == "darwin" else "xdg-open", pasta])
+        except OSError as e:
+            messagebox.showinfo("Pasta de logs", f"Não foi possível abrir a pasta ({e}).\n\n{pasta}")
+
+    def carregar_imagens(self):
+        """Carrega as logos e o ícone gerado, depois da primeira exibição da janela"""
+        self.logo = self.carregar_logo(
+            "sociedade", SOCIEDADE_LOGO_PATH, SOCIEDADE_LOGO_SVG,
+            self.create_society_logo_image, "SBS", "#1a73e8"
+        )
+        self.logo_label.configure(image=self.logo)
+
+        self.einstein_logo = self.carregar_logo(
+            "einstein", EINSTEIN_LOGO_PATH, EINSTEIN_LOGO_SVG,
+            self.create_einstein_logo_image, "HSE", "#0056b3"
+        )
+        self.footer_logo_label.configure(image=self.einstein_logo)
+
+        if not self.icone_definido:
+            self.set_window_icon()
+
+    def carregar_logo(self, nome, caminho, svg, gerar_imagem, texto, cor):
+        """Retorna a logo como CTkImage, usando a versão já redimensionada em cache se existir"""
+        from PIL import Image
+
+        # A chave inclui tamanho e data do arquivo original, então trocar a
+        # logo invalida a versão em cache
+        try:
+            info = os.stat(caminho)
+            chave = f"{nome}_{LARGURA_LOGO}_{info.st_size}_{info.st_mtime_ns}.png"
+        except OSError:
+            caminho = None
+            chave = f"{nome}_{LARGURA_LOGO}_alternativa.png"
+        em_cache = os.path.join(pasta_cache_imagens(), chave)
+
+        imagem = None
+        if os.path.exists(em_cache):
+            try:
+                imagem = Image.open(em_cache)
+                imagem.load()
+            except Exception as e:
+                logger.warning(f"Erro ao abrir logo em cache {em_cache}: {e}")
+                imagem = None
+
+        if imagem is None:
+            imagem = self.gerar_logo(caminho, svg, gerar_imagem, texto, cor)
+            self.salvar_imagem_cache(imagem, em_cache)
+
+        return ctk.CTkImage(light_image=imagem, dark_image=imagem, size=imagem.size)
+
+    def gerar_logo(self, caminho, svg, gerar_imagem, texto, cor):
+        """Abre e redimensiona a logo original ou, se não existir, gera uma alternativa"""
+        from PIL import Image
+
+        if caminho is not None:
+            try:
+                return self.redimensionar_logo(Image.open(caminho))
+            except Exception as e:
+                logger.warning(f"Erro ao abrir imagem {caminho}: {e}")
+
+        # Fallback para SVG ou imagem gerada
+        try:
+            try:
+                import cairosvg
+                # Converter SVG para PNG usando cairosvg
+                png_bytes = cairosvg.svg2png(bytestring=svg.encode('utf-8'))
+                imagem = Image.open(BytesIO(png_bytes))
+            except ImportError:
+                # Fallback para imagem gerada se cairosvg não estiver disponível
+                imagem = gerar_imagem()
+            return self.redimensionar_logo(imagem)
+        except Exception as e:
+            logger.warning(f"Erro ao criar logo alternativa: {e}")
+            # Último recurso: placeholder colorido com texto
+            return self.create_text_logo(texto, cor)
+
+    def redimensionar_logo(self, imagem):
+        """Redimensiona a imagem para LARGURA_LOGO mantendo a proporção"""
+        from PIL import Image
+
+        wpercent = (LARGURA_LOGO / float(imagem.size[0]))
+        hsize = int((float(imagem.size[1]) * float(wpercent)))
+        try:
+            return imagem.resize((LARGURA_LOGO, hsize), Image.Resampling.LANCZOS)
+        except AttributeError:
+            # Fallback para versões mais antigas do Pillow
+            return imagem.resize((LARGURA_LOGO, hsize), Image.LANCZOS)
+
+    def salvar_imagem_cache(self, imagem, destino):
+        """Grava a imagem pronta no cache (falhas apenas desativam o cache)"""
+        try:
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            temporario = f"{destino}.{os.getpid()}.tmp"
+            imagem.save(temporario, format="PNG")
+            os.replace(temporario, destino)
+        except Exception as e:
+            logger.warning(f"Não foi possível gravar a imagem em cache {destino}: {e}")
+
     def create_text_logo(self, text, color="#1a73e8"):
         """Cria uma imagem com texto como logo de fallback"""
+        from PIL import Image
         img = Image.new('RGB', (120, 120), color=color)
         # Tenta importar o módulo ImageDraw para desenhar texto
         try:
@@ -390,6 +668,7 @@ class ExclusaoArquivosApp:
         
     def create_society_logo_image(self):
         """Cria uma imagem que simula a logo da Sociedade"""
+        from PIL import Image
         img = Image.new('RGB', (120, 120), color="white")
         try:
             from PIL import ImageDraw
@@ -421,6 +700,7 @@ class ExclusaoArquivosApp:
         
     def create_einstein_logo_image(self):
         """Cria uma imagem que simula a logo do Einstein"""
+        from PIL import Image
         img = Image.new('RGB', (120, 120), color="#0056b3")
         try:
             from PIL import ImageDraw
@@ -441,141 +721,128 @@ class ExclusaoArquivosApp:
 
     def carregar_sufixos(self):
         """Carrega os sufixos do arquivo de banco de dados"""
-        if os.path.exists(self.db_file):
-            try:
-                with open(self.db_file, "r") as f:
-                    return [line.strip() for line in f if line.strip()]
-            except Exception as e:
-                print(f"Erro ao carregar sufixos: {e}")
-                return []
-        else:
-            # Criar arquivo com sufixos padrão se não existir
-            sufixos_padrao = ["-110110.xml", "-210210.xml", "-110111.xml", "-210200.xml", "-210220.xml", "-210240.xml"]
-            try:
-                with open(self.db_file, "w") as f:
-                    for sufixo in sufixos_padrao:
-                        f.write(f"{sufixo}\n")
-                return sufixos_padrao
-            except Exception as e:
-                print(f"Erro ao criar arquivo de sufixos: {e}")
-                return sufixos_padrao
+        return carregar_sufixos(self.db_file)
     
     def salvar_sufixos(self):
         """Salva os sufixos no arquivo de banco de dados"""
         try:
-            with open(self.db_file, "w") as f:
-                for sufixo in self.sufixos:
-                    f.write(f"{sufixo}\n")
+            salvar_sufixos(self.sufixos, self.db_file)
         except Exception as e:
-            print(f"Erro ao salvar sufixos: {e}")
+            logger.warning(f"Erro ao salvar sufixos: {e}")
             messagebox.showerror("Erro", f"Erro ao salvar sufixos: {e}")
 
+    def texto_sufixos(self):
+        """Texto do label de sufixos; com muitas regras, mostra apenas as primeiras"""
+        if not self.sufixos:
+            return "Sufixos de arquivos duplicados: Nenhum sufixo cadastrado"
+        texto = ", ".join(self.sufixos[:SUFIXOS_VISIVEIS])
+        if len(self.sufixos) > SUFIXOS_VISIVEIS:
+            texto += f" e mais {len(self.sufixos) - SUFIXOS_VISIVEIS}"
+        return f"Sufixos de arquivos duplicados: {texto}"
+
     def atualizar_label_sufixos(self):
         """Atualiza o label que mostra os sufixos cadastrados"""
-        texto = f"Sufixos de arquivos duplicados: {', '.join(self.sufixos) if self.sufixos else 'Nenhum sufixo cadastrado'}"
-        self.sufixos_label.configure(text=texto)
+        self.sufixos_label.configure(text=self.texto_sufixos())
 
     def detectar_sufixos(self):
-        """Detecta padrões de sufixos nos arquivos XML da pasta selecionada"""
-        folder_path = self.path_entry.get()
-        if not folder_path or not os.path.isdir(folder_path):
-            messagebox.showerror("Erro", "Selecione uma pasta válida primeiro.")
+        """Detecta padrões de sufixos nos arquivos XML das pastas selecionadas em segundo plano"""
+        if self.trabalho_em_andamento():
             return
-            
-        # Buscar por arquivos XML na pasta
-        xml_files = glob.glob(os.path.join(folder_path, "*.xml"))
-        if not xml_files:
-            messagebox.showinfo("Aviso", "Não foram encontrados arquivos XML na pasta selecionada.")
+        pastas = self.obter_pastas()
+        if not pastas:
             return
-            
-        # Analisar nomes de arquivos para identificar padrões de sufixos
-        file_names = [os.path.basename(f) for f in xml_files]
-        
-        # Tentar detectar padrões usando expressões regulares
-        # Buscar por padrões como -NNNNNN.xml, onde N são dígitos
-        sufixos_encontrados = set()
-        padrao = re.compile(r'(.+?)(-\d+\.xml)$')
-        
-        # Dicionário para agrupar arquivos por nome base
-        arquivos_agrupados = {}
-        
-        for nome in file_names:
-            match = padrao.match(nome)
-            if match:
-                nome_base = match.group(1)
-                sufixo = match.group(2)
-                
-                if nome_base not in arquivos_agrupados:
-                    arquivos_agrupados[nome_base] = []
-                
-                arquivos_agrupados[nome_base].append(sufixo)
-        
-        # Para cada grupo com mais de um arquivo, identificar sufixos potenciais
-        for nome_base, sufixos in arquivos_agrupados.items():
-            if len(sufixos) > 1:
-                sufixos_encontrados.update(sufixos)
-        
-        # Atualizar a lista de sufixos
-        if sufixos_encontrados:
-            # Perguntar ao usuário quais sufixos ele deseja adicionar
-            sufixos_window = ctk.CTkToplevel(self.root)
-            sufixos_window.title("Sufixos Detectados")
-            sufixos_window.geometry("500x400")
-            sufixos_window.grab_set()  # Modal
-            
-            # Label de instrução
-            label = ctk.CTkLabel(sufixos_window, text="Selecione os sufixos a serem adicionados:")
-            label.pack(pady=10)
-            
-            # Frame para checkboxes
-            check_frame = ctk.CTkScrollableFrame(sufixos_window)
-            check_frame.pack(fill="both", expand=True, padx=10, pady=10)
-            
-            # Variáveis para as checkboxes
-            vars_sufixos = {}
-            checkboxes = []
-            
-            for sufixo in sorted(sufixos_encontrados):
-                var = ctk.BooleanVar(value=False)
-                vars_sufixos[sufixo] = var
-                checkbox = ctk.CTkCheckBox(check_frame, text=sufixo, variable=var)
-                checkbox.pack(anchor="w", pady=5)
-                checkboxes.append(checkbox)
-            
-            # Botão para confirmar adição
-            def confirmar_adicao():
-                novos_sufixos = []
-                for sufixo, var in vars_sufixos.items():
-                    if var.get():
-                        if sufixo not in self.sufixos:
-                            self.sufixos.append(sufixo)
-                            novos_sufixos.append(sufixo)
-                
-                if novos_sufixos:
-                    self.salvar_sufixos()
-                    self.atualizar_label_sufixos()
-                    mensagem = f"Sufixos adicionados: {', '.join(novos_sufixos)}"
-                    messagebox.showinfo("Sucesso", mensagem)
-                else:
-                    messagebox.showinfo("Aviso", "Nenhum sufixo novo foi adicionado.")
-                sufixos_window.destroy()
-            
-            # Botão para confirmar adição
-            confirmar_button = ctk.CTkButton(
-                sufixos_window,
-                text="Adicionar Selecionados",
-                command=confirmar_adicao
-            )
-            confirmar_button.pack(pady=10)
+        self.iniciar_trabalho(self._executar_deteccao, pastas, self.recursivo_var.get())
+
+    def _executar_deteccao(self, pastas, recursivo):
+        """Conta os sufixos presentes em grupos de arquivos (executado na thread de trabalho)"""
+        # Apenas os nomes são necessários; a varredura é refeita a cada passagem
+        detectados = detectar_sufixos(
+            lambda: (entrada.nome for entrada in varrer_pastas(pastas, recursivo)),
+            limite=SUFIXOS_DETECTADOS_VISIVEIS,
+            cancelar=self.cancelar_evento,
+            notificar=lambda *evento: self.fila_eventos.put(evento)
+        )
+        if detectados is None:
+            self.fila_eventos.put(("cancelado", "Detecção de sufixos cancelada pelo usuário."))
         else:
+            self.fila_eventos.put(("sufixos_detectados", detectados))
+
+    def mostrar_sufixos_detectados(self, detectados):
+        """Mostra os sufixos detectados, do mais ao menos frequente, para o usuário escolher"""
+        if not detectados:
             messagebox.showinfo("Aviso", "Não foi possível detectar padrões de sufixos nos arquivos.")
+            return
+
+        # Perguntar ao usuário quais sufixos ele deseja adicionar
+        sufixos_window = ctk.CTkToplevel(self.root)
+        sufixos_window.title("Sufixos Detectados")
+        sufixos_window.geometry("700x450")
+        sufixos_window.grab_set()  # Modal
+
+        # Label de instrução
+        label = ctk.CTkLabel(
+            sufixos_window,
+            text="Selecione os sufixos a serem adicionados (ordenados pela quantidade de grupos):"
+        )
+        label.pack(pady=10)
+
+        # Frame para checkboxes
+        check_frame = ctk.CTkScrollableFrame(sufixos_window)
+        check_frame.pack(fill="both", expand=True, padx=10, pady=10)
+
+        # Variáveis para as checkboxes; sufixos já cadastrados não são oferecidos
+        vars_sufixos = {}
+        for item in detectados:
+            if item.sufixo in self.sufixos:
+                continue
+            var = ctk.BooleanVar(value=False)
+            vars_sufixos[item.sufixo] = var
+            texto = f"{item.sufixo}  ({item.grupos} grupos; ex.: {', '.join(item.exemplos[:2])})"
+            checkbox = ctk.CTkCheckBox(check_frame, text=texto, variable=var)
+            checkbox.pack(anchor="w", pady=5)
+
+        if not vars_sufixos:
+            sufixos_window.destroy()
+            messagebox.showinfo("Aviso", "Todos os sufixos detectados já estão cadastrados.")
+            return
+
+        # Botão para confirmar adição
+        def confirmar_adicao():
+            novos_sufixos = [sufixo for sufixo, var in vars_sufixos.items() if var.get()]
+            if novos_sufixos:
+                self.sufixos.extend(novos_sufixos)
+                self.salvar_sufixos()
+                self.atualizar_label_sufixos()
+                mensagem = f"Sufixos adicionados: {', '.join(novos_sufixos)}"
+                messagebox.showinfo("Sucesso", mensagem)
+            else:
+                messagebox.showinfo("Aviso", "Nenhum sufixo novo foi adicionado.")
+            sufixos_window.destroy()
+
+        confirmar_button = ctk.CTkButton(
+            sufixos_window,
+            text="Adicionar Selecionados",
+            command=confirmar_adicao
+        )
+        confirmar_button.pack(pady=10)
 
     def adicionar_sufixo(self):
         """Adiciona um novo sufixo à lista de sufixos"""
-        novo_sufixo = simpledialog.askstring("Adicionar Sufixo", "Digite o sufixo para arquivos duplicados (ex: -duplicado.xml):")
+        novo_sufixo = simpledialog.askstring(
+            "Adicionar Sufixo",
+            "Digite o sufixo para arquivos duplicados (ex: -duplicado.xml),\n"
+            f"ou uma regra {PREFIXO_GLOB}*-copia*.xml ou {PREFIXO_REGEX}-\\d{{6}}\\.xml$:"
+        )
         if novo_sufixo:
+            novo_sufixo = novo_sufixo.strip()
+            if novo_sufixo.startswith((PREFIXO_GLOB, PREFIXO_REGEX)):
+                try:
+                    validar_regra(novo_sufixo)
+                except re.error as e:
+                    messagebox.showerror("Erro", f"Expressão regular inválida: {e}")
+                    return
             # Garantir que o sufixo tenha a extensão .xml
-            if not novo_sufixo.endswith(".xml"):
+            elif not novo_sufixo.endswith(".xml"):
                 novo_sufixo += ".xml"
             
             # Adicionar o sufixo se ainda não existir
@@ -651,125 +918,676 @@ class ExclusaoArquivosApp:
             self.path_entry.delete(0, "end")
             self.path_entry.insert(0, folder)
 
-    def analyze_files(self):
-        """Analisa os arquivos XML da pasta selecionada"""
-        folder_path = self.path_entry.get()
-        if not folder_path or not os.path.isdir(folder_path):
+    def adicionar_pasta(self):
+        """Acrescenta mais uma pasta às pastas já informadas no campo de caminho"""
+        folder = filedialog.askdirectory()
+        if folder:
+            pastas = separar_pastas(self.path_entry.get())
+            if folder not in pastas:
+                pastas.append(folder)
+            self.path_entry.delete(0, "end")
+            self.path_entry.insert(0, f"{SEPARADOR_PASTAS} ".join(pastas))
+
+    def obter_pastas(self):
+        """Retorna as pastas informadas no campo de caminho, ou None se alguma for inválida"""
+        pastas = separar_pastas(self.path_entry.get())
+        if not pastas:
             messagebox.showerror("Erro", "Selecione uma pasta válida primeiro.")
+            return None
+        invalidas = [pasta for pasta in pastas if not os.path.isdir(pasta)]
+        if invalidas:
+            messagebox.showerror("Erro", f"Pasta inválida: {', '.join(invalidas)}")
+            return None
+        return pastas
+
+    def analyze_files(self):
+        """Analisa os arquivos XML das pastas selecionadas em segundo plano"""
+        if self.trabalho_em_andamento():
+            return
+
+        pastas = self.obter_pastas()
+        if not pastas:
             return
             
-        if not self.sufixos:
+        # O arquivo só é relido se tiver sido alterado fora do programa
+        self.sufixos = self.carregar_sufixos()
+        self.atualizar_label_sufixos()
+
+        conteudo = self.conteudo_var.get()
+        chave_acesso = self.chave_var.get()
+        canonico = self.canonico_var.get()
+        if not self.sufixos and not conteudo and not chave_acesso and not canonico:
             messagebox.showwarning("Aviso", "Não há sufixos cadastrados. Adicione sufixos para identificar arquivos duplicados.")
             return
+        try:
+            compilar_regras(tuple(self.sufixos))
+        except re.error as e:
+            messagebox.showerror("Erro", f"Regra de sufixo inválida: {e}")
+            return
             
         # Limpar dados anteriores
-        self.xml_files = []
-        self.files_to_delete = []
+        self.resultado = ResultadoAnalise()
         
-        # Habilitar a edição do texto info
         self.info_text.configure(state="normal")
         self.info_text.delete("1.0", "end")
-        
-        # Buscar por arquivos XML na pasta
-        self.xml_files = glob.glob(os.path.join(folder_path, "*.xml"))
-        
-        if not self.xml_files:
-            self.info_text.insert("end", "Não foram encontrados arquivos XML na pasta selecionada.")
-            self.info_text.configure(state="disabled")
+        self.info_text.insert("end", f"Analisando arquivos XML em: {', '.join(pastas)}\n")
+        self.info_text.configure(state="disabled")
+        self.lista_resultados.limpar()
+
+        # A cópia dos sufixos evita que alterações feitas na interface
+        # durante a análise afetem a thread de trabalho
+        self.iniciar_trabalho(
+            self._executar_analise,
+            pastas,
+            self.recursivo_var.get(),
+            list(self.sufixos),
+            conteudo,
+            chave_acesso,
+            canonico,
+            self.zip_var.get()
+        )
+
+    def _executar_analise(self, pastas, recursivo, sufixos, conteudo=False, chave_acesso=False, canonico=False,
+                          incluir_zip=False):
+        """Busca e classifica os arquivos XML (executado na thread de trabalho)"""
+        # O cache só é usado pelas etapas que leem o conteúdo dos arquivos
+        cache = self.abrir_cache() if conteudo or chave_acesso or canonico else None
+        try:
+            resultado = analisar(
+                pastas,
+                sufixos,
+                recursivo=recursivo,
+                conteudo=conteudo,
+                chave_acesso=chave_acesso,
+                canonico=canonico,
+                incluir_zip=incluir_zip,
+                cache=cache,
+                cancelar=self.cancelar_evento,
+                notificar=lambda *evento: self.fila_eventos.put(evento)
+            )
+        finally:
+            if cache is not None:
+                cache.fechar()
+
+        if resultado is None:
+            self.fila_eventos.put(("cancelado", "Análise cancelada pelo usuário."))
+        else:
+            self.fila_eventos.put(("analise_concluida", resultado))
+
+    def abrir_cache(self):
+        """Abre o cache de análise na thread atual, ou retorna None se não for possível"""
+        return abrir_cache(self.cache_file)
+
+    def trabalho_em_andamento(self):
+        """Indica se há um trabalho em segundo plano em execução"""
+        return self.trabalho_thread is not None and self.trabalho_thread.is_alive()
+
+    def iniciar_trabalho(self, alvo, *args):
+        """Executa `alvo` em uma thread de trabalho e acompanha sua fila de eventos"""
+        self.cancelar_evento.clear()
+        self.definir_ocupado(True)
+
+        # Enquanto o total não é conhecido, a barra fica em modo indeterminado
+        self.progress_bar.configure(mode="indeterminate")
+        self.progress_bar.start()
+        self.progress_label.configure(text="Arquivos processados: 0")
+
+        # Com o perfil ligado no menu, a execução inteira roda sob cProfile e tracemalloc
+        perfilar = self.perfilar_var.get()
+        nome = alvo.__name__.replace("_executar_", "")
+
+        def executar():
+            try:
+                perfil = telemetria.Perfil(nome) if perfilar else contextlib.nullcontext()
+                with perfil:
+                    alvo(*args)
+                if perfilar and perfil.arquivos:
+                    self.fila_eventos.put(("perfil_gravado", perfil.arquivos))
+            except Exception as e:
+                self.fila_eventos.put(("erro", str(e)))
+            finally:
+                self.fila_eventos.put(("fim",))
+
+        self.trabalho_thread = threading.Thread(target=executar, daemon=True)
+        self.trabalho_thread.start()
+        self.root.after(INTERVALO_FILA_MS, self.processar_fila)
+        self.root.after(INTERVALO_TAXA_MS, self.atualizar_taxa)
+
+    def atualizar_taxa(self):
+        """Mostra a taxa de E/S do regulador enquanto o trabalho está em andamento"""
+        if not self.trabalho_em_andamento():
+            self.rate_label.configure(text="")
             return
-            
-        # Identificar arquivos para exclusão (que terminam com algum dos sufixos)
-        self.files_to_delete = [f for f in self.xml_files if any(f.endswith(suffix) for suffix in self.sufixos)]
-        
-        # Exibir informações
-        self.info_text.insert("end", f"Total de arquivos XML encontrados: {len(self.xml_files)}\n")
-        self.info_text.insert("end", f"Arquivos identificados para exclusão: {len(self.files_to_delete)}\n\n")
-        
-        # Listar todos os arquivos, marcando os que serão excluídos
-        self.info_text.insert("end", "Lista de arquivos XML:\n")
-        
-        for xml_file in sorted(self.xml_files):
-            file_name = os.path.basename(xml_file)
-            if xml_file in self.files_to_delete:
-                self.info_text.insert("end", f"[SERÁ EXCLUÍDO] {file_name}\n")
+        estado = regulador.estado()
+        texto = f"{estado.arquivos_por_segundo:.0f} arquivos/s · {estado.mb_por_segundo:.1f} MB/s"
+        if estado.concorrencia is not None:
+            texto += f" · {estado.concorrencia} de {estado.maximo} simultâneos"
+        self.rate_label.configure(text=texto)
+        self.root.after(INTERVALO_TAXA_MS, self.atualizar_taxa)
+
+    def processar_fila(self):
+        """Consome os eventos publicados pela thread de trabalho"""
+        finalizado = False
+        try:
+            while not finalizado:
+                evento = self.fila_eventos.get_nowait()
+                tipo, dados = evento[0], evento[1:]
+                if tipo == "fim":
+                    finalizado = True
+                else:
+                    self.tratar_evento(tipo, *dados)
+        except queue.Empty:
+            pass
+
+        if finalizado:
+            self.definir_ocupado(False)
+        else:
+            self.root.after(INTERVALO_FILA_MS, self.processar_fila)
+
+    def tratar_evento(self, tipo, *dados):
+        """Atualiza a interface de acordo com um evento da thread de trabalho"""
+        if tipo == "total":
+            total = dados[0]
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode="determinate")
+            self.progress_bar.set(0 if total else 1)
+        elif tipo == "progresso":
+            processados, total = dados
+            if total is None:
+                # Varredura em fluxo: o total só é conhecido ao final
+                self.progress_label.configure(text=f"Arquivos processados: {processados}")
             else:
-                self.info_text.insert("end", f"{file_name}\n")
-        
-        self.info_text.configure(state="disabled")
+                self.progress_bar.set(processados / total if total else 1)
+                self.progress_label.configure(text=f"Arquivos processados: {processados} de {total}")
+        elif tipo == "etapa":
+            self.progress_bar.configure(mode="determinate")
+            self.progress_bar.set(0)
+            self.progress_label.configure(text=dados[0])
+        elif tipo == "progresso_exclusao":
+            feitos, total, taxa = dados
+            self.progress_bar.set(feitos / total if total else 1)
+            self.progress_label.configure(text=f"{self.operacao}: {feitos} de {total} ({taxa:.0f} arquivos/s)")
+        elif tipo == "exclusao_concluida":
+            # Exportar antes das mensagens, que bloqueiam até serem fechadas
+            telemetria.exportar_prometheus()
+            self.concluir_exclusao(*dados)
+        elif tipo == "vinculos_concluidos":
+            telemetria.exportar_prometheus()
+            self.concluir_vinculos(*dados)
+        elif tipo == "restauracao_concluida":
+            telemetria.exportar_prometheus()
+            self.concluir_restauracao(*dados)
+        elif tipo == "analise_concluida":
+            self.resultado = dados[0]
+            self.info_text.configure(state="normal")
+            self.info_text.delete("1.0", "end")
+            self.info_text.insert("end", self.resultado.resumo() + "\n")
+            self.info_text.configure(state="disabled")
+            with etapa("exibicao", arquivos=len(self.resultado)):
+                self.lista_resultados.carregar(self.resultado)
+            telemetria.exportar_prometheus()
+        elif tipo == "monitor_inicio":
+            self.progress_label.configure(text=f"Monitorando as pastas ({dados[0]})...")
+        elif tipo == "monitor_arquivo":
+            self.registrar_monitoramento(*dados)
+        elif tipo == "monitor":
+            resumo = dados[0]
+            self.progress_label.configure(
+                text=f"Monitorando: {resumo['vistos']} novos, {resumo['marcados']} marcados, "
+                     f"latência p95 {resumo['latencia_p95_s']:.1f} s"
+            )
+        elif tipo == "sufixos_detectados":
+            self.mostrar_sufixos_detectados(dados[0])
+        elif tipo == "perfil_gravado":
+            self.info_text.configure(state="normal")
+            self.info_text.insert("end", f"\nPerfil gravado em: {', '.join(dados[0])}\n")
+            self.info_text.configure(state="disabled")
+        elif tipo == "cancelado":
+            self.info_text.configure(state="normal")
+            self.info_text.insert("end", f"\n{dados[0]}\n")
+            self.info_text.configure(state="disabled")
+        elif tipo == "erro":
+            messagebox.showerror("Erro", f"Erro durante o processamento: {dados[0]}")
+
+    def definir_ocupado(self, ocupado):
+        """Habilita ou desabilita os controles enquanto há trabalho em andamento"""
+        estado = "disabled" if ocupado else "normal"
+        for botao in (
+            self.analyze_button,
+            self.delete_button,
+            self.detect_sufixo_button,
+            self.add_sufixo_button,
+            self.remove_sufixo_button,
+            self.browse_button,
+            self.add_folder_button,
+            self.recursivo_checkbox,
+            self.conteudo_checkbox,
+            self.chave_checkbox,
+            self.canonico_checkbox,
+            self.zip_checkbox,
+            self.restore_button,
+            self.monitor_button,
+            self.link_button,
+            self.quarentena_checkbox,
+        ):
+            botao.configure(state=estado)
+        self.cancel_button.configure(state="normal" if ocupado else "disabled")
+
+        if not ocupado:
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode="determinate")
+
+    def cancelar_trabalho(self):
+        """Solicita o cancelamento do trabalho em segundo plano"""
+        if self.trabalho_em_andamento():
+            self.cancelar_evento.set()
+            self.progress_label.configure(text="Cancelando...")
 
     def delete_files(self):
-        """Exclui os arquivos duplicados"""
-        if not self.files_to_delete:
+        """Exclui os arquivos duplicados em segundo plano"""
+        if self.trabalho_em_andamento():
+            return
+
+        files_to_delete = self.resultado.caminhos_para_excluir()
+        if not files_to_delete:
             messagebox.showinfo("Aviso", "Não há arquivos para excluir. Execute a análise primeiro.")
             return
             
-        # Confirmar exclusão
-        resposta = messagebox.askyesno(
-            "Confirmar Exclusão", 
-            f"Tem certeza que deseja excluir {len(self.files_to_delete)} arquivos duplicados?"
-        )
-        
+        # Arquivos dentro de ZIPs saem regravando o ZIP
+        _, por_zip = self.resultado.separar_compactados(files_to_delete)
+        aviso_zip = ""
+        if por_zip:
+            aviso_zip = (
+                f"\n\n{sum(len(membros) for membros in por_zip.values())} deles estão dentro de "
+                f"{len(por_zip)} arquivos ZIP, que serão regravados sem eles."
+            )
+
+        # Confirmar exclusão ou movimentação para a quarentena
+        if self.quarentena_var.get():
+            lote = novo_lote()
+            resposta = messagebox.askyesno(
+                "Confirmar Quarentena",
+                f"Mover {len(files_to_delete)} arquivos duplicados para a quarentena?\n\n"
+                f"Eles ficarão em {NOME_QUARENTENA}{os.sep}{lote}, dentro da pasta analisada, "
+                "e podem ser devolvidos com \"Restaurar Quarentena\"." + aviso_zip
+            )
+        else:
+            lote = None
+            resposta = messagebox.askyesno(
+                "Confirmar Exclusão",
+                f"Tem certeza que deseja excluir {len(files_to_delete)} arquivos duplicados?\n\n"
+                "A exclusão não pode ser desfeita." + aviso_zip
+            )
+
         if not resposta:
             return
-            
-        # Excluir arquivos
-        excluidos = 0
-        erros = 0
-        
-        for arquivo in self.files_to_delete:
+
+        self.operacao = "Quarentena" if lote else "Exclusão"
+        self.iniciar_trabalho(self._executar_exclusao, files_to_delete, lote)
+
+    def _executar_exclusao(self, files_to_delete, lote=None):
+        """Exclui os arquivos, ou os move para o lote de quarentena, publicando progresso e resultado
+
+        Executado na thread de trabalho.
+        """
+        self.fila_eventos.put(("total", len(files_to_delete)))
+        inicio = time.perf_counter()
+        progresso = lambda feitos, total, taxa: self.fila_eventos.put(("progresso_exclusao", feitos, total, taxa))
+        # Membros de ZIPs saem regravando o ZIP, depois dos arquivos em disco
+        em_disco, por_zip = self.resultado.separar_compactados(files_to_delete)
+        if lote:
+            excluidos, erros, cancelado = mover_para_quarentena(
+                em_disco,
+                self.resultado.pastas,
+                lote,
+                cancelar=self.cancelar_evento,
+                progresso=progresso
+            )
+        else:
+            excluidos, erros, cancelado = excluir_arquivos(
+                em_disco,
+                tamanho=self.resultado.tamanho_de,
+                cancelar=self.cancelar_evento,
+                progresso=progresso
+            )
+        if por_zip and not cancelado:
+            self.fila_eventos.put(("etapa", "Regravando arquivos ZIP..."))
+            if lote:
+                membros, falhas, cancelado = mover_compactados_para_quarentena(
+                    por_zip, self.resultado.pastas, lote, cancelar=self.cancelar_evento, progresso=progresso
+                )
+            else:
+                membros, falhas, cancelado = reescrever_compactados(
+                    por_zip, cancelar=self.cancelar_evento, progresso=progresso
+                )
+            excluidos += membros
+            erros += falhas
+        duracao = time.perf_counter() - inicio
+
+        # Registros de arquivos excluídos ou movidos não serão mais usados pelo cache
+        cache = self.abrir_cache()
+        if cache is not None:
             try:
-                os.remove(arquivo)
-                excluidos += 1
-            except Exception as e:
-                print(f"Erro ao excluir {arquivo}: {e}")
-                erros += 1
+                cache.remover(excluidos)
+            except sqlite3.Error as e:
+                logger.warning(f"Erro ao atualizar o cache de análise: {e}")
+            finally:
+                cache.fechar()
+
+        self.fila_eventos.put(("exclusao_concluida", excluidos, erros, cancelado, duracao, lote))
+
+    def concluir_exclusao(self, excluidos, erros, cancelado, duracao, lote=None):
+        """Atualiza a análise e a interface com o resultado da exclusão ou da quarentena"""
+        # Atualizar a análise no lugar: só as linhas excluídas saem da lista
+        removidos = self.resultado.remover(excluidos)
+        self.lista_resultados.remover(removidos)
+
+        taxa = len(excluidos) / duracao if duracao > 0 else 0.0
+        verbo = "movidos para a quarentena" if lote else "excluídos"
                 
         # Exibir resultados
         self.info_text.configure(state="normal")
-        self.info_text.insert("end", f"\n--- RESULTADO DA EXCLUSÃO ---\n")
-        self.info_text.insert("end", f"Arquivos excluídos com sucesso: {excluidos}\n")
+        self.info_text.delete("1.0", "end")
+        self.info_text.insert("end", self.resultado.resumo() + "\n")
+        if lote:
+            self.info_text.insert("end", f"\n--- RESULTADO DA QUARENTENA ({NOME_QUARENTENA}{os.sep}{lote}) ---\n")
+        else:
+            self.info_text.insert("end", f"\n--- RESULTADO DA EXCLUSÃO ---\n")
+        if cancelado:
+            self.info_text.insert("end", f"{self.operacao} cancelada pelo usuário.\n")
+        self.info_text.insert("end", f"Arquivos {verbo} com sucesso: {len(excluidos)}\n")
+        self.info_text.insert("end", f"Tempo: {duracao:.1f} s ({taxa:.0f} arquivos/s)\n")
         
-        if erros > 0:
-            self.info_text.insert("end", f"Erros ao excluir: {erros}\n")
+        if erros:
+            self.info_text.insert("end", f"Erros: {len(erros)}\n")
             
         self.info_text.configure(state="disabled")
         
         # Mensagem de conclusão
-        if erros == 0:
-            messagebox.showinfo("Sucesso", f"{excluidos} arquivos duplicados foram excluídos com sucesso!")
+        if erros:
+            messagebox.showwarning("Atenção", f"{len(excluidos)} arquivos foram {verbo}, mas ocorreram {len(erros)} erros.")
+            self.mostrar_erros_exclusao(erros, f"Erros na {self.operacao}", verbo)
+        elif cancelado:
+            messagebox.showinfo(
+                "Aviso",
+                f"{self.operacao} cancelada. {len(excluidos)} arquivos foram {verbo} antes do cancelamento."
+            )
         else:
-            messagebox.showwarning("Atenção", f"{excluidos} arquivos foram excluídos, mas ocorreram {erros} erros. Verifique o log.")
-            
-        # Atualizar a análise
-        self.analyze_files()
+            messagebox.showinfo("Sucesso", f"{len(excluidos)} arquivos duplicados foram {verbo} com sucesso!")
+
+    def vincular_duplicados(self):
+        """Troca as cópias idênticas por links físicos para o original, em segundo plano"""
+        if self.trabalho_em_andamento():
+            return
+
+        pares = self.resultado.pares_para_vincular()
+        if not pares:
+            messagebox.showinfo(
+                "Aviso",
+                "Não há cópias idênticas para trocar. Execute a análise com \"Comparar conteúdo\" marcado "
+                "ou com mais de uma pasta."
+            )
+            return
+        resposta = messagebox.askyesno(
+            "Confirmar Links",
+            f"Trocar {len(pares)} cópias idênticas por links físicos para o original?\n\n"
+            "Os nomes dos arquivos continuam existindo, mas passam a compartilhar os dados do original; "
+            "uma alteração em qualquer um deles aparece em todos."
+        )
+        if not resposta:
+            return
+
+        self.operacao = "Links"
+        self.iniciar_trabalho(self._executar_vinculos, pares)
+
+    def _executar_vinculos(self, pares):
+        """Troca as cópias por links físicos, publicando progresso e resultado (executado na thread de trabalho)"""
+        self.fila_eventos.put(("total", len(pares)))
+        inicio = time.perf_counter()
+        vinculados, erros, cancelado, recuperados = consolidar(
+            pares,
+            cancelar=self.cancelar_evento,
+            progresso=lambda feitos, total, taxa: self.fila_eventos.put(("progresso_exclusao", feitos, total, taxa))
+        )
+        duracao = time.perf_counter() - inicio
+        self.fila_eventos.put(("vinculos_concluidos", vinculados, erros, cancelado, duracao, recuperados))
+
+    def concluir_vinculos(self, vinculados, erros, cancelado, duracao, recuperados):
+        """Atualiza a análise e a interface com o resultado da troca por links"""
+        # As linhas continuam na lista, agora com a situação de link
+        self.resultado.remover(vinculados, STATUS_VINCULADO)
+        self.lista_resultados.renderizar()
+
+        self.info_text.configure(state="normal")
+        self.info_text.delete("1.0", "end")
+        self.info_text.insert("end", self.resultado.resumo() + "\n")
+        self.info_text.insert("end", "\n--- RESULTADO DA TROCA POR LINKS ---\n")
+        if cancelado:
+            self.info_text.insert("end", "Troca por links cancelada pelo usuário.\n")
+        self.info_text.insert("end", f"Cópias trocadas por links: {len(vinculados)} em {duracao:.1f} s\n")
+        self.info_text.insert("end", f"Espaço recuperado: {recuperados / (1024 * 1024):.1f} MB\n")
+        if erros:
+            self.info_text.insert("end", f"Erros: {len(erros)}\n")
+        self.info_text.configure(state="disabled")
+
+        if erros:
+            messagebox.showwarning(
+                "Atenção", f"{len(vinculados)} cópias foram trocadas por links, mas ocorreram {len(erros)} erros."
+            )
+            self.mostrar_erros_exclusao(erros, "Erros na Troca por Links", "trocados por links")
+        else:
+            messagebox.showinfo(
+                "Sucesso",
+                f"{len(vinculados)} cópias foram trocadas por links ({recuperados / (1024 * 1024):.1f} MB recuperados)."
+            )
+
+    def restaurar_quarentena(self):
+        """Devolve aos caminhos originais o último lote de quarentena de cada pasta"""
+        if self.trabalho_em_andamento():
+            return
+
+        pastas = self.resultado.pastas or self.obter_pastas()
+        if not pastas:
+            return
+        lotes = [itens[-1] for itens in map(listar_lotes, pastas) if itens]
+        if not lotes:
+            messagebox.showinfo("Aviso", "Não há arquivos em quarentena nas pastas selecionadas.")
+            return
+
+        resposta = messagebox.askyesno(
+            "Confirmar Restauração",
+            "Devolver aos caminhos originais os arquivos dos lotes de quarentena abaixo?\n\n" + "\n".join(lotes)
+        )
+        if not resposta:
+            return
+
+        self.operacao = "Restauração"
+        self.iniciar_trabalho(self._executar_restauracao, lotes)
+
+    def _executar_restauracao(self, lotes):
+        """Restaura os lotes de quarentena em sequência (executado na thread de trabalho)"""
+        inicio = time.perf_counter()
+        restaurados, erros = [], []
+        cancelado = False
+        for lote in lotes:
+            feitos, falhas, cancelado = restaurar_lote(
+                lote,
+                cancelar=self.cancelar_evento,
+                progresso=lambda feitos, total, taxa: self.fila_eventos.put(("progresso_exclusao", feitos, total, taxa))
+            )
+            restaurados += feitos
+            erros += falhas
+            if cancelado:
+                break
+        duracao = time.perf_counter() - inicio
+        self.fila_eventos.put(("restauracao_concluida", restaurados, erros, cancelado, duracao))
+
+    def concluir_restauracao(self, restaurados, erros, cancelado, duracao):
+        """Mostra o resultado da restauração; a análise exibida deixa de refletir as pastas"""
+        self.info_text.configure(state="normal")
+        self.info_text.insert("end", "\n--- RESULTADO DA RESTAURAÇÃO ---\n")
+        if cancelado:
+            self.info_text.insert("end", "Restauração cancelada pelo usuário.\n")
+        self.info_text.insert("end", f"Arquivos restaurados: {len(restaurados)} em {duracao:.1f} s\n")
+        if erros:
+            self.info_text.insert("end", f"Erros: {len(erros)}\n")
+        self.info_text.insert("end", "Execute a análise novamente para atualizar a lista.\n")
+        self.info_text.configure(state="disabled")
+
+        if erros:
+            messagebox.showwarning(
+                "Atenção",
+                f"{len(restaurados)} arquivos foram restaurados, mas ocorreram {len(erros)} erros. "
+                "O lote continua na quarentena e a restauração pode ser repetida."
+            )
+            self.mostrar_erros_exclusao(erros, "Erros na Restauração", "restaurados")
+        elif not cancelado:
+            messagebox.showinfo("Sucesso", f"{len(restaurados)} arquivos foram restaurados com sucesso!")
+
+    def monitorar_pastas(self):
+        """Classifica cada XML novo nas pastas selecionadas até o cancelamento"""
+        if self.trabalho_em_andamento():
+            return
+
+        pastas = self.obter_pastas()
+        if not pastas:
+            return
+        self.sufixos = self.carregar_sufixos()
+        self.atualizar_label_sufixos()
+        if not self.sufixos:
+            messagebox.showwarning("Aviso", "Não há sufixos cadastrados para classificar os arquivos novos.")
+            return
+        try:
+            compilar_regras(tuple(self.sufixos))
+        except re.error as e:
+            messagebox.showerror("Erro", f"Regra de sufixo inválida: {e}")
+            return
+
+        # Pela interface, o monitoramento nunca exclui: os marcados vão para
+        # a quarentena ou são apenas listados
+        if self.quarentena_var.get():
+            acao = ACAO_QUARENTENA
+            descricao = f"movidos para {NOME_QUARENTENA}, dentro da pasta monitorada"
+        else:
+            acao = ACAO_LISTAR
+            descricao = "apenas listados"
+
+        self.info_text.configure(state="normal")
+        self.info_text.delete("1.0", "end")
+        self.info_text.insert(
+            "end",
+            f"Monitorando: {', '.join(pastas)}\nOs arquivos novos marcados pelos sufixos serão {descricao}. "
+            "Clique em Cancelar para encerrar.\n\n"
+        )
+        self.info_text.configure(state="disabled")
+        self.lista_resultados.limpar()
+        self.resultado = ResultadoAnalise()
+
+        self.operacao = "Monitoramento"
+        self.iniciar_trabalho(self._executar_monitoramento, pastas, self.recursivo_var.get(), acao)
+
+    def _executar_monitoramento(self, pastas, recursivo, acao):
+        """Executa o monitoramento até o cancelamento (executado na thread de trabalho)"""
+        monitor = Monitor(
+            pastas,
+            # Relê o arquivo de sufixos apenas quando ele é alterado
+            self.carregar_sufixos,
+            recursivo=recursivo,
+            acao=acao,
+            cancelar=self.cancelar_evento,
+            notificar=lambda *evento: self.fila_eventos.put(evento)
+        )
+        resumo = monitor.executar().resumo()
+        self.fila_eventos.put((
+            "cancelado",
+            f"Monitoramento encerrado: {resumo['vistos']} arquivos novos, {resumo['marcados']} marcados, "
+            f"{resumo['erros']} erros."
+        ))
+
+    def registrar_monitoramento(self, caminho, regra, resultado):
+        """Acrescenta um arquivo marcado pelo monitoramento à área de informações"""
+        self.info_text.configure(state="normal")
+        self.info_text.insert("end", f"[{resultado}] {caminho} ({regra})\n")
+        # Em sessões longas, só as últimas linhas são mantidas
+        linhas = int(self.info_text.index("end-1c").split(".")[0])
+        if linhas > LINHAS_MONITOR:
+            self.info_text.delete("1.0", f"{linhas - LINHAS_MONITOR + 1}.0")
+        self.info_text.see("end")
+        self.info_text.configure(state="disabled")
+
+    def mostrar_erros_exclusao(self, erros, titulo="Erros na Exclusão", verbo="excluídos"):
+        """Exibe uma janela com o erro de cada arquivo que não pôde ser excluído (ou movido, restaurado)"""
+        erros_window = ctk.CTkToplevel(self.root)
+        erros_window.title(titulo)
+        erros_window.geometry("700x400")
+
+        label = ctk.CTkLabel(erros_window, text=f"{len(erros)} arquivos não puderam ser {verbo}:")
+        label.pack(pady=10)
+
+        erros_text = ctk.CTkTextbox(erros_window)
+        erros_text.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        erros_text.insert("1.0", "\n".join(f"{caminho}: {mensagem}" for caminho, mensagem in erros))
+        erros_text.configure(state="disabled")
+
+        fechar_button = ctk.CTkButton(erros_window, text="Fechar", command=erros_window.destroy)
+        fechar_button.pack(pady=(0, 10))
 
     def set_window_icon(self):
         """Define o ícone da janela como uma imagem azul com 'XML' gerada via código, embutida."""
+        # O PNG gerado fica em cache e é lido direto pelo Tk, sem PIL
+        em_cache = os.path.join(pasta_cache_imagens(), "icone_32.png")
         try:
-            from PIL import ImageDraw, ImageFont
-            icon_img = Image.new('RGBA', (64, 64), color="#1a73e8")
-            draw = ImageDraw.Draw(icon_img)
-            try:
-                font = ImageFont.truetype("arial.ttf", 24)
-            except:
-                font = ImageFont.load_default()
-            text = "XML"
-            w, h = draw.textsize(text, font=font) if hasattr(draw, 'textsize') else (32, 16)
-            draw.text(((64-w)/2, (64-h)/2), text, fill="white", font=font)
+            if not os.path.exists(em_cache):
+                from PIL import Image, ImageDraw, ImageFont
+                icon_img = Image.new('RGBA', (64, 64), color="#1a73e8")
+                draw = ImageDraw.Draw(icon_img)
+                try:
+                    font = ImageFont.truetype("arial.ttf", 24)
+                except:
+                    font = ImageFont.load_default()
+                text = "XML"
+                w, h = draw.textsize(text, font=font) if hasattr(draw, 'textsize') else (32, 16)
+                draw.text(((64-w)/2, (64-h)/2), text, fill="white", font=font)
+                icon_img = icon_img.resize((32, 32))
+                self.salvar_imagem_cache(icon_img, em_cache)
             # Para Windows, usar iconphoto (funciona com PNG)
-            icon_img = icon_img.resize((32, 32))
-            icon = ImageTk.PhotoImage(icon_img)
-            self.root.iconphoto(True, icon)
+            self.icone = PhotoImage(file=em_cache)
+            self.root.iconphoto(True, self.icone)
         except Exception as e:
-            print(f"Não foi possível definir o ícone da janela: {e}")
+            logger.warning(f"Não foi possível definir o ícone da janela: {e}")
             # Não faz nada se falhar
 
 def main():
     """Função principal para executar o aplicativo"""
+    telemetria.configurar_log()
+
+    # Com --profile, a abertura da janela e a carga das logos são perfiladas
+    # e o perfil das análises e exclusões já começa ligado
+    perfilar = "--profile" in sys.argv
+    if perfilar:
+        perfil_inicio = telemetria.Perfil("inicio")
+        perfil_inicio.__enter__()
+
     root = ctk.CTk()
-    app = ExclusaoArquivosApp(root)
+    app = ExclusaoArquivosApp(root, perfilar=perfilar)
+
+    if perfilar:
+        # Agendado depois de carregar_imagens, com o mesmo atraso
+        root.after(ATRASO_IMAGENS_MS, lambda: perfil_inicio.__exit__(None, None, None))
+
+    if "--medir-inicio" in sys.argv:
+        # Informa o tempo (ms) até a primeira exibição da janela e encerra;
+        # usado por benchmarks/bench_inicio.py
+        def medir_inicio():
+            root.update_idletasks()
+            print(f"{(time.perf_counter() - INICIO_PROCESSO) * 1000:.0f}", flush=True)
+            root.destroy()
+        root.after(0, medir_inicio)
+
     root.mainloop()
 
 
 if __name__ == "__main__":
+    # Necessário para o pool de processos no executável do PyInstaller
+    multiprocessing.freeze_support()
     main() 
\ No newline at end of file
@@ -0,0 +1,96 @@
+"""Benchmark da classificação de arquivos por sufixo.
+
+Compara o método antigo (``any(f.endswith(s) for s in sufixos)`` seguido de
+busca em lista) com o ``IndiceSufixos`` e mostra que o custo do índice
+cresce linearmente com o número de arquivos e não depende da quantidade de
+sufixos cadastrados.
+
+Uso:
+    python benchmarks/bench_classificacao.py [--arquivos 1000000] [--sufixos 300]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import IndiceSufixos  # noqa: E402
+
+
+def gerar_sufixos(quantidade):
+    """Gera sufixos no formato de eventos da SEFAZ (-NNNNNN.xml)"""
+    return [f"-{210000 + i:06d}.xml" for i in range(quantidade)]
+
+
+def gerar_nomes(quantidade, sufixos, proporcao_duplicados=0.3, semente=42):
+    """Gera nomes de arquivos sintéticos, parte deles com sufixo cadastrado"""
+    aleatorio = random.Random(semente)
+    nomes = []
+    for i in range(quantidade):
+        chave = f"3524010000000000000055001{i:019d}"
+        if aleatorio.random() < proporcao_duplicados:
+            nomes.append(chave + aleatorio.choice(sufixos))
+        else:
+            nomes.append(chave + ".xml")
+    return nomes
+
+
+def classificar_antigo(nomes, sufixos):
+    """Reproduz a classificação original: varredura de sufixos e busca em lista"""
+    files_to_delete = [f for f in nomes if any(f.endswith(s) for s in sufixos)]
+    return sum(1 for f in sorted(nomes) if f in files_to_delete)
+
+
+def classificar_indice(nomes, sufixos):
+    """Classificação com o índice de sufixos e pertinência em conjunto"""
+    indice = IndiceSufixos(sufixos)
+    files_to_delete = [f for f in nomes if indice.corresponde(f) is not None]
+    marcados = set(files_to_delete)
+    return sum(1 for f in sorted(nomes) if f in marcados)
+
+
+def cronometrar(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return time.perf_counter() - inicio, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--arquivos", type=int, default=1_000_000)
+    parser.add_argument("--sufixos", type=int, default=300)
+    parser.add_argument(
+        "--limite-antigo",
+        type=int,
+        default=10_000,
+        help="maior quantidade de arquivos medida com o método antigo (quadrático)",
+    )
+    args = parser.parse_args()
+
+    sufixos = gerar_sufixos(args.sufixos)
+
+    print(f"{'arquivos':>10} {'sufixos':>8} {'antigo (s)':>12} {'índice (s)':>12} {'ns/arquivo':>11}")
+    tamanhos = []
+    quantidade = 1_000
+    while quantidade < args.arquivos:
+        tamanhos.append(quantidade)
+        quantidade *= 10
+    tamanhos.append(args.arquivos)
+
+    for quantidade in tamanhos:
+        nomes = gerar_nomes(quantidade, sufixos)
+        tempo_indice, marcados = cronometrar(classificar_indice, nomes, sufixos)
+        if quantidade <= args.limite_antigo:
+            tempo_antigo, marcados_antigo = cronometrar(classificar_antigo, nomes, sufixos)
+            assert marcados == marcados_antigo, "classificações divergentes"
+            coluna_antigo = f"{tempo_antigo:12.3f}"
+        else:
+            coluna_antigo = f"{'-':>12}"
+        por_arquivo = tempo_indice / quantidade * 1e9
+        print(f"{quantidade:>10} {len(sufixos):>8} {coluna_antigo} {tempo_indice:12.3f} {por_arquivo:11.0f}")
+
+
+if __name__ == "__main__":
+    main()
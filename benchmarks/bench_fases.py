@@ -0,0 +1,321 @@
+"""Benchmark das fases de análise, detecção, exibição e exclusão.
+
+Gera em uma pasta temporária um conjunto sintético de XMLs (quantidade de
+documentos, distribuição dos sufixos de evento, proporção de cópias em
+outra pasta e tamanho dos arquivos configuráveis) e mede o tempo e o pico
+de memória (tracemalloc, apenas deste processo) de cada fase:
+
+    analise      varredura recursiva e classificação por sufixo
+    conteudo     análise com comparação por conteúdo, sem cache
+    vinculos     troca das cópias idênticas por links físicos e nova análise
+    deteccao     detecção de sufixos (duas passagens pela varredura)
+    exibicao     carga, ordenação e filtro da lista de resultados
+    exclusao     exclusão dos marcados e atualização do resultado e da lista
+
+A lista de resultados usa o Treeview real quando há display (ou com
+``--vista tk`` sob Xvfb); sem display, os widgets são substituídos por
+objetos vazios e só a lógica de filtro, ordenação e paginação (módulo
+``paginacao``, que não depende de Tk nem de customtkinter) é medida.
+
+Cada execução é comparada com a referência (``baseline_fases.json``, gravada
+com os parâmetros padrão): uma fase mais lenta ou com pico de memória
+maior que a referência além da tolerância faz o script terminar com
+código 1, e a falta da referência ou parâmetros diferentes dos dela, com
+código 2. ``--sem-baseline`` só mede, sem comparar, e
+``--salvar-baseline`` grava o resultado como a nova referência. A fase
+de vínculos também confere que, na nova análise, nenhum nome trocado por
+link continua marcado para exclusão.
+
+Uso:
+    python benchmarks/bench_fases.py [--arquivos 20000] [--salvar-baseline]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from engine import STATUS_VINCULADO, analisar, detectar_sufixos, excluir_arquivos, varrer_pastas  # noqa: E402
+from vinculos import consolidar  # noqa: E402
+
+BASELINE_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_fases.json")
+
+# Aumento tolerado em relação à referência (0.25 = 25%)
+TOLERANCIA_PADRAO = 0.25
+
+# Distribuição padrão dos sufixos de evento entre os documentos com evento
+SUFIXOS_PADRAO = "-110110.xml:6,-110111.xml:2,-210200.xml:1,-210210.xml:1"
+
+FASES = ("analise", "conteudo", "vinculos", "deteccao", "exibicao", "exclusao")
+
+
+def ler_distribuicao(texto):
+    """Converte "sufixo:peso,sufixo:peso" em listas de sufixos e pesos"""
+    sufixos, pesos = [], []
+    for item in texto.split(","):
+        sufixo, _, peso = item.partition(":")
+        sufixos.append(sufixo.strip())
+        pesos.append(float(peso or 1))
+    return sufixos, pesos
+
+
+def conteudo_xml(chave, tamanho, evento=None):
+    """XML sintético com a chave de acesso, completado até `tamanho` bytes"""
+    if evento:
+        corpo = f'<procEventoNFe><evento><infEvento><chNFe>{chave}</chNFe><tpEvento>{evento}</tpEvento></infEvento></evento>'
+        fim = "</procEventoNFe>"
+    else:
+        corpo = f'<nfeProc><NFe><infNFe Id="NFe{chave}"><ide><cUF>35</cUF></ide>'
+        fim = "</infNFe></NFe></nfeProc>"
+    preenchimento = max(0, tamanho - len(corpo) - len(fim) - 20)
+    return f'{corpo}<infAdic>{"x" * preenchimento}</infAdic>{fim}'
+
+
+def gerar_conjunto(destino, args):
+    """Cria os arquivos sintéticos e retorna a quantidade gerada"""
+    aleatorio = random.Random(args.semente)
+    sufixos, pesos = ler_distribuicao(args.sufixos)
+    pastas = [os.path.join(destino, f"lote{i:02d}") for i in range(args.pastas)]
+    for pasta in pastas:
+        os.makedirs(pasta)
+
+    gerados = 0
+    for i in range(args.arquivos):
+        chave = f"3524{i:040d}"
+        pasta = pastas[i % len(pastas)]
+        arquivos = [(f"{chave}.xml", conteudo_xml(chave, args.tamanho_xml))]
+        if aleatorio.random() < args.proporcao_sufixo:
+            sufixo = aleatorio.choices(sufixos, pesos)[0]
+            arquivos.append((f"{chave}{sufixo}", conteudo_xml(chave, args.tamanho_xml // 2, sufixo[1:-4])))
+        for nome, conteudo in arquivos:
+            with open(os.path.join(pasta, nome), "w", encoding="utf-8") as f:
+                f.write(conteudo)
+            gerados += 1
+        # Cópia idêntica em outra pasta, como acontece ao juntar exportações
+        if len(pastas) > 1 and aleatorio.random() < args.proporcao_duplicados:
+            outra = pastas[(i + 1) % len(pastas)]
+            shutil.copyfile(os.path.join(pasta, arquivos[0][0]), os.path.join(outra, arquivos[0][0]))
+            gerados += 1
+    return gerados
+
+
+class _WidgetVazio:
+    """Substitui Treeview, rótulos e botões quando não há display"""
+
+    def __getattr__(self, nome):
+        return self._nada
+
+    def _nada(self, *args, **kwargs):
+        return ()
+
+
+def criar_lista(vista):
+    """Cria a lista de resultados com widgets reais ("tk") ou vazios ("stub")"""
+    if vista == "tk":
+        import customtkinter as ctk
+
+        from app import ListaResultados
+
+        raiz = ctk.CTk()
+        raiz.withdraw()
+        lista = ListaResultados(raiz)
+        return lista, raiz
+
+    from paginacao import PaginacaoResultados
+
+    lista = PaginacaoResultados()
+    lista.tree = lista.pagina_label = lista.anterior_button = lista.proxima_button = _WidgetVazio()
+    return lista, None
+
+
+def medir(funcao, *args, **kwargs):
+    """Executa a função e retorna (resultado, segundos, pico de memória alocada por ela em MB)"""
+    tracemalloc.reset_peak()
+    antes, _ = tracemalloc.get_traced_memory()
+    inicio = time.perf_counter()
+    resultado = funcao(*args, **kwargs)
+    segundos = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    return resultado, segundos, (pico - antes) / (1024 * 1024)
+
+
+def executar_rodada(args):
+    """Gera um conjunto novo e mede todas as fases sobre ele"""
+    destino = tempfile.mkdtemp(prefix="bench_xml_")
+    raiz = None
+    try:
+        gerados = gerar_conjunto(destino, args)
+        sufixos = ler_distribuicao(args.sufixos)[0]
+        medidas = {}
+
+        tracemalloc.start()
+        resultado, segundos, pico = medir(analisar, [destino], sufixos, recursivo=True)
+        medidas["analise"] = (segundos, pico)
+        analisados = len(resultado)
+
+        completo, segundos, pico = medir(analisar, [destino], sufixos, recursivo=True, conteudo=True)
+        medidas["conteudo"] = (segundos, pico)
+
+        def vincular():
+            vinculados, erros, _, _ = consolidar(completo.pares_para_vincular())
+            return vinculados, erros, analisar([destino], sufixos, recursivo=True, conteudo=True)
+
+        (vinculados, erros, depois), segundos, pico = medir(vincular)
+        medidas["vinculos"] = (segundos, pico)
+        if erros:
+            raise RuntimeError(f"{len(erros)} cópias não foram trocadas por links")
+        # Os nomes já vinculados não podem voltar a ser marcados para exclusão
+        if depois.pares_para_vincular() or depois.contagem[STATUS_VINCULADO] != len(vinculados):
+            raise RuntimeError(
+                f"{len(vinculados)} cópias trocadas por links, mas a nova análise reconheceu "
+                f"{depois.contagem[STATUS_VINCULADO]} e ainda marcou {len(depois.pares_para_vincular())}"
+            )
+
+        _, segundos, pico = medir(
+            detectar_sufixos,
+            lambda: (entrada.nome for entrada in varrer_pastas([destino], True))
+        )
+        medidas["deteccao"] = (segundos, pico)
+
+        lista, raiz = criar_lista(args.vista)
+
+        def exibir():
+            lista.carregar(resultado)
+            lista.ordenar("tamanho")
+            lista.filtrar("Para exclusão")
+            lista.filtrar("Todos")
+
+        _, segundos, pico = medir(exibir)
+        medidas["exibicao"] = (segundos, pico)
+
+        def excluir():
+            excluidos, erros, _ = excluir_arquivos(resultado.caminhos_para_excluir())
+            lista.remover(resultado.remover(excluidos))
+            lista.renderizar()
+            return erros
+
+        erros, segundos, pico = medir(excluir)
+        medidas["exclusao"] = (segundos, pico)
+        tracemalloc.stop()
+
+        if erros:
+            raise RuntimeError(f"{len(erros)} arquivos não foram excluídos")
+        return gerados, analisados, medidas
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        if raiz is not None:
+            raiz.destroy()
+        shutil.rmtree(destino, ignore_errors=True)
+
+
+def parametros(args):
+    """Parâmetros que definem o conjunto; a referência só vale para os mesmos valores"""
+    return {
+        "arquivos": args.arquivos,
+        "pastas": args.pastas,
+        "sufixos": args.sufixos,
+        "proporcao_sufixo": args.proporcao_sufixo,
+        "proporcao_duplicados": args.proporcao_duplicados,
+        "tamanho_xml": args.tamanho_xml,
+        "vista": args.vista,
+    }
+
+
+def comparar(fases, baseline, tolerancia):
+    """Retorna as mensagens de regressão em relação à referência"""
+    falhas = []
+    for fase, atual in fases.items():
+        referencia = baseline["fases"].get(fase)
+        if referencia is None:
+            continue
+        for medida, unidade in (("segundos", "s"), ("pico_mb", "MB")):
+            limite = referencia[medida] * (1 + tolerancia)
+            if atual[medida] > limite:
+                falhas.append(
+                    f"{fase}: {medida} {atual[medida]:.3f}{unidade} acima da referência "
+                    f"{referencia[medida]:.3f}{unidade} (+{tolerancia:.0%})"
+                )
+    return falhas
+
+
+def ha_display():
+    return sys.platform in ("win32", "darwin") or bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--arquivos", type=int, default=20_000, help="documentos gerados (sem contar eventos e cópias)")
+    parser.add_argument("--pastas", type=int, default=4)
+    parser.add_argument("--sufixos", default=SUFIXOS_PADRAO, help="distribuição sufixo:peso separada por vírgulas")
+    parser.add_argument("--proporcao-sufixo", type=float, default=0.3, help="fração dos documentos com evento")
+    parser.add_argument("--proporcao-duplicados", type=float, default=0.1, help="fração copiada para outra pasta")
+    parser.add_argument("--tamanho-xml", type=int, default=4096, help="tamanho aproximado de cada XML em bytes")
+    parser.add_argument("--repeticoes", type=int, default=1, help="rodadas; vale a mediana de cada fase")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--vista", choices=("tk", "stub"), default="tk" if ha_display() else "stub")
+    parser.add_argument("--baseline", default=BASELINE_PADRAO, help="arquivo JSON de referência")
+    parser.add_argument("--salvar-baseline", action="store_true", help="grava este resultado como referência")
+    parser.add_argument("--sem-baseline", action="store_true", help="só mede, sem comparar com a referência")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_PADRAO)
+    args = parser.parse_args()
+
+    rodadas = []
+    for _ in range(args.repeticoes):
+        gerados, analisados, medidas = executar_rodada(args)
+        rodadas.append(medidas)
+
+    fases = {
+        fase: {
+            "segundos": statistics.median(rodada[fase][0] for rodada in rodadas),
+            "pico_mb": statistics.median(rodada[fase][1] for rodada in rodadas),
+        }
+        for fase in FASES
+    }
+
+    print(f"{gerados} arquivos gerados, {analisados} analisados (vista: {args.vista})")
+    print(f"{'fase':<10} {'tempo (s)':>10} {'pico (MB)':>10} {'arquivos/s':>11}")
+    for fase, medida in fases.items():
+        taxa = analisados / medida["segundos"] if medida["segundos"] else 0
+        print(f"{fase:<10} {medida['segundos']:10.3f} {medida['pico_mb']:10.1f} {taxa:11.0f}")
+
+    atual = {"parametros": parametros(args), "fases": fases}
+    if args.salvar_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(atual, f, indent=2)
+        print(f"Referência gravada em {args.baseline}")
+        return
+
+    if args.sem_baseline:
+        return
+    if not os.path.exists(args.baseline):
+        print(
+            f"Referência {args.baseline} não encontrada; use --salvar-baseline para criá-la "
+            "ou --sem-baseline para só medir.",
+            file=sys.stderr
+        )
+        sys.exit(2)
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("parametros") != atual["parametros"]:
+        print("A referência foi gravada com outros parâmetros; comparação ignorada.", file=sys.stderr)
+        sys.exit(2)
+
+    falhas = comparar(fases, baseline, args.tolerancia)
+    if falhas:
+        for falha in falhas:
+            print(f"FALHA: {falha}", file=sys.stderr)
+        sys.exit(1)
+    print("Sem regressões em relação à referência.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Orçamento de tempo de abertura da interface e da linha de comando.
+
+Mede, em processos novos, o tempo até a primeira exibição da janela
+(``app.py --medir-inicio``) e o tempo total de ``cli.py --help``, que não
+pode carregar customtkinter nem PIL. Cada medição é repetida e vale a
+mediana. Termina com código 1 se algum orçamento for ultrapassado, para
+ser usado como verificação em rotinas de build.
+
+Sem display, a janela é aberta sob ``xvfb-run``, se estiver instalado; sem
+nenhum dos dois, a medição da interface conta como falha, a não ser que
+``--sem-gui`` peça explicitamente para ignorá-la.
+
+Uso:
+    python benchmarks/bench_inicio.py [--repeticoes 5] [--orcamento-gui 1500] [--orcamento-cli 300] [--sem-gui]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Orçamentos padrão em milissegundos
+ORCAMENTO_GUI_MS = 1500
+ORCAMENTO_CLI_MS = 300
+
+
+def medir_gui(prefixo=()):
+    """Tempo (ms) informado pelo próprio app até a primeira exibição da janela
+
+    `prefixo` é o comando que envolve o app (por exemplo, xvfb-run); como o
+    tempo é medido dentro do app, a abertura do servidor X não é contada.
+    """
+    saida = subprocess.run(
+        [*prefixo, sys.executable, os.path.join(RAIZ, "app.py"), "--medir-inicio"],
+        cwd=RAIZ,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    # As linhas anteriores podem conter avisos; o tempo é a última
+    return float(saida.strip().splitlines()[-1])
+
+
+def medir_cli():
+    """Tempo total (ms) de um processo ``cli.py --help``, incluindo o interpretador"""
+    inicio = time.perf_counter()
+    subprocess.run(
+        [sys.executable, os.path.join(RAIZ, "cli.py"), "--help"],
+        cwd=RAIZ,
+        capture_output=True,
+        check=True,
+    )
+    return (time.perf_counter() - inicio) * 1000
+
+
+def cli_carrega_gui():
+    """Verifica se importar o cli.py carrega customtkinter ou PIL"""
+    codigo = (
+        "import sys; sys.path.insert(0, %r); import cli; "
+        "print(any(m.split('.')[0] in ('customtkinter', 'PIL', 'tkinter') for m in sys.modules))" % RAIZ
+    )
+    saida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, check=True).stdout
+    return saida.strip() == "True"
+
+
+def ha_display():
+    return sys.platform in ("win32", "darwin") or bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+def prefixo_display():
+    """Comando que dá um display ao app: nenhum, xvfb-run ou None se não houver como abrir a janela"""
+    if ha_display():
+        return ()
+    xvfb_run = shutil.which("xvfb-run")
+    if xvfb_run:
+        return (xvfb_run, "-a")
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--orcamento-gui", type=float, default=ORCAMENTO_GUI_MS, help="ms até a primeira exibição")
+    parser.add_argument("--orcamento-cli", type=float, default=ORCAMENTO_CLI_MS, help="ms para cli.py --help")
+    parser.add_argument("--sem-gui", action="store_true", help="ignora a medição da interface")
+    args = parser.parse_args()
+
+    falhas = []
+
+    if cli_carrega_gui():
+        falhas.append("cli.py importa customtkinter, PIL ou tkinter")
+
+    tempos_cli = [medir_cli() for _ in range(args.repeticoes)]
+    mediana_cli = statistics.median(tempos_cli)
+    print(f"cli.py --help: {mediana_cli:.0f} ms (orçamento {args.orcamento_cli:.0f} ms)")
+    if mediana_cli > args.orcamento_cli:
+        falhas.append(f"cli.py --help levou {mediana_cli:.0f} ms")
+
+    prefixo = prefixo_display()
+    if args.sem_gui:
+        print("Medição da interface ignorada (--sem-gui).")
+    elif prefixo is None:
+        falhas.append("sem display nem xvfb-run para medir a interface (use --sem-gui para ignorá-la)")
+    else:
+        try:
+            # A primeira execução aquece o cache de imagens e não é contada
+            medir_gui(prefixo)
+            tempos_gui = [medir_gui(prefixo) for _ in range(args.repeticoes)]
+        except subprocess.CalledProcessError as e:
+            erro = (e.stderr or "").strip().splitlines()
+            falhas.append(f"app.py --medir-inicio terminou com código {e.returncode}: {erro[-1] if erro else ''}")
+        else:
+            mediana_gui = statistics.median(tempos_gui)
+            via = " sob xvfb-run" if prefixo else ""
+            print(
+                f"app.py até a primeira exibição{via}: {mediana_gui:.0f} ms "
+                f"(orçamento {args.orcamento_gui:.0f} ms)"
+            )
+            if mediana_gui > args.orcamento_gui:
+                falhas.append(f"app.py levou {mediana_gui:.0f} ms até a primeira exibição")
+
+    if falhas:
+        for falha in falhas:
+            print(f"FALHA: {falha}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,828 @@
+"""Linha de comando para análise e exclusão de arquivos XML duplicados.
+
+Usa o mesmo motor da interface gráfica (engine.py), sem importar
+customtkinter nem PIL, para rodar em servidores e rotinas agendadas.
+
+Exemplos:
+    python cli.py analyze /dados/xml --recursive --format json -o resultado.json
+    python cli.py delete /dados/xml --content --yes
+    python cli.py delete /dados/xml --recursive --quarantine --yes
+    python cli.py restore /dados/xml
+    python cli.py link /dados/xml --recursive --yes
+    python cli.py export-manifest /dados/xml --recursive -o filial1.manifesto.gz
+    python cli.py merge-manifests matriz.manifesto.gz filial1.manifesto.gz --output-dir listas
+    python cli.py delete /dados/xml --from-list listas/filial1.lista.tsv --quarantine --yes
+    python cli.py watch /dados/entrada --recursive --action quarantine
+    python cli.py analyze /dados/xml --access-key
+    python cli.py delete /dados/fornecedores --zip --content --yes
+    python cli.py detect-suffixes /dados/xml --add
+    python cli.py detect-suffixes /dados/xml --recursive --sample 0.1 --top 20
+    python cli.py --profile analyze /dados/xml --content
+    python cli.py --max-files-per-second 200 --max-mb-per-second 20 --adaptive-concurrency delete /nas/xml --yes
+
+Códigos de saída:
+    0   nada a excluir (analyze) ou operação concluída sem erros
+    1   analyze ou merge-manifests encontrou arquivos para exclusão
+    2   argumentos, pastas ou sufixos inválidos
+    3   delete, link, restore ou watch não conseguiu excluir, vincular, mover ou restaurar algum arquivo
+    130 interrompido pelo usuário (Ctrl+C)
+"""
+import argparse
+import contextlib
+import csv
+import json
+import multiprocessing
+import os
+import re
+import sys
+import threading
+
+import manifesto
+import telemetria
+from limites import regulador
+from engine import (
+    ARQUIVO_SUFIXOS,
+    CHAVES_STATUS,
+    MAX_SUFIXOS_DETECTADOS,
+    NOME_QUARENTENA,
+    ROTULOS_STATUS,
+    STATUS_MANTER,
+    STATUS_REMOVIDO,
+    STATUS_VINCULADO,
+    abrir_cache,
+    analisar,
+    caminho_cache,
+    carregar_sufixos,
+    compilar_regras,
+    detectar_sufixos,
+    excluir_arquivos,
+    reescrever_compactados,
+    salvar_sufixos,
+    varrer_pastas,
+)
+from monitor import ACAO_EXCLUIR, ACAO_LISTAR, ACAO_QUARENTENA, INTERVALO_POLLING, Monitor
+from quarentena import (
+    listar_lotes,
+    mover_compactados_para_quarentena,
+    mover_para_quarentena,
+    novo_lote,
+    restaurar_lote,
+)
+from vinculos import consolidar
+
+SAIDA_OK = 0
+SAIDA_DUPLICADOS = 1
+SAIDA_USO = 2
+SAIDA_FALHAS = 3
+SAIDA_INTERROMPIDO = 130
+
+# Valores de --action do watch e a ação correspondente do monitoramento
+ACOES_WATCH = {"report": ACAO_LISTAR, "quarantine": ACAO_QUARENTENA, "delete": ACAO_EXCLUIR}
+
+
+def criar_parser():
+    """Monta o parser de argumentos com os subcomandos de análise, exclusão, quarentena, manifesto e monitoramento"""
+    comum = argparse.ArgumentParser(add_help=False)
+    comum.add_argument("pastas", nargs="+", metavar="PASTA", help="pasta com arquivos XML")
+    comum.add_argument("-r", "--recursive", action="store_true", help="incluir subpastas")
+    comum.add_argument(
+        "--suffixes-file",
+        default=ARQUIVO_SUFIXOS,
+        help=f"arquivo de sufixos (padrão: {ARQUIVO_SUFIXOS})"
+    )
+    comum.add_argument("--format", choices=("text", "json", "csv"), default="text", help="formato da saída")
+    comum.add_argument("-o", "--output", help="arquivo de saída (padrão: saída padrão)")
+
+    analise = argparse.ArgumentParser(add_help=False)
+    analise.add_argument("--content", action="store_true", help="comparar também o conteúdo dos arquivos")
+    analise.add_argument(
+        "--access-key",
+        action="store_true",
+        help="ler a chave de acesso do XML e manter uma versão por documento ou evento fiscal"
+    )
+    analise.add_argument(
+        "--canonical",
+        action="store_true",
+        help="comparar a forma canônica do XML (ignora espaços, ordem de atributos e declaração)"
+    )
+    analise.add_argument(
+        "--zip",
+        action="store_true",
+        help="ler também os XMLs dentro dos arquivos .zip, sem extraí-los (o ZIP é regravado sem os duplicados)"
+    )
+    analise.add_argument("--no-cache", action="store_true", help="não usar o cache de análise")
+
+    parser = argparse.ArgumentParser(
+        prog="cli.py",
+        description="Análise e exclusão de arquivos XML duplicados sem interface gráfica."
+    )
+    parser.add_argument(
+        "--log-file",
+        help="arquivo de log em JSON, com rotação (padrão: pasta de dados do usuário)"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="executa o comando sob cProfile e tracemalloc e grava .pstats e relatório de alocações ao lado do log"
+    )
+    parser.add_argument(
+        "--metrics-file",
+        default=os.environ.get(telemetria.VARIAVEL_PROMETHEUS),
+        help=f"arquivo .prom para o textfile collector do Prometheus (padrão: ${telemetria.VARIAVEL_PROMETHEUS})"
+    )
+    parser.add_argument(
+        "--max-files-per-second",
+        type=float,
+        metavar="N",
+        help="limita os arquivos listados, lidos, excluídos ou movidos por segundo (somados entre as etapas)"
+    )
+    parser.add_argument(
+        "--max-mb-per-second",
+        type=float,
+        metavar="MB",
+        help="limita os megabytes lidos por segundo na comparação de conteúdo"
+    )
+    parser.add_argument(
+        "--adaptive-concurrency",
+        action="store_true",
+        help="ajusta as operações simultâneas pela latência do armazenamento (reduz quando ele fica lento)"
+    )
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+    subparsers.add_parser(
+        "analyze",
+        parents=[comum, analise],
+        help="lista os arquivos e os que seriam excluídos"
+    )
+    delete = subparsers.add_parser(
+        "delete",
+        parents=[comum, analise],
+        help="analisa e exclui os arquivos duplicados"
+    )
+    delete.add_argument("-y", "--yes", action="store_true", help="confirma a exclusão sem perguntar")
+    delete.add_argument(
+        "--quarantine",
+        action="store_true",
+        help=f"move os arquivos para PASTA/{NOME_QUARENTENA}/<data> em vez de excluí-los (desfeito com restore)"
+    )
+    delete.add_argument(
+        "--from-list",
+        metavar="LISTA",
+        help="em vez de analisar, exclui os arquivos de PASTA listados por merge-manifests, conferindo tamanho e hash"
+    )
+    link = subparsers.add_parser(
+        "link",
+        parents=[comum, analise],
+        help="troca cada cópia de conteúdo idêntico por um link físico para o original, mantendo os nomes"
+    )
+    link.add_argument("-y", "--yes", action="store_true", help="confirma a troca sem perguntar")
+    exportar = subparsers.add_parser(
+        "export-manifest",
+        help="grava o manifesto ordenado e compactado dos arquivos (hash, tamanho e chave de acesso)"
+    )
+    exportar.add_argument("pastas", nargs="+", metavar="PASTA", help="pasta com arquivos XML")
+    exportar.add_argument("-r", "--recursive", action="store_true", help="incluir subpastas")
+    exportar.add_argument("-o", "--output", required=True, help="arquivo do manifesto (ex.: filial1.manifesto.gz)")
+    exportar.add_argument("--host", help="nome deste servidor no manifesto (padrão: nome da máquina)")
+    exportar.add_argument(
+        "--access-key",
+        action="store_true",
+        help="agrupar documentos e eventos fiscais pela chave de acesso, não só pelo conteúdo"
+    )
+    exportar.add_argument(
+        "--suffixes-file",
+        default=ARQUIVO_SUFIXOS,
+        help=f"arquivo de sufixos, ao lado do qual fica o cache de análise (padrão: {ARQUIVO_SUFIXOS})"
+    )
+    exportar.add_argument("--no-cache", action="store_true", help="não usar o cache de análise")
+    mesclar = subparsers.add_parser(
+        "merge-manifests",
+        help="mescla os manifestos de vários servidores e grava a lista de exclusão de cada um"
+    )
+    mesclar.add_argument(
+        "manifestos",
+        nargs="+",
+        metavar="MANIFESTO",
+        help="manifestos gerados por export-manifest; em cada grupo de cópias fica a do primeiro informado"
+    )
+    mesclar.add_argument("--output-dir", required=True, help="pasta onde são gravadas as listas <servidor>.lista.tsv")
+    mesclar.add_argument("--format", choices=("text", "json", "csv"), default="text", help="formato do resumo")
+    restore = subparsers.add_parser(
+        "restore",
+        help="devolve aos caminhos originais os arquivos do último lote de quarentena de cada pasta"
+    )
+    restore.add_argument("pastas", nargs="+", metavar="PASTA", help="pasta analisada que contém a quarentena")
+    restore.add_argument("--batch", metavar="LOTE", help="lote a restaurar (padrão: o mais recente)")
+    restore.add_argument("--list", action="store_true", help="apenas lista os lotes de quarentena")
+    restore.add_argument("--format", choices=("text", "json", "csv"), default="text", help="formato da saída")
+    restore.add_argument("-o", "--output", help="arquivo de saída (padrão: saída padrão)")
+    watch = subparsers.add_parser(
+        "watch",
+        parents=[comum],
+        help="monitora as pastas e classifica pelos sufixos cada XML novo assim que ele chega (até Ctrl+C)"
+    )
+    watch.add_argument(
+        "--action",
+        choices=ACOES_WATCH,
+        default="report",
+        help="o que fazer com os arquivos marcados: apenas listar (padrão), mover para a quarentena ou excluir"
+    )
+    watch.add_argument(
+        "--interval",
+        type=float,
+        default=INTERVALO_POLLING,
+        metavar="SEGUNDOS",
+        help=f"intervalo entre as leituras das pastas sem inotify (padrão: {INTERVALO_POLLING})"
+    )
+    watch.add_argument(
+        "--polling",
+        action="store_true",
+        help="relê as pastas periodicamente mesmo com inotify disponível (ex.: compartilhamentos de rede)"
+    )
+    detect = subparsers.add_parser(
+        "detect-suffixes",
+        parents=[comum],
+        help="detecta sufixos -NNNNNN.xml presentes em grupos de arquivos"
+    )
+    detect.add_argument("--add", action="store_true", help="acrescenta os sufixos detectados ao arquivo de sufixos")
+    detect.add_argument(
+        "--top",
+        type=int,
+        default=MAX_SUFIXOS_DETECTADOS,
+        help=f"quantidade máxima de sufixos listados (padrão: {MAX_SUFIXOS_DETECTADOS})"
+    )
+    detect.add_argument(
+        "--sample",
+        type=float,
+        default=1.0,
+        metavar="FRACAO",
+        help="analisa só esta fração dos nomes base (ex.: 0.1) e extrapola as contagens"
+    )
+    return parser
+
+
+def abrir_saida(caminho):
+    """Abre o arquivo de saída, ou devolve a saída padrão"""
+    if caminho:
+        return open(caminho, "w", encoding="utf-8", newline="")
+    return sys.stdout
+
+
+def notificar_progresso(tipo, *dados):
+    """Mostra o progresso no terminal (apenas quando stderr é interativo)"""
+    if tipo == "progresso":
+        processados, total = dados
+        texto = f"{processados}" if total is None else f"{processados} de {total}"
+        estado = regulador.estado()
+        print(
+            f"\rArquivos processados: {texto} ({estado.arquivos_por_segundo:.0f} arquivos/s, "
+            f"{estado.mb_por_segundo:.1f} MB/s)  ",
+            end="",
+            file=sys.stderr,
+            flush=True
+        )
+    elif tipo == "etapa":
+        print(f"\n{dados[0]}", file=sys.stderr, flush=True)
+
+
+def validar_pastas(pastas):
+    invalidas = [pasta for pasta in pastas if not os.path.isdir(pasta)]
+    if invalidas:
+        print(f"Pasta inválida: {', '.join(invalidas)}", file=sys.stderr)
+        return False
+    return True
+
+
+def usa_conteudo(args):
+    """Indica se a análise lê o conteúdo dos arquivos (e, portanto, usa o cache)"""
+    return args.content or args.access_key or args.canonical
+
+
+def executar_analise(args):
+    """Executa a análise descrita pelos argumentos; retorna o resultado ou um código de saída"""
+    if not validar_pastas(args.pastas):
+        return SAIDA_USO
+    sufixos = carregar_sufixos(args.suffixes_file)
+    if not sufixos and not usa_conteudo(args):
+        print(
+            "Não há sufixos cadastrados. Informe --content, --access-key, --canonical ou cadastre sufixos.",
+            file=sys.stderr
+        )
+        return SAIDA_USO
+    try:
+        compilar_regras(tuple(sufixos))
+    except re.error as e:
+        print(f"Regra de sufixo inválida: {e}", file=sys.stderr)
+        return SAIDA_USO
+
+    cache = None
+    if usa_conteudo(args) and not args.no_cache:
+        cache = abrir_cache(caminho_cache(args.suffixes_file))
+    try:
+        resultado = analisar(
+            args.pastas,
+            sufixos,
+            recursivo=args.recursive,
+            conteudo=args.content,
+            chave_acesso=args.access_key,
+            canonico=args.canonical,
+            incluir_zip=args.zip,
+            cache=cache,
+            notificar=notificar_progresso if sys.stderr.isatty() else None
+        )
+    finally:
+        if cache is not None:
+            cache.fechar()
+    if sys.stderr.isatty():
+        print(file=sys.stderr)
+    return resultado
+
+
+def escrever_analise(resultado, formato, saida):
+    """Escreve o resultado da análise, percorrendo as entradas sem montar cópias"""
+    ativos = (
+        (entrada, situacao) for entrada, situacao in zip(resultado.entradas, resultado.status)
+        if situacao != STATUS_REMOVIDO
+    )
+    if formato == "json":
+        saida.write('{"total": %d, "para_excluir": %d, "arquivos": [' % (len(resultado), resultado.total_para_excluir()))
+        for posicao, (entrada, situacao) in enumerate(ativos):
+            item = {
+                "caminho": entrada.caminho,
+                "nome": entrada.nome,
+                "pasta": entrada.pasta,
+                "tamanho": entrada.tamanho,
+                "status": CHAVES_STATUS[situacao],
+            }
+            saida.write(("," if posicao else "") + "\n  " + json.dumps(item, ensure_ascii=False))
+        saida.write("\n]}\n")
+    elif formato == "csv":
+        escritor = csv.writer(saida)
+        escritor.writerow(["caminho", "nome", "pasta", "tamanho", "status"])
+        for entrada, situacao in ativos:
+            escritor.writerow([entrada.caminho, entrada.nome, entrada.pasta, entrada.tamanho, CHAVES_STATUS[situacao]])
+    else:
+        saida.write(resultado.resumo() + "\n")
+        marcados = [
+            (entrada, situacao) for entrada, situacao in ativos
+            if situacao != STATUS_MANTER and situacao != STATUS_VINCULADO
+        ]
+        if marcados:
+            saida.write("\nArquivos para exclusão:\n")
+            for entrada, situacao in sorted(marcados):
+                saida.write(f"{ROTULOS_STATUS[situacao]} {entrada.caminho}\n")
+
+
+# Chave JSON, valor da coluna "resultado" do CSV e títulos do texto de
+# cada operação sobre os arquivos
+ACOES = {
+    "excluir": ("excluidos", "excluido", "Arquivos excluídos com sucesso", "Erros ao excluir"),
+    "quarentena": ("movidos", "movido", "Arquivos movidos para a quarentena", "Erros ao mover"),
+    "restaurar": ("restaurados", "restaurado", "Arquivos restaurados", "Erros ao restaurar"),
+    "vincular": ("vinculados", "vinculado", "Arquivos trocados por links físicos", "Erros ao vincular"),
+}
+
+
+def escrever_exclusao(excluidos, erros, formato, saida, acao="excluir", bytes_recuperados=None):
+    """Escreve o resultado da exclusão, da quarentena, da restauração ou da troca por links"""
+    chave, situacao, titulo, titulo_erros = ACOES[acao]
+    if formato == "json":
+        dados = {
+            chave: excluidos,
+            "erros": [{"caminho": caminho, "erro": mensagem} for caminho, mensagem in erros],
+        }
+        if bytes_recuperados is not None:
+            dados["bytes_recuperados"] = bytes_recuperados
+        json.dump(dados, saida, ensure_ascii=False, indent=2)
+        saida.write("\n")
+    elif formato == "csv":
+        escritor = csv.writer(saida)
+        escritor.writerow(["caminho", "resultado", "erro"])
+        for caminho in excluidos:
+            escritor.writerow([caminho, situacao, ""])
+        for caminho, mensagem in erros:
+            escritor.writerow([caminho, "erro", mensagem])
+    else:
+        saida.write(f"{titulo}: {len(excluidos)}\n")
+        if bytes_recuperados is not None:
+            saida.write(f"Espaço recuperado: {bytes_recuperados / (1024 * 1024):.1f} MB\n")
+        if erros:
+            saida.write(f"{titulo_erros}: {len(erros)}\n")
+            for caminho, mensagem in erros:
+                saida.write(f"{caminho}: {mensagem}\n")
+
+
+def comando_analyze(args):
+    resultado = executar_analise(args)
+    if isinstance(resultado, int):
+        return resultado
+    saida = abrir_saida(args.output)
+    try:
+        escrever_analise(resultado, args.format, saida)
+    finally:
+        if saida is not sys.stdout:
+            saida.close()
+    return SAIDA_DUPLICADOS if resultado.total_para_excluir() else SAIDA_OK
+
+
+def carregar_lista(args):
+    """Arquivos da lista de merge-manifests, dentro das pastas informadas, que ainda conferem com o manifesto
+
+    Retorna (caminhos, erros), ou um código de saída.
+    """
+    if not validar_pastas(args.pastas):
+        return SAIDA_USO
+    try:
+        itens = manifesto.ler_lista(args.from_list)
+    except (OSError, ValueError, IndexError) as e:
+        print(f"Lista inválida: {e}", file=sys.stderr)
+        return SAIDA_USO
+    raizes = tuple(os.path.join(os.path.normcase(os.path.abspath(pasta)), "") for pasta in args.pastas)
+    dentro = [item for item in itens if os.path.normcase(item.caminho).startswith(raizes)]
+    if len(dentro) < len(itens):
+        print(
+            f"{len(itens) - len(dentro)} arquivos da lista estão fora das pastas informadas e foram ignorados.",
+            file=sys.stderr
+        )
+    caminhos, erros, _ = manifesto.conferir(dentro)
+    return caminhos, erros
+
+
+def comando_delete(args):
+    if args.from_list:
+        lista = carregar_lista(args)
+        if isinstance(lista, int):
+            return lista
+        files_to_delete, erros_lista = lista
+        resultado = None
+        em_disco, por_zip = files_to_delete, {}
+    else:
+        resultado = executar_analise(args)
+        if isinstance(resultado, int):
+            return resultado
+        files_to_delete = resultado.caminhos_para_excluir()
+        erros_lista = []
+        # Membros de ZIPs saem regravando o ZIP, os demais são excluídos ou movidos
+        em_disco, por_zip = resultado.separar_compactados(files_to_delete)
+    if files_to_delete and not args.yes:
+        if not sys.stdin.isatty():
+            print("Use --yes para confirmar a exclusão fora de um terminal interativo.", file=sys.stderr)
+            return SAIDA_USO
+        verbo = "mover para a quarentena" if args.quarantine else "excluir"
+        resposta = input(f"Tem certeza que deseja {verbo} {len(files_to_delete)} arquivos duplicados? [s/N] ")
+        if resposta.strip().lower() not in ("s", "sim", "y", "yes"):
+            return SAIDA_OK
+
+    if args.quarantine:
+        lote = novo_lote()
+        excluidos, erros, _ = mover_para_quarentena(em_disco, args.pastas, lote)
+        if por_zip:
+            membros, falhas, _ = mover_compactados_para_quarentena(por_zip, args.pastas, lote)
+            excluidos += membros
+            erros += falhas
+    else:
+        excluidos, erros, _ = excluir_arquivos(em_disco, tamanho=resultado.tamanho_de if resultado else None)
+        if por_zip:
+            membros, falhas, _ = reescrever_compactados(por_zip)
+            excluidos += membros
+            erros += falhas
+    erros = erros_lista + erros
+    if excluidos and usa_conteudo(args) and not args.no_cache:
+        cache = abrir_cache(caminho_cache(args.suffixes_file))
+        if cache is not None:
+            try:
+                cache.remover(excluidos)
+            finally:
+                cache.fechar()
+
+    saida = abrir_saida(args.output)
+    try:
+        escrever_exclusao(excluidos, erros, args.format, saida, "quarentena" if args.quarantine else "excluir")
+    finally:
+        if saida is not sys.stdout:
+            saida.close()
+    return SAIDA_FALHAS if erros else SAIDA_OK
+
+
+def comando_link(args):
+    # Só cópias byte a byte idênticas podem virar links para o original
+    args.content = True
+    resultado = executar_analise(args)
+    if isinstance(resultado, int):
+        return resultado
+    pares = resultado.pares_para_vincular()
+    if pares and not args.yes:
+        if not sys.stdin.isatty():
+            print("Use --yes para confirmar a troca fora de um terminal interativo.", file=sys.stderr)
+            return SAIDA_USO
+        resposta = input(f"Trocar {len(pares)} cópias idênticas por links físicos para o original? [s/N] ")
+        if resposta.strip().lower() not in ("s", "sim", "y", "yes"):
+            return SAIDA_OK
+
+    vinculados, erros, _, recuperados = consolidar(pares)
+    saida = abrir_saida(args.output)
+    try:
+        escrever_exclusao(vinculados, erros, args.format, saida, "vincular", recuperados)
+    finally:
+        if saida is not sys.stdout:
+            saida.close()
+    return SAIDA_FALHAS if erros else SAIDA_OK
+
+
+def comando_export_manifest(args):
+    if not validar_pastas(args.pastas):
+        return SAIDA_USO
+    cache = None if args.no_cache else abrir_cache(caminho_cache(args.suffixes_file))
+    erros = []
+    try:
+        total = manifesto.exportar(
+            args.pastas,
+            args.output,
+            host=args.host,
+            recursivo=args.recursive,
+            chave_acesso=args.access_key,
+            cache=cache,
+            notificar=notificar_progresso if sys.stderr.isatty() else None,
+            erros=erros
+        )
+    except OSError as e:
+        if sys.stderr.isatty():
+            print(file=sys.stderr)
+        print(f"Não foi possível gravar o manifesto em {args.output}: {e.strerror or e}", file=sys.stderr)
+        return SAIDA_USO
+    finally:
+        if cache is not None:
+            cache.fechar()
+    if sys.stderr.isatty():
+        print(file=sys.stderr)
+    for pasta, mensagem in erros:
+        print(f"Erro ao ler a pasta {pasta}: {mensagem}", file=sys.stderr)
+    print(f"Manifesto gravado em {args.output}: {total} arquivos", file=sys.stderr)
+    return SAIDA_OK
+
+
+def comando_merge_manifests(args):
+    try:
+        totais = manifesto.mesclar(args.manifestos, args.output_dir)
+    except (OSError, ValueError, EOFError) as e:
+        print(f"Erro ao mesclar os manifestos: {e}", file=sys.stderr)
+        return SAIDA_USO
+
+    if args.format == "json":
+        json.dump(
+            {
+                host: {"arquivos": arquivos, "bytes": tamanho, "lista": manifesto.caminho_lista(args.output_dir, host)}
+                for host, (arquivos, tamanho) in totais.items()
+            },
+            sys.stdout,
+            ensure_ascii=False,
+            indent=2
+        )
+        sys.stdout.write("\n")
+    elif args.format == "csv":
+        escritor = csv.writer(sys.stdout)
+        escritor.writerow(["servidor", "arquivos", "bytes", "lista"])
+        for host, (arquivos, tamanho) in totais.items():
+            escritor.writerow([host, arquivos, tamanho, manifesto.caminho_lista(args.output_dir, host)])
+    else:
+        for host, (arquivos, tamanho) in totais.items():
+            lista = manifesto.caminho_lista(args.output_dir, host) if arquivos else "-"
+            sys.stdout.write(f"{host}\t{arquivos} arquivos\t{tamanho / (1024 * 1024):.1f} MB\t{lista}\n")
+    return SAIDA_DUPLICADOS if any(arquivos for arquivos, _ in totais.values()) else SAIDA_OK
+
+
+def comando_restore(args):
+    if not validar_pastas(args.pastas):
+        return SAIDA_USO
+    lotes = {pasta: listar_lotes(pasta) for pasta in args.pastas}
+
+    if args.list:
+        saida = abrir_saida(args.output)
+        try:
+            if args.format == "json":
+                json.dump({pasta: [os.path.basename(lote) for lote in itens] for pasta, itens in lotes.items()}, saida,
+                          ensure_ascii=False, indent=2)
+                saida.write("\n")
+            elif args.format == "csv":
+                escritor = csv.writer(saida)
+                escritor.writerow(["pasta", "lote"])
+                escritor.writerows([pasta, os.path.basename(lote)] for pasta, itens in lotes.items() for lote in itens)
+            else:
+                for pasta, itens in lotes.items():
+                    for lote in itens:
+                        saida.write(f"{pasta}\t{os.path.basename(lote)}\n")
+        finally:
+            if saida is not sys.stdout:
+                saida.close()
+        return SAIDA_OK
+
+    selecionados = []
+    for pasta, itens in lotes.items():
+        if args.batch:
+            itens = [lote for lote in itens if os.path.basename(lote) == args.batch]
+            if not itens:
+                print(f"Lote {args.batch} não encontrado na quarentena de {pasta}.", file=sys.stderr)
+                return SAIDA_USO
+        if itens:
+            selecionados.append(itens[-1])
+    if not selecionados:
+        print("Não há lotes de quarentena nas pastas informadas.", file=sys.stderr)
+        return SAIDA_OK
+
+    restaurados, erros = [], []
+    for lote in selecionados:
+        feitos, falhas, _ = restaurar_lote(lote)
+        restaurados += feitos
+        erros += falhas
+
+    saida = abrir_saida(args.output)
+    try:
+        escrever_exclusao(restaurados, erros, args.format, saida, "restaurar")
+    finally:
+        if saida is not sys.stdout:
+            saida.close()
+    return SAIDA_FALHAS if erros else SAIDA_OK
+
+
+def escrever_monitoramento(tipo, dados, formato, saida):
+    """Escreve cada arquivo marcado pelo monitoramento assim que é tratado, e o resumo final"""
+    if tipo == "monitor_arquivo":
+        caminho, regra, resultado = dados
+        if formato == "json":
+            saida.write(json.dumps({"caminho": caminho, "regra": regra, "resultado": resultado}, ensure_ascii=False))
+            saida.write("\n")
+        elif formato == "csv":
+            csv.writer(saida).writerow([caminho, regra, resultado])
+        else:
+            saida.write(f"[{resultado}] {caminho} ({regra})\n")
+        saida.flush()
+    elif tipo == "resumo":
+        resumo = dados[0]
+        if formato == "json":
+            saida.write(json.dumps({"resumo": resumo}) + "\n")
+        elif formato == "text":
+            saida.write(
+                f"{resumo['vistos']} arquivos novos, {resumo['marcados']} marcados, {resumo['erros']} erros; "
+                f"latência p50 {resumo['latencia_p50_s']:.3f}s, p95 {resumo['latencia_p95_s']:.3f}s\n"
+            )
+
+
+def comando_watch(args):
+    if not validar_pastas(args.pastas):
+        return SAIDA_USO
+    if args.interval <= 0:
+        print("--interval deve ser positivo.", file=sys.stderr)
+        return SAIDA_USO
+    sufixos = carregar_sufixos(args.suffixes_file)
+    if not sufixos:
+        print("Não há sufixos cadastrados para classificar os arquivos novos.", file=sys.stderr)
+        return SAIDA_USO
+    try:
+        compilar_regras(tuple(sufixos))
+    except re.error as e:
+        print(f"Regra de sufixo inválida: {e}", file=sys.stderr)
+        return SAIDA_USO
+
+    saida = abrir_saida(args.output)
+    if args.format == "csv":
+        csv.writer(saida).writerow(["caminho", "regra", "resultado"])
+    interativo = sys.stderr.isatty()
+
+    def notificar(tipo, *dados):
+        if tipo == "monitor_inicio":
+            print(f"Monitorando {len(args.pastas)} pasta(s) via {dados[0]}; Ctrl+C para encerrar.", file=sys.stderr)
+        elif tipo == "monitor" and interativo:
+            resumo = dados[0]
+            print(
+                f"\rVistos: {resumo['vistos']}  marcados: {resumo['marcados']}  "
+                f"p95: {resumo['latencia_p95_s']:.2f}s  ", end="", file=sys.stderr, flush=True
+            )
+        else:
+            escrever_monitoramento(tipo, dados, args.format, saida)
+
+    cancelar = threading.Event()
+    monitor = Monitor(
+        args.pastas,
+        # As mudanças no arquivo de sufixos valem sem reiniciar o monitoramento
+        lambda: carregar_sufixos(args.suffixes_file),
+        recursivo=args.recursive,
+        acao=ACOES_WATCH[args.action],
+        cancelar=cancelar,
+        notificar=notificar,
+        polling=args.polling,
+        intervalo=args.interval,
+        arquivo_metricas=args.metrics_file
+    )
+    # O monitoramento roda em outra thread para que o Ctrl+C apenas o
+    # sinalize e os marcados pendentes ainda sejam tratados. A espera é
+    # feita em um Event: um Thread.join interrompido pelo Ctrl+C pode
+    # considerar encerrada uma thread que ainda está rodando.
+    falha = []
+    terminado = threading.Event()
+
+    def executar():
+        try:
+            monitor.executar()
+        except Exception as e:
+            falha.append(e)
+        finally:
+            terminado.set()
+
+    threading.Thread(target=executar, name="monitor", daemon=True).start()
+    try:
+        while not terminado.wait(0.5):
+            pass
+    except KeyboardInterrupt:
+        cancelar.set()
+        terminado.wait()
+    try:
+        if interativo:
+            print(file=sys.stderr)
+        if falha:
+            print(f"Erro no monitoramento: {falha[0]}", file=sys.stderr)
+            return SAIDA_USO
+        escrever_monitoramento("resumo", (monitor.estatisticas.resumo(),), args.format, saida)
+    finally:
+        if saida is not sys.stdout:
+            saida.close()
+    return SAIDA_FALHAS if monitor.estatisticas.erros else SAIDA_OK
+
+
+def comando_detect_suffixes(args):
+    if not validar_pastas(args.pastas):
+        return SAIDA_USO
+    if not 0 < args.sample <= 1 or args.top < 1:
+        print("--sample deve estar entre 0 e 1 e --top deve ser positivo.", file=sys.stderr)
+        return SAIDA_USO
+    detectados = detectar_sufixos(
+        lambda: (entrada.nome for entrada in varrer_pastas(args.pastas, args.recursive)),
+        amostra=args.sample,
+        limite=args.top,
+        notificar=notificar_progresso if sys.stderr.isatty() else None
+    )
+    if sys.stderr.isatty():
+        print(file=sys.stderr)
+
+    if args.add and detectados:
+        sufixos = carregar_sufixos(args.suffixes_file)
+        novos = [item.sufixo for item in detectados if item.sufixo not in sufixos]
+        if novos:
+            salvar_sufixos(sufixos + novos, args.suffixes_file)
+
+    saida = abrir_saida(args.output)
+    try:
+        if args.format == "json":
+            json.dump([item._asdict() for item in detectados], saida, ensure_ascii=False, indent=2)
+            saida.write("\n")
+        elif args.format == "csv":
+            escritor = csv.writer(saida)
+            escritor.writerow(["sufixo", "grupos", "exemplos"])
+            escritor.writerows([item.sufixo, item.grupos, ";".join(item.exemplos)] for item in detectados)
+        else:
+            for item in detectados:
+                saida.write(f"{item.sufixo}\t{item.grupos} grupos\t{', '.join(item.exemplos)}\n")
+    finally:
+        if saida is not sys.stdout:
+            saida.close()
+    return SAIDA_OK
+
+
+COMANDOS = {
+    "analyze": comando_analyze,
+    "delete": comando_delete,
+    "link": comando_link,
+    "export-manifest": comando_export_manifest,
+    "merge-manifests": comando_merge_manifests,
+    "restore": comando_restore,
+    "watch": comando_watch,
+    "detect-suffixes": comando_detect_suffixes,
+}
+
+
+def main(argv=None):
+    """Ponto de entrada da linha de comando; retorna o código de saída"""
+    args = criar_parser().parse_args(argv)
+    telemetria.configurar_log(args.log_file)
+    for opcao, valor in (("--max-files-per-second", args.max_files_per_second),
+                         ("--max-mb-per-second", args.max_mb_per_second)):
+        if valor is not None and valor <= 0:
+            print(f"{opcao} deve ser positivo.", file=sys.stderr)
+            return SAIDA_USO
+    if args.max_files_per_second or args.max_mb_per_second or args.adaptive_concurrency:
+        regulador.configurar(args.max_files_per_second, args.max_mb_per_second, args.adaptive_concurrency)
+    perfil = telemetria.Perfil(args.comando.replace("-", "_")) if args.profile else contextlib.nullcontext()
+    try:
+        with perfil:
+            return COMANDOS[args.comando](args)
+    except KeyboardInterrupt:
+        print("\nInterrompido pelo usuário.", file=sys.stderr)
+        return SAIDA_INTERROMPIDO
+    finally:
+        telemetria.exportar_prometheus(args.metrics_file)
+        if args.profile and perfil.arquivos:
+            print(f"Perfil gravado em: {', '.join(perfil.arquivos)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    # Necessário para o pool de processos em executáveis do PyInstaller
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""Leitura e reescrita de arquivos ZIP sem extrair os XMLs para o disco.
+
+Cada ZIP é tratado como uma pasta virtual: a leitura percorre os membros
+.xml em uma única passagem sequencial, calculando (se pedido) o BLAKE2b
+de cada um enquanto ele é descompactado em blocos, e a reescrita copia
+para um novo arquivo apenas os membros que devem ser mantidos, também em
+uma única passagem. O novo arquivo é gravado com nome temporário e só
+então substitui o destino. Vários ZIPs são processados em paralelo, um
+por processo, já que descompactar e recompactar consome CPU.
+
+Não depende do engine, para que as funções possam ser enviadas aos
+processos do pool sem importar o restante do programa.
+"""
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+import multiprocessing
+import os
+import shutil
+import time
+import zipfile
+
+EXTENSAO_ZIP = ".zip"
+
+# Mesmos parâmetros do hash de arquivos do engine, para que membros e
+# arquivos em disco idênticos tenham o mesmo digest
+TAMANHO_BLOCO = 1024 * 1024
+TAMANHO_DIGEST = 20
+
+# Membro .xml de um ZIP; `digest` só é calculado quando o conteúdo é comparado
+MembroZip = namedtuple("MembroZip", ["nome", "tamanho", "mtime_ns", "digest"])
+
+
+def eh_compactado(nome):
+    """Indica se o nome é de um arquivo ZIP (respeitando a sensibilidade a maiúsculas do sistema)"""
+    return not nome.startswith(".") and os.path.normcase(nome).endswith(EXTENSAO_ZIP)
+
+
+def _eh_membro_xml(info):
+    base = info.filename.rsplit("/", 1)[-1]
+    return not info.is_dir() and not base.startswith(".") and base.lower().endswith(".xml")
+
+
+def _mtime_ns(info):
+    # Data local, sem fuso, guardada no cabeçalho do membro
+    return int(time.mktime(info.date_time + (0, 0, -1))) * 1_000_000_000
+
+
+def _mensagem(erro):
+    if isinstance(erro, OSError):
+        return erro.strerror or str(erro)
+    return str(erro) or type(erro).__name__
+
+
+def ler_membros(caminho, conteudo=False):
+    """Lista os membros .xml do ZIP, com o BLAKE2b de cada um se `conteudo`
+
+    O arquivo é lido uma única vez, na ordem em que os membros foram
+    gravados. Retorna (membros, None), ou (None, mensagem) se o ZIP não
+    puder ser lido (corrompido, criptografado ou com compressão não
+    suportada).
+    """
+    membros = []
+    try:
+        with zipfile.ZipFile(caminho) as arquivo:
+            for info in arquivo.infolist():
+                if not _eh_membro_xml(info):
+                    continue
+                digest = None
+                if conteudo:
+                    calculo = hashlib.blake2b(digest_size=TAMANHO_DIGEST)
+                    with arquivo.open(info) as membro:
+                        for bloco in iter(lambda: membro.read(TAMANHO_BLOCO), b""):
+                            calculo.update(bloco)
+                    digest = calculo.hexdigest()
+                membros.append(MembroZip(info.filename, info.file_size, _mtime_ns(info), digest))
+    except (OSError, zipfile.BadZipFile, RuntimeError, NotImplementedError, EOFError) as e:
+        return None, _mensagem(e)
+    return membros, None
+
+
+def _copiar_info(info):
+    """Novo ZipInfo com os metadados do membro, sem as posições do arquivo de origem"""
+    novo = zipfile.ZipInfo(info.filename, info.date_time)
+    novo.compress_type = info.compress_type
+    novo.comment = info.comment
+    novo.extra = info.extra
+    novo.create_system = info.create_system
+    novo.external_attr = info.external_attr
+    # Com o tamanho conhecido, o zipfile decide de antemão se precisa de ZIP64
+    novo.file_size = info.file_size
+    return novo
+
+
+def reescrever(origem, remover, destino=None):
+    """Grava em `destino` (padrão: a própria origem) o ZIP sem os membros em `remover`
+
+    Uma única passagem sequencial: cada membro mantido é descompactado da
+    origem e recompactado no arquivo temporário, com o mesmo método de
+    compressão, data e atributos. O temporário substitui o destino só
+    depois de gravado em disco. Retorna (bytes recuperados, None), ou
+    (0, mensagem) em caso de erro, sem alterar o destino.
+    """
+    destino = destino or origem
+    remover = set(remover)
+    temporario = f"{destino}.{os.getpid()}.tmp"
+    try:
+        tamanho_anterior = os.path.getsize(origem)
+        with zipfile.ZipFile(origem) as entrada, zipfile.ZipFile(temporario, "w") as saida:
+            saida.comment = entrada.comment
+            for info in entrada.infolist():
+                if info.filename in remover:
+                    continue
+                novo = _copiar_info(info)
+                if info.is_dir():
+                    saida.writestr(novo, b"")
+                    continue
+                with entrada.open(info) as leitura, saida.open(novo, "w") as escrita:
+                    shutil.copyfileobj(leitura, escrita, TAMANHO_BLOCO)
+        with open(temporario, "rb+") as f:
+            os.fsync(f.fileno())
+        tamanho_novo = os.path.getsize(temporario)
+        os.replace(temporario, destino)
+    except (OSError, zipfile.BadZipFile, RuntimeError, NotImplementedError, EOFError) as e:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        return 0, _mensagem(e)
+    return max(tamanho_anterior - tamanho_novo, 0), None
+
+
+def em_paralelo(funcao, argumentos, max_workers=None, cancelar=None, progresso=None):
+    """Aplica `funcao(*args)` a cada tupla de `argumentos` em um pool de processos, um ZIP por tarefa
+
+    Os resultados chegam na ordem em que os ZIPs terminam; ao cancelar, as
+    tarefas ainda não iniciadas são descartadas e as em andamento terminam.
+    `progresso(feitos, total)` é chamado a cada ZIP. Retorna a lista de
+    resultados na ordem de `argumentos` (None nos não processados) e se
+    houve cancelamento.
+    """
+    resultados = [None] * len(argumentos)
+    if not argumentos:
+        return resultados, False
+    cancelado = False
+    # "spawn" evita herdar por fork as threads da interface e da varredura
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=contexto) as executor:
+        futuros = {executor.submit(funcao, *args): posicao for posicao, args in enumerate(argumentos)}
+        for feitos, futuro in enumerate(as_completed(futuros), 1):
+            if futuro.cancelled():
+                continue
+            resultados[futuros[futuro]] = futuro.result()
+            if progresso is not None:
+                progresso(feitos, len(argumentos))
+            if not cancelado and cancelar is not None and cancelar.is_set():
+                cancelado = True
+                for pendente in futuros:
+                    pendente.cancel()
+    return resultados, cancelado
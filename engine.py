@@ -0,0 +1,1779 @@
+"""Motor de análise e exclusão de arquivos XML duplicados.
+
+Reúne a varredura de pastas (e dos ZIPs dentro delas), a classificação
+por sufixo e por conteúdo, o cache de análise e a exclusão em paralelo,
+com os limites de E/S do regulador (limites.py) aplicados à varredura, aos
+hashes e às operações em lotes.
+Não depende de customtkinter nem de PIL, então pode ser usado tanto pela
+interface (app.py) quanto pela linha de comando (cli.py).
+"""
+import fnmatch
+import os
+import re
+from collections import namedtuple, Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import lru_cache, partial
+from array import array
+import hashlib
+import logging
+import multiprocessing
+import queue
+import sqlite3
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+import compactados
+import fiscal
+from limites import regulador
+from telemetria import capturar_alocacoes, etapa, metricas
+
+# Arquivo padrão com os sufixos de arquivos duplicados e sufixos criados
+# quando ele ainda não existe (códigos de evento da SEFAZ)
+ARQUIVO_SUFIXOS = "sufixos_duplicados.txt"
+SUFIXOS_PADRAO = ["-110110.xml", "-210210.xml", "-110111.xml", "-210200.xml", "-210220.xml", "-210240.xml"]
+
+# Regras do arquivo de sufixos: linhas sem prefixo são sufixos literais,
+# "glob:" casa o nome inteiro com curingas e "re:" procura uma expressão
+# regular no nome. Linhas iniciadas por "#" são comentários; a primeira
+# guarda a versão do arquivo, incrementada a cada gravação
+PREFIXO_GLOB = "glob:"
+PREFIXO_REGEX = "re:"
+PREFIXO_COMENTARIO = "#"
+CABECALHO_VERSAO = "# versao: "
+
+# Regras glob:/re: por bloco ao localizar qual delas casou com um nome
+BLOCO_REGRAS = 32
+
+# Detecção de sufixos: colunas e linhas de cada count-min sketch de nomes
+# base (1 byte por célula, 1 MB por sketch), níveis de amostragem (o nível
+# k conta 1/2^k dos nomes base; 12 MB no total) e nomes que um sketch conta
+# com poucos falsos grupos (carga de 1/16 por célula, cerca de 1 falso
+# grupo a cada 100 mil nomes), sufixos acompanhados pelo contador top-k e
+# exemplos guardados por sufixo
+LARGURA_SKETCH = 1 << 18
+PROFUNDIDADE_SKETCH = 4
+NIVEIS_SKETCH = 12
+CAPACIDADE_SKETCH = LARGURA_SKETCH // 16
+MAX_SUFIXOS_DETECTADOS = 200
+EXEMPLOS_POR_SUFIXO = 3
+
+# Quantidade de arquivos processados entre cada notificação de progresso
+LOTE_PROGRESSO = 1000
+
+# Threads usadas para listar diretórios; a listagem em compartilhamentos de
+# rede é limitada pela latência, não pela CPU
+MAX_WORKERS_VARREDURA = 16
+
+# Entradas enviadas por lote da thread de listagem para o consumidor
+LOTE_VARREDURA = 500
+
+# Lotes que podem aguardar na fila antes de as threads de listagem pararem
+TAMANHO_FILA_VARREDURA = 64
+
+# Comparação por conteúdo: bytes lidos na primeira etapa (prefixo), tamanho
+# dos blocos de leitura, arquivos enviados por lote ao pool de processos e
+# arquivos por tarefa de cada processo
+TAMANHO_PREFIXO_HASH = 64 * 1024
+TAMANHO_BLOCO_HASH = 1024 * 1024
+TAMANHO_DIGEST = 20
+LOTE_HASH = 2000
+CHUNK_HASH = 32
+
+# Manifesto (manifesto.py): arquivos lidos, e depois ordenados em memória,
+# por trecho gravado em disco
+LOTE_MANIFESTO = 100_000
+
+# Nome do cache de análise (criado ao lado do arquivo de sufixos) e
+# quantidade de caminhos por consulta ao SQLite
+ARQUIVO_CACHE = "cache_analise.sqlite3"
+LOTE_CACHE = 500
+
+# Exclusão: threads simultâneas (limitadas para não saturar o servidor de
+# arquivos) e arquivos por lote entre verificações de cancelamento
+MAX_WORKERS_EXCLUSAO = 8
+LOTE_EXCLUSAO = 500
+
+# Pasta criada dentro de cada pasta analisada para a quarentena
+# (quarentena.py); é ignorada pela varredura
+NOME_QUARENTENA = "_quarentena_xml"
+
+# Situação de cada arquivo analisado
+STATUS_MANTER = 0
+STATUS_SUFIXO = 1
+STATUS_REPETIDO = 2
+STATUS_CONTEUDO = 3
+STATUS_FISCAL = 4
+STATUS_CANONICO = 5
+STATUS_VINCULADO = 6
+STATUS_REMOVIDO = 9
+
+ROTULOS_STATUS = {
+    STATUS_MANTER: "Mantido",
+    STATUS_SUFIXO: "[SERÁ EXCLUÍDO]",
+    STATUS_REPETIDO: "[REPETIDO EM OUTRA PASTA]",
+    STATUS_CONTEUDO: "[CONTEÚDO IDÊNTICO]",
+    STATUS_FISCAL: "[DOCUMENTO FISCAL REPETIDO]",
+    STATUS_CANONICO: "[XML EQUIVALENTE]",
+    STATUS_VINCULADO: "[LINK PARA O ORIGINAL]",
+}
+
+# Nome estável de cada situação, usado nas saídas JSON/CSV
+CHAVES_STATUS = {
+    STATUS_MANTER: "manter",
+    STATUS_SUFIXO: "sufixo",
+    STATUS_REPETIDO: "repetido",
+    STATUS_CONTEUDO: "conteudo",
+    STATUS_FISCAL: "fiscal",
+    STATUS_CANONICO: "canonico",
+    STATUS_VINCULADO: "vinculado",
+    STATUS_REMOVIDO: "removido",
+}
+
+
+logger = logging.getLogger("exclusao_xml.engine")
+
+
+# Entrada leve produzida pela varredura: os dados de tamanho e data vêm do
+# stat em cache do DirEntry, sem materializar a lista completa da pasta
+EntradaXml = namedtuple("EntradaXml", ["caminho", "nome", "tamanho", "mtime_ns", "pasta"])
+
+
+class RegistrosXml:
+    """Armazenamento compacto das entradas de uma análise
+
+    Cada pasta é guardada uma única vez e referenciada pelo índice em
+    `id_pasta`; os nomes ficam em um único buffer UTF-8, separados por NUL
+    (que não pode aparecer em nomes de arquivo), com a posição do fim de
+    cada um em `_fim_nomes`, e tamanho e data ficam em arrays. O caminho
+    completo e a EntradaXml são montados apenas quando consultados, o que
+    reduz o custo por arquivo de quase 500 para menos de 100 bytes.
+    """
+
+    __slots__ = ("pastas", "_ids_pastas", "id_pasta", "_nomes", "_fim_nomes", "tamanhos", "mtimes_ns",
+                 "_ordem_nomes", "_ordem_pastas")
+
+    def __init__(self, entradas=()):
+        self.pastas = []
+        self._ids_pastas = {}
+        self.id_pasta = array("I")
+        self._nomes = bytearray()
+        self._fim_nomes = array("Q")
+        self.tamanhos = array("q")
+        self.mtimes_ns = array("q")
+        self._ordem_nomes = None
+        self._ordem_pastas = None
+        for entrada in entradas:
+            self.adicionar(entrada)
+
+    def adicionar(self, entrada):
+        """Acrescenta uma EntradaXml e retorna o seu índice"""
+        id_pasta = self._ids_pastas.get(entrada.pasta)
+        if id_pasta is None:
+            id_pasta = self._ids_pastas[entrada.pasta] = len(self.pastas)
+            self.pastas.append(entrada.pasta)
+        self.id_pasta.append(id_pasta)
+        # surrogatepass preserva nomes que o sistema de arquivos não decodifica
+        self._nomes += entrada.nome.encode("utf-8", "surrogatepass")
+        self._fim_nomes.append(len(self._nomes))
+        self._nomes.append(0)
+        self.tamanhos.append(entrada.tamanho)
+        self.mtimes_ns.append(entrada.mtime_ns)
+        self._ordem_nomes = self._ordem_pastas = None
+        return len(self.tamanhos) - 1
+
+    def __len__(self):
+        return len(self.tamanhos)
+
+    def nome(self, i):
+        inicio = self._fim_nomes[i - 1] + 1 if i else 0
+        return self._nomes[inicio:self._fim_nomes[i]].decode("utf-8", "surrogatepass")
+
+    def nomes(self):
+        """Lista com todos os nomes, decodificados de uma só vez"""
+        if not self._nomes:
+            return []
+        return self._nomes[:-1].decode("utf-8", "surrogatepass").split("\0")
+
+    def pasta(self, i):
+        return self.pastas[self.id_pasta[i]]
+
+    def caminho(self, i):
+        # Mesmo valor de DirEntry.path, que é os.path.join(pasta, nome)
+        return os.path.join(self.pastas[self.id_pasta[i]], self.nome(i))
+
+    def __getitem__(self, i):
+        """Monta a EntradaXml do índice i"""
+        if i < 0:
+            i += len(self)
+        pasta = self.pastas[self.id_pasta[i]]
+        nome = self.nome(i)
+        return EntradaXml(os.path.join(pasta, nome), nome, self.tamanhos[i], self.mtimes_ns[i], pasta)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def ordem_nomes(self):
+        """Índices das entradas na ordem alfabética dos nomes, calculados uma vez
+
+        As demais ordenações partem desta com ordenações estáveis por chaves
+        inteiras, sem voltar a comparar textos.
+        """
+        if self._ordem_nomes is None:
+            self._ordem_nomes = array("I", sorted(range(len(self)), key=self.nomes().__getitem__))
+        return self._ordem_nomes
+
+    def ordem_pastas(self):
+        """Posição de cada pasta (pelo id) na ordem alfabética"""
+        if self._ordem_pastas is None:
+            self._ordem_pastas = [0] * len(self.pastas)
+            for posicao, id_pasta in enumerate(sorted(range(len(self.pastas)), key=self.pastas.__getitem__)):
+                self._ordem_pastas[id_pasta] = posicao
+        return self._ordem_pastas
+
+
+# Separador usado para informar várias pastas no campo de caminho
+SEPARADOR_PASTAS = ";"
+
+
+def separar_pastas(texto):
+    """Divide o texto do campo de caminho em uma lista de pastas"""
+    return [parte.strip() for parte in texto.split(SEPARADOR_PASTAS) if parte.strip()]
+
+
+def _entrada_xml(entrada, pasta, incluir_zip=False):
+    """Converte um DirEntry em EntradaXml, ou None se não for um arquivo .xml (ou .zip, com `incluir_zip`)"""
+    # Mesma semântica de glob("*.xml"): ignora ocultos e respeita a
+    # sensibilidade a maiúsculas do sistema operacional
+    nome = entrada.name
+    if nome.startswith(".") or not os.path.normcase(nome).endswith(".xml"):
+        if not (incluir_zip and compactados.eh_compactado(nome)):
+            return None
+    try:
+        if not entrada.is_file():
+            return None
+        info = entrada.stat()
+    except OSError:
+        # Arquivo removido ou inacessível durante a varredura
+        return None
+    return EntradaXml(entrada.path, nome, info.st_size, info.st_mtime_ns, pasta)
+
+
+def varrer_pastas(pastas, recursivo=False, max_workers=MAX_WORKERS_VARREDURA, erros=None, incluir_zip=False):
+    """Percorre as pastas com os.scandir em paralelo, produzindo EntradaXml em fluxo
+
+    Cada diretório é listado por uma thread do pool e as entradas chegam em
+    lotes por uma fila limitada, então a classificação começa no primeiro
+    lote mesmo em pastas enormes. Pastas repetidas ou contidas em outra
+    raiz são visitadas uma única vez. Falhas de leitura de diretório são
+    acrescentadas a `erros` como tuplas (pasta, mensagem). Com
+    `incluir_zip`, os arquivos .zip também são produzidos. Com o regulador
+    ativo, cada arquivo consome uma ficha do limite de arquivos por
+    segundo e cada pasta em listagem ocupa uma vaga do controle de
+    concorrência, com a latência medida por arquivo listado.
+    """
+    saida = queue.Queue(maxsize=TAMANHO_FILA_VARREDURA)
+    parar = threading.Event()
+    trava = threading.Lock()
+    visitadas = set()
+    pendentes = [0]
+    controle = regulador.controle("varredura", max_workers)
+    regular = regulador.ativo
+
+    def publicar(item):
+        # put com tempo limite para que as threads não fiquem presas se o
+        # consumidor abandonar o gerador
+        while not parar.is_set():
+            try:
+                saida.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def agendar(pasta, chave):
+        with trava:
+            if chave in visitadas:
+                return
+            visitadas.add(chave)
+            pendentes[0] += 1
+        executor.submit(listar, pasta, chave)
+
+    def publicar_lote(lote):
+        # Retorna o tempo de espera pelo consumidor, que não conta como latência
+        regulador.registrar(len(lote))
+        inicio = time.perf_counter()
+        publicar(("entradas", lote))
+        return time.perf_counter() - inicio
+
+    def listar(pasta, chave):
+        dentro = False
+        vistos = 0
+        espera = 0.0
+        try:
+            if parar.is_set():
+                return
+            if regular:
+                if not controle.entrar(parar):
+                    return
+                dentro = True
+            inicio = time.perf_counter()
+            lote = []
+            with os.scandir(pasta) as entradas:
+                for entrada in entradas:
+                    if parar.is_set():
+                        return
+                    if recursivo and entrada.is_dir(follow_symlinks=False):
+                        if entrada.name == NOME_QUARENTENA:
+                            continue
+                        # Sem seguir links simbólicos, o caminho real do filho
+                        # é o caminho real do pai mais o nome
+                        agendar(entrada.path, os.path.join(chave, os.path.normcase(entrada.name)))
+                        continue
+                    xml = _entrada_xml(entrada, pasta, incluir_zip)
+                    if xml is not None:
+                        lote.append(xml)
+                        if regular:
+                            vistos += 1
+                            espera += regulador.reservar(1, 0, parar)
+                        if len(lote) >= LOTE_VARREDURA:
+                            espera += publicar_lote(lote)
+                            lote = []
+            if lote:
+                espera += publicar_lote(lote)
+        except OSError as e:
+            publicar(("erro", pasta, str(e)))
+        finally:
+            if dentro:
+                controle.sair((time.perf_counter() - inicio - espera) / max(vistos, 1))
+            publicar(("fim_pasta",))
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for pasta in pastas:
+            agendar(pasta, os.path.normcase(os.path.realpath(pasta)))
+        # As entradas de uma pasta sempre chegam antes do seu "fim_pasta", e
+        # as subpastas são agendadas antes dele, então zero pendentes = fim
+        while pendentes[0]:
+            item = saida.get()
+            if item[0] == "entradas":
+                yield from item[1]
+            elif item[0] == "erro":
+                if erros is not None:
+                    erros.append((item[1], item[2]))
+            else:
+                with trava:
+                    pendentes[0] -= 1
+    finally:
+        parar.set()
+        executor.shutdown(wait=True)
+
+
+def grupos_entre_pastas(registros, indices):
+    """Grupos de índices, entre `indices`, de arquivos com o mesmo nome e tamanho em mais de uma pasta
+
+    São apenas candidatos: arquivos diferentes podem ter o mesmo nome e
+    tamanho, então o conteúdo é conferido em marcar_duplicados_entre_pastas.
+    """
+    por_chave = {}
+    for i in indices:
+        por_chave.setdefault((os.path.normcase(registros.nome(i)), registros.tamanhos[i]), []).append(i)
+    return [grupo for grupo in por_chave.values() if len({registros.id_pasta[i] for i in grupo}) > 1]
+
+
+def identidade_arquivo(caminho):
+    """(st_dev, st_ino) do arquivo, a mesma para todos os seus nomes (links físicos), ou None se não puder ser lido"""
+    try:
+        info = os.stat(caminho)
+    except OSError:
+        return None
+    return info.st_dev, info.st_ino
+
+
+def marcar_duplicados_entre_pastas(registros, indices, digests=None, cancelar=None, progresso=None, cache=None):
+    """Pares (índice, índice mantido), entre `indices`, de cópias idênticas (mesmo nome e conteúdo) em outra pasta
+
+    Nome e tamanho iguais só selecionam os candidatos; o conteúdo é
+    confirmado pelo BLAKE2b do arquivo inteiro, calculado no pool de
+    processos e reaproveitado do `cache`, ou dado em `digests` ({índice:
+    digest}) para os membros de ZIPs. Nomes do mesmo arquivo (links
+    físicos) são lidos uma única vez. Arquivos que não puderem ser lidos
+    são mantidos. Em cada grupo é mantido o arquivo de menor caminho, para
+    que o resultado não dependa da ordem em que as threads listaram os
+    diretórios. Retorna None se `cancelar` for acionado.
+    """
+    digests = dict(digests or {})
+    grupos = grupos_entre_pastas(registros, indices)
+    representantes = {}
+    mesmo_arquivo = {}
+    for grupo in grupos:
+        for i in grupo:
+            if i not in digests:
+                identidade = identidade_arquivo(registros.caminho(i))
+                if identidade is not None:
+                    mesmo_arquivo[i] = representantes.setdefault(identidade, i)
+    em_disco = list(representantes.values())
+    if em_disco:
+        with _PoolSobDemanda(None) as pool:
+            hashes = _hashes_em_paralelo(
+                [registros[i] for i in em_disco], None, "hash_completo", pool, cancelar, progresso, cache
+            )
+        if hashes is None:
+            return None
+        lidos = dict(zip(em_disco, hashes))
+        digests.update((i, lidos[representante]) for i, representante in mesmo_arquivo.items())
+
+    repetidos = []
+    for grupo in grupos:
+        por_digest = {}
+        for i in grupo:
+            if digests.get(i) is not None:
+                por_digest.setdefault(digests[i], []).append(i)
+        for copias in por_digest.values():
+            manter = min(copias, key=registros.caminho)
+            repetidos.extend(
+                (i, manter) for i in copias if i != manter and registros.id_pasta[i] != registros.id_pasta[manter]
+            )
+    return repetidos
+
+
+def calcular_hash_arquivo(caminho, limite=None):
+    """Calcula o BLAKE2b do arquivo lendo em blocos (ou só os `limite` primeiros bytes)
+
+    Retorna None se o arquivo não puder ser lido.
+    """
+    digest = hashlib.blake2b(digest_size=TAMANHO_DIGEST)
+    restante = limite
+    try:
+        with open(caminho, "rb") as f:
+            while restante is None or restante > 0:
+                tamanho = TAMANHO_BLOCO_HASH if restante is None else min(TAMANHO_BLOCO_HASH, restante)
+                bloco = f.read(tamanho)
+                if not bloco:
+                    break
+                digest.update(bloco)
+                if restante is not None:
+                    restante -= len(bloco)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+class _SaidaHash:
+    """Saída de texto que alimenta um hash em vez de guardar o documento canônico"""
+
+    def __init__(self, digest):
+        self.digest = digest
+
+    def write(self, texto):
+        self.digest.update(texto.encode("utf-8"))
+
+
+def calcular_hash_canonico(caminho):
+    """Calcula o BLAKE2b da forma canônica (C14N 2.0) do XML, lido em blocos
+
+    Declaração XML, ordem dos atributos, prefixos de namespace, comentários
+    e espaços nas bordas dos textos não alteram o resultado. O parser
+    alimenta o hash à medida que lê o arquivo, sem montar a árvore.
+    Retorna texto vazio se o arquivo não for um XML bem formado e None se
+    não puder ser lido.
+    """
+    digest = hashlib.blake2b(digest_size=TAMANHO_DIGEST)
+    try:
+        with open(caminho, "rb") as f:
+            ET.canonicalize(from_file=f, out=_SaidaHash(digest), strip_text=True, rewrite_prefixes=True)
+    except ET.ParseError:
+        return ""
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def _aplicar_trecho(funcao, caminhos):
+    """Aplica `funcao` a cada caminho; é a tarefa enviada ao pool de processos com o regulador ativo"""
+    return [funcao(caminho) for caminho in caminhos]
+
+
+def _bytes_cabecalho(entrada):
+    # Estimativa dos bytes lidos para o cabeçalho fiscal, que fica no início do XML
+    return min(entrada.tamanho, TAMANHO_PREFIXO_HASH)
+
+
+def _mapear_regulado(pool, funcao, lote, lidos, controle, cancelar):
+    """Como o map do pool, mas cada trecho de CHUNK_HASH arquivos só é enviado quando o regulador libera
+
+    Antes de cada trecho são reservadas as fichas de arquivos e de bytes
+    (`lidos(entrada)`) e uma vaga do `controle`, liberada quando o processo
+    termina, com a latência por arquivo. Retorna os valores na ordem do
+    lote, ou None se `cancelar` for acionado.
+    """
+    def concluir(futuro, quantidade, tamanho, inicio):
+        controle.sair((time.perf_counter() - inicio) / quantidade)
+        regulador.registrar(quantidade, tamanho)
+
+    futuros = []
+    for posicao in range(0, len(lote), CHUNK_HASH):
+        trecho = lote[posicao:posicao + CHUNK_HASH]
+        tamanho = sum(lidos(entrada) for entrada in trecho)
+        regulador.reservar(len(trecho), tamanho, cancelar)
+        if (cancelar is not None and cancelar.is_set()) or not controle.entrar(cancelar):
+            return None
+        inicio = time.perf_counter()
+        futuro = pool.executor().submit(_aplicar_trecho, funcao, [entrada.caminho for entrada in trecho])
+        futuro.add_done_callback(partial(concluir, quantidade=len(trecho), tamanho=tamanho, inicio=inicio))
+        futuros.append(futuro)
+    return [valor for futuro in futuros for valor in futuro.result()]
+
+
+def _calcular_em_paralelo(entradas, funcao, tipo, pool, cancelar, progresso, cache, lidos=None):
+    """Aplica `funcao(caminho)` às entradas no pool de processos, em lotes canceláveis
+
+    Entradas com valor válido no cache (mesmo tamanho e mtime) não são lidas;
+    valores None (arquivo ilegível) não são gravados. `lidos(entrada)` dá
+    os bytes lidos de cada arquivo, para o limite de MB por segundo e a
+    taxa mostrada (padrão: o tamanho do arquivo).
+    """
+    lidos = lidos or (lambda entrada: entrada.tamanho)
+    conhecidos = cache.obter_varios(entradas, tipo) if cache is not None else {}
+    faltantes = [entrada for entrada in entradas if entrada.caminho not in conhecidos]
+    controle = regulador.controle(tipo, pool.processos)
+    regular = regulador.ativo
+
+    for inicio in range(0, len(faltantes), LOTE_HASH):
+        if cancelar is not None and cancelar.is_set():
+            return None
+        lote = faltantes[inicio:inicio + LOTE_HASH]
+        if regular:
+            valores = _mapear_regulado(pool, funcao, lote, lidos, controle, cancelar)
+            if valores is None:
+                return None
+        else:
+            valores = list(pool.executor().map(funcao, [entrada.caminho for entrada in lote], chunksize=CHUNK_HASH))
+            regulador.registrar(len(lote), sum(lidos(entrada) for entrada in lote))
+        novos = [(entrada, valor) for entrada, valor in zip(lote, valores) if valor is not None]
+        for entrada, valor in novos:
+            conhecidos[entrada.caminho] = valor
+        if cache is not None:
+            cache.gravar_varios(novos, tipo)
+        if progresso is not None:
+            progresso(len(entradas) - len(faltantes) + inicio + len(lote), len(entradas))
+    return [conhecidos.get(entrada.caminho) for entrada in entradas]
+
+
+def _hashes_em_paralelo(entradas, limite, tipo, pool, cancelar, progresso, cache):
+    """Calcula os hashes das entradas (ou de seus `limite` primeiros bytes) no pool de processos"""
+    funcao = partial(calcular_hash_arquivo, limite=limite)
+    lidos = (lambda entrada: min(entrada.tamanho, limite)) if limite is not None else None
+    return _calcular_em_paralelo(entradas, funcao, tipo, pool, cancelar, progresso, cache, lidos)
+
+
+class _PoolSobDemanda:
+    """Cria o pool de processos apenas se algum hash precisar ser calculado"""
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._executor = None
+
+    @property
+    def processos(self):
+        """Quantidade de processos do pool (padrão do ProcessPoolExecutor: um por CPU)"""
+        return self.max_workers or os.cpu_count() or 1
+
+    def executor(self):
+        if self._executor is None:
+            # "spawn" evita herdar por fork as threads da interface e da varredura
+            contexto = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=contexto)
+        return self._executor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+def _subgrupos(grupos, hashes):
+    """Divide cada grupo pelos hashes calculados, descartando subgrupos unitários"""
+    novos = []
+    posicao = 0
+    for grupo in grupos:
+        por_hash = {}
+        for entrada in grupo:
+            digest = hashes[posicao]
+            posicao += 1
+            if digest is not None:
+                por_hash.setdefault(digest, []).append(entrada)
+        novos.extend(membros for membros in por_hash.values() if len(membros) > 1)
+    return novos
+
+
+def agrupar_por_conteudo(entradas, max_workers=None, cancelar=None, progresso=None, cache=None):
+    """Agrupa as entradas com conteúdo byte a byte idêntico
+
+    Os candidatos são filtrados por etapas: tamanho igual, depois BLAKE2b
+    dos primeiros TAMANHO_PREFIXO_HASH bytes e, só para quem ainda colide,
+    o BLAKE2b do arquivo inteiro. Nomes do mesmo arquivo (links físicos,
+    mesmo st_dev e st_ino) são idênticos sem precisar de leitura: só um
+    deles é lido e os demais voltam ao grupo dele no fim. Os hashes são
+    calculados em um pool de processos e, se `cache` for informado,
+    reaproveitados entre análises. Retorna a lista de grupos (listas de
+    EntradaXml com dois ou mais membros), ou None se `cancelar` for
+    acionado.
+    """
+    por_tamanho = {}
+    for entrada in entradas:
+        por_tamanho.setdefault(entrada.tamanho, []).append(entrada)
+    grupos = [grupo for grupo in por_tamanho.values() if len(grupo) > 1]
+    if not grupos:
+        return []
+
+    # Um representante por arquivo; `nomes` guarda todos os nomes de cada um
+    nomes = {}
+    representantes = []
+    for grupo in grupos:
+        por_arquivo = {}
+        for entrada in grupo:
+            identidade = identidade_arquivo(entrada.caminho)
+            if identidade is not None:
+                por_arquivo.setdefault(identidade, []).append(entrada)
+        for mesmos in por_arquivo.values():
+            nomes[mesmos[0].caminho] = mesmos
+        representantes.append([mesmos[0] for mesmos in por_arquivo.values()])
+
+    def expandir(grupo):
+        return [entrada for representante in grupo for entrada in nomes[representante.caminho]]
+
+    vinculados = [expandir(grupo) for grupo in representantes if len(grupo) == 1 and len(nomes[grupo[0].caminho]) > 1]
+    grupos = [grupo for grupo in representantes if len(grupo) > 1]
+    if not grupos:
+        return vinculados
+
+    with _PoolSobDemanda(max_workers) as pool:
+        candidatos = [entrada for grupo in grupos for entrada in grupo]
+        hashes = _hashes_em_paralelo(
+            candidatos, TAMANHO_PREFIXO_HASH, "hash_prefixo", pool, cancelar, progresso, cache
+        )
+        if hashes is None:
+            return None
+        grupos = _subgrupos(grupos, hashes)
+
+        # Arquivos que cabem no prefixo já foram lidos por inteiro
+        completos = [grupo for grupo in grupos if grupo[0].tamanho <= TAMANHO_PREFIXO_HASH]
+        pendentes = [grupo for grupo in grupos if grupo[0].tamanho > TAMANHO_PREFIXO_HASH]
+        candidatos = [entrada for grupo in pendentes for entrada in grupo]
+        hashes = _hashes_em_paralelo(candidatos, None, "hash_completo", pool, cancelar, progresso, cache)
+        if hashes is None:
+            return None
+        return vinculados + [expandir(grupo) for grupo in completos + _subgrupos(pendentes, hashes)]
+
+
+def agrupar_por_xml_canonico(entradas, max_workers=None, cancelar=None, progresso=None, cache=None):
+    """Agrupa as entradas cujo XML é equivalente após a canonicalização
+
+    Ao contrário de agrupar_por_conteudo, o tamanho não serve de filtro
+    (espaços e a declaração mudam o tamanho), então todas as entradas são
+    lidas, no pool de processos e com os hashes reaproveitados do `cache`.
+    Arquivos que não são XML bem formado ficam de fora. Retorna a lista de
+    grupos (listas de EntradaXml com dois ou mais membros), ou None se
+    `cancelar` for acionado.
+    """
+    if len(entradas) < 2:
+        return []
+    with _PoolSobDemanda(max_workers) as pool:
+        hashes = _calcular_em_paralelo(
+            entradas, calcular_hash_canonico, "hash_canonico", pool, cancelar, progresso, cache
+        )
+    if hashes is None:
+        return None
+
+    por_hash = {}
+    for entrada, digest in zip(entradas, hashes):
+        if digest:
+            por_hash.setdefault(digest, []).append(entrada)
+    return [grupo for grupo in por_hash.values() if len(grupo) > 1]
+
+
+def agrupar_por_documento_fiscal(entradas, max_workers=None, cancelar=None, progresso=None, cache=None):
+    """Agrupa as entradas que trazem o mesmo documento ou evento fiscal
+
+    O cabeçalho de cada XML (chave de acesso, tpEvento e nSeqEvento) é lido
+    por fiscal.ler_cabecalho em um pool de processos e, se `cache` for
+    informado, reaproveitado entre análises. Retorna a lista de grupos
+    (listas de pares (EntradaXml, CabecalhoFiscal) com dois ou mais
+    membros), ou None se `cancelar` for acionado.
+    """
+    if not entradas:
+        return []
+    with _PoolSobDemanda(max_workers) as pool:
+        valores = _calcular_em_paralelo(
+            entradas, fiscal.ler_cabecalho_serializado, "cabecalho_fiscal", pool, cancelar, progresso, cache,
+            _bytes_cabecalho
+        )
+    if valores is None:
+        return None
+
+    por_documento = {}
+    for entrada, valor in zip(entradas, valores):
+        cabecalho = fiscal.desserializar(valor)
+        if cabecalho is not None:
+            por_documento.setdefault(fiscal.chave_documento(cabecalho), []).append((entrada, cabecalho))
+    return [grupo for grupo in por_documento.values() if len(grupo) > 1]
+
+
+# Dados de um arquivo para o manifesto; `cabecalho` é o cabeçalho fiscal
+# serializado (texto vazio se não for documento fiscal ou não for lido) e
+# `vinculo` é "st_dev:st_ino" se o arquivo tiver mais de um link físico
+# (texto vazio caso contrário), igual em todos os seus nomes
+RegistroManifesto = namedtuple("RegistroManifesto", ["caminho", "tamanho", "hash", "cabecalho", "vinculo"])
+
+
+def _vinculo(caminho):
+    try:
+        info = os.stat(caminho)
+    except OSError:
+        return ""
+    return f"{info.st_dev}:{info.st_ino}" if info.st_nlink > 1 else ""
+
+
+def registros_manifesto(pastas, recursivo=False, chave_acesso=False, cache=None, cancelar=None, notificar=None,
+                        lote=LOTE_MANIFESTO, erros=None):
+    """Produz, em listas de até `lote` itens, o RegistroManifesto de cada arquivo das pastas
+
+    O hash do arquivo inteiro e, com `chave_acesso`, o cabeçalho fiscal são
+    calculados no pool de processos e reaproveitados do `cache` (os mesmos
+    registros da análise). Só um lote fica em memória por vez. Arquivos
+    que não puderem ser lidos ficam de fora e falhas de leitura de pastas
+    vão para `erros`, como em varrer_pastas. Para de produzir se
+    `cancelar` for acionado.
+    """
+    if notificar is None:
+        notificar = lambda *evento: None
+    processados = [0]
+
+    def calcular(entradas, pool):
+        hashes = _hashes_em_paralelo(entradas, None, "hash_completo", pool, cancelar, None, cache)
+        if hashes is None:
+            return None
+        cabecalhos = [""] * len(entradas)
+        if chave_acesso:
+            cabecalhos = _calcular_em_paralelo(
+                entradas, fiscal.ler_cabecalho_serializado, "cabecalho_fiscal", pool, cancelar, None, cache,
+                _bytes_cabecalho
+            )
+            if cabecalhos is None:
+                return None
+        processados[0] += len(entradas)
+        notificar("progresso", processados[0], None)
+        return [
+            RegistroManifesto(entrada.caminho, entrada.tamanho, digest, cabecalho or "", _vinculo(entrada.caminho))
+            for entrada, digest, cabecalho in zip(entradas, hashes, cabecalhos) if digest is not None
+        ]
+
+    with _PoolSobDemanda(None) as pool:
+        entradas = []
+        for entrada in varrer_pastas(pastas, recursivo, erros=erros):
+            entradas.append(entrada)
+            if len(entradas) >= lote:
+                registros = calcular(entradas, pool)
+                if registros is None:
+                    return
+                yield registros
+                entradas = []
+        if entradas:
+            registros = calcular(entradas, pool)
+            if registros is not None:
+                yield registros
+
+
+def _remover_arquivo(caminho):
+    """Remove um arquivo, retornando a mensagem de erro ou None em caso de sucesso"""
+    try:
+        os.remove(caminho)
+    except OSError as e:
+        return e.strerror or str(e)
+    return None
+
+
+# Resultado de um item que não chegou a ser executado por cancelamento
+_NAO_EXECUTADO = object()
+
+
+def executar_em_lotes(itens, funcao, max_workers=MAX_WORKERS_EXCLUSAO, cancelar=None, progresso=None, preparar=None):
+    """Aplica `funcao` aos itens em um pool de threads limitado, em lotes canceláveis
+
+    `funcao(item)` retorna a mensagem de erro, ou None em caso de sucesso.
+    O cancelamento é verificado entre lotes: o lote em andamento termina e
+    nada mais é enviado. `preparar(lote)`, se informado, roda antes de cada
+    lote; `progresso(feitos, total, itens_por_segundo)` é chamado depois de
+    cada um. Com o regulador ativo, cada item consome uma ficha do limite
+    de arquivos por segundo e ocupa uma vaga do controle de concorrência;
+    ao cancelar, os itens do lote ainda à espera não são executados nem
+    contados como erro. Retorna (concluidos, erros, cancelado), com `erros`
+    como lista de tuplas (item, mensagem).
+    """
+    concluidos = []
+    erros = []
+    cancelado = False
+    inicio = time.perf_counter()
+    controle = regulador.controle("lotes", max_workers)
+    regular = regulador.ativo
+
+    def executar_regulado(item):
+        regulador.reservar(1, 0, cancelar)
+        if (cancelar is not None and cancelar.is_set()) or not controle.entrar(cancelar):
+            return _NAO_EXECUTADO
+        comeco = time.perf_counter()
+        try:
+            return funcao(item)
+        finally:
+            controle.sair(time.perf_counter() - comeco)
+            regulador.registrar(1)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for posicao in range(0, len(itens), LOTE_EXCLUSAO):
+            if cancelar is not None and cancelar.is_set():
+                cancelado = True
+                break
+            lote = itens[posicao:posicao + LOTE_EXCLUSAO]
+            if preparar is not None:
+                preparar(lote)
+            for item, erro in zip(lote, executor.map(executar_regulado if regular else funcao, lote)):
+                if erro is None:
+                    concluidos.append(item)
+                elif erro is _NAO_EXECUTADO:
+                    cancelado = True
+                else:
+                    erros.append((item, erro))
+            if not regular:
+                regulador.registrar(len(lote))
+            if progresso is not None:
+                feitos = posicao + len(lote)
+                decorrido = time.perf_counter() - inicio
+                progresso(feitos, len(itens), feitos / decorrido if decorrido > 0 else 0.0)
+    return concluidos, erros, cancelado
+
+
+def excluir_arquivos(caminhos, max_workers=MAX_WORKERS_EXCLUSAO, cancelar=None, progresso=None, tamanho=None):
+    """Exclui os arquivos em um pool de threads limitado, em lotes canceláveis
+
+    Em compartilhamentos SMB cada exclusão custa uma ida e volta à rede,
+    então várias exclusões simultâneas escondem a latência. O cancelamento
+    é verificado entre lotes: o lote em andamento termina e nada mais é
+    enviado. `progresso(feitos, total, arquivos_por_segundo)` é chamado a
+    cada lote; `tamanho(caminho)`, se informado, dá os bytes de cada
+    arquivo para a métrica de bytes recuperados. Retorna (excluidos, erros,
+    cancelado), com `erros` como lista de tuplas (caminho, mensagem).
+    """
+    with etapa("exclusao", arquivos=len(caminhos)):
+        excluidos, erros, cancelado = executar_em_lotes(
+            caminhos, _remover_arquivo, max_workers, cancelar, progresso
+        )
+    for caminho, erro in erros:
+        logger.warning(f"Erro ao excluir {caminho}: {erro}", extra={"caminho": caminho})
+
+    metricas.incrementar("arquivos_excluidos", len(excluidos))
+    metricas.incrementar("falhas_exclusao", len(erros))
+    if tamanho is not None:
+        metricas.incrementar("bytes_recuperados", sum(tamanho(caminho) for caminho in excluidos))
+    logger.info(
+        "Exclusão concluída",
+        extra={"excluidos": len(excluidos), "erros": len(erros), "cancelado": cancelado}
+    )
+    return excluidos, erros, cancelado
+
+
+def reescrever_compactados(por_zip, origens=None, max_workers=None, cancelar=None, progresso=None):
+    """Regrava cada ZIP sem os membros marcados, um ZIP por processo
+
+    `por_zip` associa o caminho de cada ZIP aos pares (caminho virtual,
+    nome do membro) a remover, como em ResultadoAnalise.separar_compactados.
+    `origens`, se informado, indica de onde ler cada ZIP (a cópia movida
+    para a quarentena); sem ele, o ZIP é substituído no lugar. Um ZIP só é
+    trocado depois de regravado por inteiro, então um erro ou cancelamento
+    não deixa arquivos pela metade. `progresso(feitos, total, zips_por_segundo)`
+    é chamado a cada ZIP. Mesmo retorno de excluir_arquivos, com os
+    caminhos virtuais dos membros removidos.
+    """
+    zips = list(por_zip)
+    origens = origens or {}
+    inicio = time.perf_counter()
+
+    def progresso_zips(feitos, total):
+        if progresso is not None:
+            decorrido = time.perf_counter() - inicio
+            progresso(feitos, total, feitos / decorrido if decorrido > 0 else 0.0)
+
+    with etapa("reescrita_zip", arquivos=len(zips)):
+        resultados, cancelado = compactados.em_paralelo(
+            compactados.reescrever,
+            [(origens.get(caminho, caminho), [membro for _, membro in por_zip[caminho]], caminho) for caminho in zips],
+            max_workers,
+            cancelar,
+            progresso_zips
+        )
+
+    excluidos = []
+    erros = []
+    for caminho, resultado in zip(zips, resultados):
+        if resultado is None:
+            continue
+        recuperados, erro = resultado
+        virtuais = [virtual for virtual, _ in por_zip[caminho]]
+        if erro is not None:
+            logger.warning(f"Erro ao regravar {caminho}: {erro}", extra={"caminho": caminho})
+            erros.extend((virtual, erro) for virtual in virtuais)
+            continue
+        excluidos.extend(virtuais)
+        if caminho not in origens:
+            metricas.incrementar("bytes_recuperados", recuperados)
+
+    metricas.incrementar("arquivos_excluidos", len(excluidos))
+    metricas.incrementar("falhas_exclusao", len(erros))
+    logger.info(
+        "Reescrita de ZIPs concluída",
+        extra={"zips": len(zips), "excluidos": len(excluidos), "erros": len(erros), "cancelado": cancelado}
+    )
+    return excluidos, erros, cancelado
+
+
+class CacheAnalise:
+    """Cache em SQLite de resultados por arquivo, válido enquanto tamanho e mtime não mudam
+
+    Cada registro guarda um valor (hash, classificação) identificado por
+    `tipo`, então novas etapas da análise podem usar o mesmo cache sem
+    alterar o esquema. Uma conexão só pode ser usada pela thread que a criou.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.conexao = sqlite3.connect(caminho)
+        self.conexao.execute("PRAGMA journal_mode=WAL")
+        self.conexao.execute("PRAGMA synchronous=NORMAL")
+        self.conexao.execute(
+            "CREATE TABLE IF NOT EXISTS arquivos ("
+            " caminho TEXT NOT NULL,"
+            " tipo TEXT NOT NULL,"
+            " tamanho INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " valor TEXT,"
+            " PRIMARY KEY (caminho, tipo)"
+            ") WITHOUT ROWID"
+        )
+        self.conexao.commit()
+
+    def obter_varios(self, entradas, tipo):
+        """Retorna {caminho: valor} das entradas cujo registro ainda é válido"""
+        validos = {}
+        for inicio in range(0, len(entradas), LOTE_CACHE):
+            lote = {entrada.caminho: entrada for entrada in entradas[inicio:inicio + LOTE_CACHE]}
+            marcadores = ",".join("?" * len(lote))
+            cursor = self.conexao.execute(
+                f"SELECT caminho, tamanho, mtime_ns, valor FROM arquivos"
+                f" WHERE tipo = ? AND caminho IN ({marcadores})",
+                (tipo, *lote)
+            )
+            for caminho, tamanho, mtime_ns, valor in cursor:
+                entrada = lote[caminho]
+                if entrada.tamanho == tamanho and entrada.mtime_ns == mtime_ns:
+                    validos[caminho] = valor
+        return validos
+
+    def gravar_varios(self, registros, tipo):
+        """Grava pares (entrada, valor), substituindo registros anteriores"""
+        self.conexao.executemany(
+            "INSERT OR REPLACE INTO arquivos (caminho, tipo, tamanho, mtime_ns, valor) VALUES (?, ?, ?, ?, ?)",
+            ((entrada.caminho, tipo, entrada.tamanho, entrada.mtime_ns, valor) for entrada, valor in registros)
+        )
+        self.conexao.commit()
+
+    def remover(self, caminhos):
+        """Remove todos os registros dos caminhos informados"""
+        self.conexao.executemany("DELETE FROM arquivos WHERE caminho = ?", ((caminho,) for caminho in caminhos))
+        self.conexao.commit()
+
+    def fechar(self):
+        self.conexao.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+class IndiceSufixos:
+    """Índice de sufixos agrupados por tamanho, consultado em O(1) por tamanho distinto"""
+
+    def __init__(self, sufixos):
+        # Como os sufixos de evento (-NNNNNN.xml) têm quase todos o mesmo
+        # tamanho, cada nome costuma exigir uma única consulta ao conjunto
+        self.por_tamanho = {}
+        self.tamanhos = []
+        for sufixo in sufixos:
+            self.adicionar(sufixo)
+
+    def adicionar(self, sufixo):
+        """Inclui um sufixo no índice"""
+        if not sufixo:
+            return
+        if len(sufixo) not in self.por_tamanho:
+            self.por_tamanho[len(sufixo)] = set()
+            self.tamanhos = sorted(self.por_tamanho, reverse=True)
+        self.por_tamanho[len(sufixo)].add(sufixo)
+
+    def corresponde(self, nome):
+        """Retorna o sufixo cadastrado com que o nome termina, ou None"""
+        for tamanho in self.tamanhos:
+            cauda = nome[-tamanho:]
+            if cauda in self.por_tamanho[tamanho]:
+                return cauda
+        return None
+
+    def __len__(self):
+        return sum(len(grupo) for grupo in self.por_tamanho.values())
+
+
+# Flags que, escritas no início de uma expressão ((?i), (?x)...), valem
+# para a expressão inteira e não podem ficar dentro de uma alternativa
+FLAGS_GLOBAIS = re.IGNORECASE | re.MULTILINE | re.DOTALL | re.VERBOSE | re.ASCII
+
+
+def validar_regra(regra):
+    """Verifica se a regra pode ser compilada como em RegrasSufixos; lança re.error com o motivo se não puder"""
+    RegrasSufixos([regra])
+
+
+class RegrasSufixos:
+    """Regras do arquivo de sufixos compiladas para uma única avaliação por nome
+
+    Sufixos literais, e globs do tipo *sufixo, ficam no IndiceSufixos; as
+    demais regras glob: e re: são unidas em uma única expressão sem grupos
+    de captura (que impediriam o re de descartar rapidamente cada
+    alternativa). Só nos nomes que casam a regra é localizada, primeiro
+    pelo bloco de BLOCO_REGRAS regras e depois dentro dele. Expressões com
+    grupos de captura (cujos números e referências \\1 mudariam na união)
+    ou com flags globais como (?i) não são unidas: cada uma é avaliada
+    sozinha, depois das demais.
+    """
+
+    def __init__(self, regras):
+        self.literais = IndiceSufixos([])
+        self.origem = {}
+        self.padroes = []
+        self.isoladas = []
+        for regra in regras:
+            if regra.startswith(PREFIXO_GLOB):
+                padrao = regra[len(PREFIXO_GLOB):]
+                if padrao.startswith("*") and not any(c in padrao[1:] for c in "*?["):
+                    self._adicionar_literal(padrao[1:], regra)
+                    continue
+                expressao = r"\A(?:%s)" % fnmatch.translate(padrao)
+            elif regra.startswith(PREFIXO_REGEX):
+                original = re.compile(regra[len(PREFIXO_REGEX):])
+                if original.groups or original.flags & FLAGS_GLOBAIS:
+                    self.isoladas.append((regra, original))
+                    continue
+                expressao = "(?:%s)" % original.pattern
+            else:
+                self._adicionar_literal(regra, regra)
+                continue
+            self.padroes.append((regra, re.compile(expressao)))
+
+        self.blocos = []
+        for inicio in range(0, len(self.padroes), BLOCO_REGRAS):
+            bloco = self.padroes[inicio:inicio + BLOCO_REGRAS]
+            self.blocos.append((self._unir(bloco), bloco))
+        self.expressao = self._unir(self.padroes) if self.padroes else None
+
+    def _adicionar_literal(self, sufixo, regra):
+        if sufixo and sufixo not in self.origem:
+            self.origem[sufixo] = regra
+            self.literais.adicionar(sufixo)
+
+    @staticmethod
+    def _unir(padroes):
+        return re.compile("|".join(expressao.pattern for _, expressao in padroes))
+
+    def corresponde(self, nome):
+        """Retorna a regra que casa com o nome, ou None"""
+        sufixo = self.literais.corresponde(nome)
+        if sufixo is not None:
+            return self.origem[sufixo]
+        if self.expressao is not None and self.expressao.search(nome) is not None:
+            for uniao, bloco in self.blocos:
+                if uniao.search(nome) is None:
+                    continue
+                for regra, expressao in bloco:
+                    if expressao.search(nome) is not None:
+                        return regra
+        for regra, expressao in self.isoladas:
+            if expressao.search(nome) is not None:
+                return regra
+        return None
+
+    def __len__(self):
+        return len(self.origem) + len(self.padroes) + len(self.isoladas)
+
+
+@lru_cache(maxsize=8)
+def compilar_regras(regras):
+    """Compila a tupla de regras, reaproveitando o resultado enquanto ela não mudar"""
+    return RegrasSufixos(regras)
+
+
+class ArquivoRegras:
+    """Arquivo de regras com gravação atômica, versão e releitura apenas quando muda
+
+    A assinatura (mtime e tamanho) do arquivo é comparada a cada carga; o
+    conteúdo só é lido de novo se ela mudar, inclusive por outro processo.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.versao = 0
+        self.regras = []
+        self._assinatura = None
+        self._lock = threading.Lock()
+
+    def _assinatura_atual(self):
+        info = os.stat(self.caminho)
+        return (info.st_mtime_ns, info.st_size)
+
+    def carregar(self):
+        """Retorna a lista de regras, relendo o arquivo apenas se ele mudou (erros são propagados)"""
+        with self._lock:
+            assinatura = self._assinatura_atual()
+            if assinatura != self._assinatura:
+                versao = 0
+                regras = []
+                with open(self.caminho, "r", encoding="utf-8") as f:
+                    for linha in f:
+                        linha = linha.strip()
+                        if linha.startswith(CABECALHO_VERSAO):
+                            versao = int(linha[len(CABECALHO_VERSAO):] or 0)
+                        elif linha and not linha.startswith(PREFIXO_COMENTARIO):
+                            regras.append(linha)
+                self.versao = versao
+                self.regras = regras
+                self._assinatura = assinatura
+            return self.regras
+
+    def salvar(self, regras):
+        """Grava as regras em um arquivo temporário e o troca pelo atual, incrementando a versão"""
+        with self._lock:
+            versao = self.versao + 1
+            temporario = f"{self.caminho}.{os.getpid()}.tmp"
+            try:
+                with open(temporario, "w", encoding="utf-8") as f:
+                    f.write(f"{CABECALHO_VERSAO}{versao}\n")
+                    for regra in regras:
+                        f.write(f"{regra}\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temporario, self.caminho)
+            except OSError:
+                if os.path.exists(temporario):
+                    os.remove(temporario)
+                raise
+            self.versao = versao
+            self.regras = list(regras)
+            self._assinatura = self._assinatura_atual()
+
+
+_arquivos_regras = {}
+_arquivos_regras_lock = threading.Lock()
+
+
+def arquivo_regras(db_file=ARQUIVO_SUFIXOS):
+    """Retorna o ArquivoRegras do caminho, compartilhado para aproveitar a última leitura"""
+    chave = os.path.abspath(db_file)
+    with _arquivos_regras_lock:
+        if chave not in _arquivos_regras:
+            _arquivos_regras[chave] = ArquivoRegras(chave)
+        return _arquivos_regras[chave]
+
+
+class ResultadoAnalise:
+    """Resultado em memória de uma análise, atualizado no lugar quando arquivos são excluídos
+
+    `entradas` (RegistrosXml) e `status` (bytearray) são paralelos. Arquivos
+    excluídos recebem STATUS_REMOVIDO em vez de sair das listas, para que os
+    índices usados pela lista de resultados continuem válidos e a
+    atualização custe O(excluídos) em vez de O(pasta). Membros de ZIPs
+    aparecem com um caminho virtual (ZIP/caminho do membro), mapeado em
+    `membros_zip` para o ZIP e o nome do membro. `originais` associa cada
+    cópia idêntica em disco (repetida em outra pasta ou de mesmo conteúdo)
+    ao índice do arquivo mantido no seu grupo; cópias que já são ou foram
+    trocadas por links físicos para ele recebem STATUS_VINCULADO.
+    """
+
+    def __init__(self, entradas=None, status=None, varias_pastas=False, conteudo=False, erros=None, chave_acesso=False,
+                 canonico=False, pastas=None, membros_zip=None, originais=None):
+        self.entradas = entradas if entradas is not None else RegistrosXml()
+        # Pastas informadas na análise (as raízes da varredura)
+        self.pastas = pastas if pastas is not None else []
+        self.membros_zip = membros_zip if membros_zip is not None else {}
+        self.originais = originais if originais is not None else {}
+        self.status = status if status is not None else bytearray()
+        self.varias_pastas = varias_pastas
+        self.conteudo = conteudo
+        self.chave_acesso = chave_acesso
+        self.canonico = canonico
+        self.erros = erros if erros is not None else []
+        self.contagem = Counter(self.status)
+        # Posições por caminho apenas dos marcados para exclusão, montadas
+        # na primeira consulta
+        self._posicoes = None
+
+        # Totais por pasta: [arquivos, marcados para exclusão]
+        self.totais_pasta = {}
+        if varias_pastas:
+            por_id = {}
+            for id_pasta, situacao in zip(self.entradas.id_pasta, self.status):
+                totais = por_id.setdefault(id_pasta, [0, 0])
+                totais[0] += 1
+                if situacao != STATUS_MANTER and situacao != STATUS_VINCULADO:
+                    totais[1] += 1
+            self.totais_pasta = {self.entradas.pastas[id_pasta]: totais for id_pasta, totais in por_id.items()}
+
+    def __len__(self):
+        return len(self.entradas) - self.contagem[STATUS_REMOVIDO]
+
+    def total_para_excluir(self):
+        """Quantidade de arquivos ainda marcados para exclusão"""
+        return len(self) - self.contagem[STATUS_MANTER] - self.contagem[STATUS_VINCULADO]
+
+    def indices_para_excluir(self):
+        """Índices dos arquivos ainda marcados para exclusão"""
+        return [
+            i for i, situacao in enumerate(self.status)
+            if situacao != STATUS_MANTER and situacao != STATUS_REMOVIDO and situacao != STATUS_VINCULADO
+        ]
+
+    def posicao(self, caminho):
+        """Índice de um arquivo marcado para exclusão, ou None"""
+        if self._posicoes is None:
+            self._posicoes = {self.entradas.caminho(i): i for i in self.indices_para_excluir()}
+        return self._posicoes.get(caminho)
+
+    def tamanho_de(self, caminho):
+        """Tamanho em bytes registrado na análise para um caminho marcado (0 se desconhecido)"""
+        i = self.posicao(caminho)
+        return self.entradas.tamanhos[i] if i is not None else 0
+
+    def caminhos_para_excluir(self):
+        """Caminhos dos arquivos ainda marcados para exclusão"""
+        return [self.entradas.caminho(i) for i in self.indices_para_excluir()]
+
+    def pares_para_vincular(self):
+        """Pares (cópia, original) das cópias idênticas ainda marcadas (repetidas ou de mesmo conteúdo)"""
+        return [
+            (self.entradas.caminho(i), self.entradas.caminho(original))
+            for i, original in self.originais.items()
+            if self.status[i] == STATUS_CONTEUDO or self.status[i] == STATUS_REPETIDO
+        ]
+
+    def separar_compactados(self, caminhos):
+        """Divide os caminhos em arquivos em disco e {ZIP: [(caminho virtual, membro)]}"""
+        em_disco = []
+        por_zip = {}
+        for caminho in caminhos:
+            membro = self.membros_zip.get(caminho)
+            if membro is None:
+                em_disco.append(caminho)
+            else:
+                por_zip.setdefault(membro[0], []).append((caminho, membro[1]))
+        return em_disco, por_zip
+
+    def remover(self, caminhos, situacao=STATUS_REMOVIDO):
+        """Marca os caminhos como removidos (ou com `situacao`) e retorna pares (índice, situação anterior)"""
+        removidos = []
+        for caminho in caminhos:
+            i = self.posicao(caminho)
+            if i is None:
+                continue
+            del self._posicoes[caminho]
+            anterior = self.status[i]
+            self.status[i] = situacao
+            self.contagem[anterior] -= 1
+            self.contagem[situacao] += 1
+            totais = self.totais_pasta.get(self.entradas.pasta(i))
+            if totais is not None:
+                if situacao == STATUS_REMOVIDO:
+                    totais[0] -= 1
+                if anterior != STATUS_MANTER:
+                    totais[1] -= 1
+            removidos.append((i, anterior))
+        return removidos
+
+    def resumo(self):
+        """Texto de resumo da análise, calculado a partir das contagens mantidas"""
+        if not self.entradas:
+            return "Não foram encontrados arquivos XML na pasta selecionada."
+
+        linhas = [
+            f"Total de arquivos XML encontrados: {len(self)}",
+            f"Arquivos identificados para exclusão: {self.total_para_excluir()}",
+        ]
+        if self.contagem[STATUS_REPETIDO]:
+            linhas.append(f"Arquivos repetidos em outra pasta: {self.contagem[STATUS_REPETIDO]}")
+        if self.chave_acesso:
+            linhas.append(f"Documentos fiscais repetidos: {self.contagem[STATUS_FISCAL]}")
+        if self.conteudo:
+            linhas.append(f"Arquivos com conteúdo idêntico: {self.contagem[STATUS_CONTEUDO]}")
+        if self.canonico:
+            linhas.append(f"Arquivos com XML equivalente: {self.contagem[STATUS_CANONICO]}")
+        if self.membros_zip:
+            linhas.append(f"Arquivos dentro de ZIPs: {len(self.membros_zip)}")
+        if self.contagem[STATUS_VINCULADO]:
+            linhas.append(f"Cópias substituídas por links físicos: {self.contagem[STATUS_VINCULADO]}")
+        for pasta, mensagem in self.erros:
+            linhas.append(f"Erro ao ler a pasta {pasta}: {mensagem}")
+
+        if self.varias_pastas:
+            linhas += ["", "Totais por pasta:"]
+            for pasta in sorted(self.totais_pasta):
+                arquivos, excluir = self.totais_pasta[pasta]
+                if arquivos:
+                    linhas.append(f"{pasta}: {arquivos} arquivos, {excluir} para exclusão")
+        return "\n".join(linhas)
+
+
+def carregar_sufixos(db_file=ARQUIVO_SUFIXOS):
+    """Carrega as regras do arquivo de sufixos, criando-o com os sufixos padrão"""
+    arquivo = arquivo_regras(db_file)
+    if os.path.exists(db_file):
+        try:
+            return list(arquivo.carregar())
+        except (OSError, ValueError) as e:
+            logger.error(f"Erro ao carregar sufixos: {e}", extra={"arquivo": db_file})
+            return []
+    else:
+        # Criar arquivo com sufixos padrão se não existir
+        sufixos_padrao = list(SUFIXOS_PADRAO)
+        try:
+            arquivo.salvar(sufixos_padrao)
+        except OSError as e:
+            logger.error(f"Erro ao criar arquivo de sufixos: {e}", extra={"arquivo": db_file})
+        return sufixos_padrao
+
+
+def salvar_sufixos(sufixos, db_file=ARQUIVO_SUFIXOS):
+    """Salva as regras no arquivo de sufixos de forma atômica (erros são propagados)"""
+    arquivo_regras(db_file).salvar(sufixos)
+
+
+def caminho_cache(db_file=ARQUIVO_SUFIXOS):
+    """Caminho do cache de análise, ao lado do arquivo de sufixos"""
+    return os.path.join(os.path.dirname(os.path.abspath(db_file)), ARQUIVO_CACHE)
+
+
+def abrir_cache(caminho):
+    """Abre o cache de análise na thread atual, ou retorna None se não for possível"""
+    try:
+        return CacheAnalise(caminho)
+    except (OSError, sqlite3.Error) as e:
+        logger.error(f"Erro ao abrir o cache de análise: {e}", extra={"arquivo": caminho})
+        return None
+
+
+class ContagemMinima:
+    """Count-min sketch: estima quantas vezes cada chave apareceu com memória fixa
+
+    A estimativa nunca é menor que a contagem real (até 255, onde as
+    células saturam); colisões só podem aumentá-la.
+    """
+
+    def __init__(self, largura=LARGURA_SKETCH, profundidade=PROFUNDIDADE_SKETCH):
+        self.largura = largura
+        self.profundidade = profundidade
+        self.linhas = [array("B", bytes(largura)) for _ in range(profundidade)]
+
+    def posicoes(self, digest):
+        """Posição da chave em cada linha, tiradas do digest (4 bytes por linha)"""
+        return [
+            int.from_bytes(digest[4 * i:4 * i + 4], "little") % self.largura
+            for i in range(self.profundidade)
+        ]
+
+    def adicionar(self, posicoes):
+        for linha, posicao in zip(self.linhas, posicoes):
+            if linha[posicao] < 0xFF:
+                linha[posicao] += 1
+
+    def estimar(self, posicoes):
+        return min(linha[posicao] for linha, posicao in zip(self.linhas, posicoes))
+
+
+class ContadorTopK:
+    """Contador Space-Saving: acompanha no máximo `capacidade` itens, guardando alguns exemplos de cada
+
+    Quando um item novo chega com o contador cheio, ele herda a contagem do
+    menos frequente, que é descartado; itens frequentes nunca são perdidos.
+    """
+
+    def __init__(self, capacidade, exemplos=EXEMPLOS_POR_SUFIXO):
+        self.capacidade = capacidade
+        self.exemplos = exemplos
+        self.itens = {}
+
+    def adicionar(self, item, exemplo):
+        registro = self.itens.get(item)
+        if registro is None:
+            contagem = 0
+            if len(self.itens) >= self.capacidade:
+                menor = min(self.itens, key=lambda chave: self.itens[chave][0])
+                contagem = self.itens.pop(menor)[0]
+            registro = self.itens[item] = [contagem, []]
+        registro[0] += 1
+        if len(registro[1]) < self.exemplos:
+            registro[1].append(exemplo)
+
+    def mais_frequentes(self):
+        """Pares (item, [contagem, exemplos]) do mais para o menos frequente"""
+        return sorted(self.itens.items(), key=lambda par: (-par[1][0], par[0]))
+
+
+# Sufixo detectado, com a quantidade (estimada) de grupos em que aparece
+SufixoDetectado = namedtuple("SufixoDetectado", ["sufixo", "grupos", "exemplos"])
+
+# Sufixos como -NNNNNN.xml, onde N são dígitos; o restante é o nome base
+PADRAO_SUFIXO_DETECTADO = re.compile(r'(.+?)(-\d+\.xml)$')
+
+
+def _nome_base(nome):
+    """Separa o nome em (base, sufixo); nomes sem sufixo numérico têm sufixo None"""
+    match = PADRAO_SUFIXO_DETECTADO.match(nome)
+    if match:
+        return match.group(1), match.group(2)
+    if nome.lower().endswith(".xml"):
+        return nome[:-4], None
+    return nome, None
+
+
+def detectar_sufixos(obter_nomes, amostra=1.0, limite=MAX_SUFIXOS_DETECTADOS, cancelar=None, notificar=None):
+    """Detecta sufixos -NNNNNN.xml que aparecem em grupos de arquivos com o mesmo nome base
+
+    `obter_nomes()` deve devolver um novo iterável de nomes a cada chamada.
+    A primeira passagem conta os nomes base (inclusive o do arquivo sem
+    sufixo, como CHAVE.xml) em um count-min sketch; a segunda conta, em um
+    ContadorTopK, os sufixos dos nomes cujo base aparece mais de uma vez.
+    A memória não depende da quantidade de arquivos. Com `amostra` menor
+    que 1, só essa fração dos nomes base (escolhida pelo hash, para manter
+    os grupos inteiros) é considerada e as contagens são extrapoladas.
+    Como um sketch de tamanho fixo passa a ver grupos falsos quando conta
+    nomes demais, a primeira passagem preenche NIVEIS_SKETCH sketches, cada
+    um com metade dos nomes do anterior (também escolhidos pelo hash), e a
+    segunda usa o de mais nomes que ainda cabem em CAPACIDADE_SKETCH: acima
+    disso, a amostra é reduzida automaticamente. Retorna até `limite`
+    SufixoDetectado, do sufixo presente em mais grupos para o menos
+    presente, ou None se `cancelar` for acionado.
+    """
+    if notificar is None:
+        notificar = lambda *evento: None
+    limiar_amostra = int(min(max(amostra, 0.0), 1.0) * 0xFFFFFFFF)
+    sketches = [ContagemMinima() for _ in range(NIVEIS_SKETCH)]
+    contagens = [0] * NIVEIS_SKETCH
+
+    def nomes_na_amostra(limiar):
+        for processados, nome in enumerate(obter_nomes(), 1):
+            if processados % LOTE_PROGRESSO == 0:
+                if cancelar is not None and cancelar.is_set():
+                    return
+                notificar("progresso", processados, None)
+            base, sufixo = _nome_base(nome)
+            digest = hashlib.blake2b(base.encode("utf-8", "surrogateescape"), digest_size=20).digest()
+            valor = int.from_bytes(digest[16:], "little")
+            if valor <= limiar:
+                yield nome, sufixo, valor, sketches[0].posicoes(digest)
+
+    with etapa("deteccao_nomes_base", amostra=amostra):
+        notificar("etapa", "Contando nomes base...")
+        for _, _, valor, posicoes in nomes_na_amostra(limiar_amostra):
+            # O nível k recebe os nomes com hash até limiar_amostra / 2^k
+            nivel = 0
+            while nivel < NIVEIS_SKETCH and valor <= limiar_amostra >> nivel:
+                sketches[nivel].adicionar(posicoes)
+                contagens[nivel] += 1
+                nivel += 1
+    if cancelar is not None and cancelar.is_set():
+        return None
+
+    nivel = next((k for k, nomes in enumerate(contagens) if nomes <= CAPACIDADE_SKETCH), NIVEIS_SKETCH - 1)
+    sketch = sketches[nivel]
+    # Libera os demais níveis (todos têm a mesma largura, então as posições não mudam)
+    sketches = [sketch]
+    limiar = limiar_amostra >> nivel
+    if nivel:
+        logger.info(
+            "Amostra da detecção de sufixos reduzida",
+            extra={"nomes": contagens[0], "amostra": amostra / (1 << nivel)}
+        )
+
+    with etapa("deteccao_sufixos", amostra=amostra / (1 << nivel)):
+        notificar("etapa", "Contando sufixos em grupos...")
+        contador = ContadorTopK(limite)
+        for nome, sufixo, _, posicoes in nomes_na_amostra(limiar):
+            if sufixo is not None and sketch.estimar(posicoes) > 1:
+                contador.adicionar(sufixo, nome)
+    if cancelar is not None and cancelar.is_set():
+        return None
+
+    amostra = min(max(amostra, 0.0), 1.0) / (1 << nivel)
+    escala = 1.0 / amostra if 0 < amostra < 1 else 1.0
+    return [
+        SufixoDetectado(sufixo, round(contagem * escala), exemplos)
+        for sufixo, (contagem, exemplos) in contador.mais_frequentes()
+    ]
+
+
+def _candidatos(registros, status, membros_zip):
+    """Entradas ainda mantidas, montadas para as etapas que leem os arquivos, e o índice de cada caminho
+
+    Membros de ZIPs ficam de fora: não existem no disco para serem lidos.
+    """
+    candidatos = []
+    posicoes = {}
+    for i, situacao in enumerate(status):
+        if situacao == STATUS_MANTER:
+            entrada = registros[i]
+            if entrada.caminho in membros_zip:
+                continue
+            candidatos.append(entrada)
+            posicoes[entrada.caminho] = i
+    return candidatos, posicoes
+
+
+def _ler_compactados(zips, conteudo, registros, status, indice, erros, cancelar, notificar):
+    """Acrescenta aos registros os membros .xml dos ZIPs, classificados pelas regras
+
+    Cada ZIP é lido em uma única passagem, em um pool de processos, e seus
+    membros entram como uma pasta virtual (o caminho do ZIP). Retorna
+    ({caminho virtual: (ZIP, membro)}, {índice: digest}), com os digests
+    apenas se `conteudo`, ou None se `cancelar` for acionado.
+    """
+    resultados, cancelado = compactados.em_paralelo(
+        compactados.ler_membros,
+        [(entrada.caminho, conteudo) for entrada in zips],
+        cancelar=cancelar,
+        progresso=lambda feitos, total: notificar("progresso", feitos, total)
+    )
+    if cancelado:
+        return None
+
+    membros_zip = {}
+    digests = {}
+    for entrada, (membros, erro) in zip(zips, resultados):
+        if erro is not None:
+            erros.append((entrada.caminho, erro))
+            continue
+        for membro in membros:
+            partes = membro.nome.split("/")
+            pasta = os.path.join(entrada.caminho, *partes[:-1])
+            virtual = EntradaXml(os.path.join(pasta, partes[-1]), partes[-1], membro.tamanho, membro.mtime_ns, pasta)
+            i = registros.adicionar(virtual)
+            status.append(STATUS_SUFIXO if indice.corresponde(virtual.nome) is not None else STATUS_MANTER)
+            membros_zip[virtual.caminho] = (entrada.caminho, membro.nome)
+            if membro.digest is not None:
+                digests[i] = membro.digest
+    return membros_zip, digests
+
+
+def _marcar_copias(copias, situacao, registros, status, membros_zip, originais):
+    """Marca as cópias dos pares (índice, índice mantido) com `situacao`, guardando o mantido em `originais`
+
+    Uma cópia que já é link físico para o arquivo mantido (mesmo st_dev e
+    st_ino) não libera espaço ao ser excluída e recebe STATUS_VINCULADO.
+    Membros de ZIPs não podem virar links e ficam fora de `originais`.
+    """
+    identidades = {}
+
+    def identidade(i):
+        if i not in identidades:
+            identidades[i] = identidade_arquivo(registros.caminho(i))
+        return identidades[i]
+
+    for i, manter in copias:
+        if registros.caminho(i) in membros_zip or registros.caminho(manter) in membros_zip:
+            status[i] = situacao
+        elif identidade(i) is not None and identidade(i) == identidade(manter):
+            status[i] = STATUS_VINCULADO
+        else:
+            status[i] = situacao
+            originais[i] = manter
+
+
+def analisar(pastas, sufixos, recursivo=False, conteudo=False, cache=None, cancelar=None, notificar=None,
+             chave_acesso=False, canonico=False, incluir_zip=False):
+    """Varre e classifica os arquivos XML das pastas
+
+    Arquivos que casam com alguma das regras de `sufixos` (sufixos
+    literais, glob: ou re:) são marcados para exclusão;
+    com mais de uma pasta, cópias repetidas em outra pasta (mesmo nome e
+    conteúdo) também; com
+    `chave_acesso`, cópias do mesmo documento ou evento fiscal (lidos do
+    XML), mantendo a versão com protocolo e registro mais recente; com
+    `conteudo`, arquivos byte a byte idênticos entre os que seriam mantidos;
+    com `canonico`, XMLs equivalentes após a canonicalização (espaços,
+    ordem de atributos, declaração) entre os que ainda restarem. Com
+    `incluir_zip`, os membros .xml dos arquivos .zip são classificados como
+    arquivos de uma subpasta, sem extraí-los; a comparação de conteúdo os
+    inclui entre si, mas a chave de acesso e o XML canônico não.
+    `notificar(tipo, *dados)` recebe os eventos de progresso ("progresso",
+    "total", "etapa"). Retorna um ResultadoAnalise, ou None se `cancelar`
+    for acionado.
+    """
+    if notificar is None:
+        notificar = lambda *evento: None
+
+    # Classificar cada entrada assim que é produzida pela varredura,
+    # guardando-a no formato compacto
+    indice = compilar_regras(tuple(sufixos))
+    registros = RegistrosXml()
+    status = bytearray()
+    erros = []
+    zips = []
+    with etapa("varredura_classificacao", pastas=len(pastas), regras=len(indice)):
+        for processados, entrada in enumerate(varrer_pastas(pastas, recursivo, erros=erros, incluir_zip=incluir_zip), 1):
+            if cancelar is not None and cancelar.is_set():
+                return None
+            if incluir_zip and compactados.eh_compactado(entrada.nome):
+                zips.append(entrada)
+                continue
+            registros.adicionar(entrada)
+            if indice.corresponde(entrada.nome) is not None:
+                status.append(STATUS_SUFIXO)
+            else:
+                status.append(STATUS_MANTER)
+            if processados % LOTE_PROGRESSO == 0:
+                notificar("progresso", processados, None)
+
+    membros_zip, digests_zip = {}, {}
+    if zips:
+        notificar("etapa", "Lendo arquivos ZIP...")
+        with etapa("leitura_zip", zips=len(zips)):
+            # Os hashes dos membros sempre são calculados na mesma leitura: os
+            # ZIPs são pastas virtuais, e os repetidos entre pastas são
+            # confirmados pelo conteúdo
+            lidos = _ler_compactados(zips, True, registros, status, indice, erros, cancelar, notificar)
+        if lidos is None:
+            return None
+        membros_zip, digests_zip = lidos
+    total = len(registros)
+    notificar("total", total)
+    notificar("progresso", total, total)
+
+    # Com mais de uma pasta, o mesmo arquivo pode aparecer em pastas
+    # diferentes (inclusive dentro de um ZIP); apenas uma cópia é mantida.
+    # Nome e tamanho iguais só indicam os candidatos, confirmados pelo hash
+    # do conteúdo. Cada etapa seguinte considera só os arquivos que as
+    # anteriores mantiveram
+    varias_pastas = recursivo or len(pastas) > 1 or bool(zips)
+    originais = {}
+    if varias_pastas:
+        notificar("etapa", "Conferindo arquivos repetidos em outras pastas...")
+        with etapa("repetidos"):
+            mantidos = (i for i, situacao in enumerate(status) if situacao == STATUS_MANTER)
+            repetidos = marcar_duplicados_entre_pastas(
+                registros,
+                mantidos,
+                digests_zip,
+                cancelar=cancelar,
+                progresso=lambda feitos, total: notificar("progresso", feitos, total),
+                cache=cache
+            )
+        if repetidos is None:
+            return None
+        _marcar_copias(repetidos, STATUS_REPETIDO, registros, status, membros_zip, originais)
+
+    # Cópias do mesmo documento ou evento fiscal; em cada grupo fica a
+    # versão com protocolo e registro mais recente (e, no empate, o nome
+    # mais curto)
+    if chave_acesso:
+        notificar("etapa", "Lendo chaves de acesso dos documentos...")
+        candidatos, posicoes = _candidatos(registros, status, membros_zip)
+        with etapa("chave_acesso", candidatos=len(candidatos)):
+            grupos = agrupar_por_documento_fiscal(
+                candidatos,
+                cancelar=cancelar,
+                progresso=lambda feitos, total: notificar("progresso", feitos, total),
+                cache=cache
+            )
+        if grupos is None:
+            return None
+        for grupo in grupos:
+            grupo.sort(key=lambda par: (len(par[0].nome), par[0].caminho))
+            manter = max(grupo, key=lambda par: fiscal.prioridade(par[1]))[0]
+            for entrada, _ in grupo:
+                if entrada is not manter:
+                    status[posicoes[entrada.caminho]] = STATUS_FISCAL
+
+    # Arquivos com conteúdo idêntico entre os que ainda seriam mantidos;
+    # em cada grupo fica o de nome mais curto
+    if conteudo:
+        notificar("etapa", "Comparando conteúdo dos arquivos...")
+        candidatos, posicoes = _candidatos(registros, status, membros_zip)
+        with etapa("conteudo", candidatos=len(candidatos)):
+            grupos = agrupar_por_conteudo(
+                candidatos,
+                cancelar=cancelar,
+                progresso=lambda feitos, total: notificar("progresso", feitos, total),
+                cache=cache
+            )
+        if grupos is None:
+            return None
+        copias = []
+        for grupo in grupos:
+            manter = min(grupo, key=lambda entrada: (len(entrada.nome), entrada.caminho))
+            copias.extend(
+                (posicoes[entrada.caminho], posicoes[manter.caminho]) for entrada in grupo if entrada is not manter
+            )
+        _marcar_copias(copias, STATUS_CONTEUDO, registros, status, membros_zip, originais)
+
+        # Membros de ZIPs idênticos entre si, pelo hash calculado na leitura
+        por_hash = {}
+        for i, digest in digests_zip.items():
+            if status[i] == STATUS_MANTER:
+                por_hash.setdefault(digest, []).append(i)
+        for grupo in por_hash.values():
+            manter = min(grupo, key=lambda i: (len(registros.nome(i)), registros.caminho(i)))
+            for i in grupo:
+                if i != manter:
+                    status[i] = STATUS_CONTEUDO
+
+    # XMLs equivalentes entre os que ainda seriam mantidos; também fica o
+    # de nome mais curto
+    if canonico:
+        notificar("etapa", "Comparando XML canônico dos arquivos...")
+        candidatos, posicoes = _candidatos(registros, status, membros_zip)
+        with etapa("canonico", candidatos=len(candidatos)):
+            grupos = agrupar_por_xml_canonico(
+                candidatos,
+                cancelar=cancelar,
+                progresso=lambda feitos, total: notificar("progresso", feitos, total),
+                cache=cache
+            )
+        if grupos is None:
+            return None
+        for grupo in grupos:
+            manter = min(grupo, key=lambda entrada: (len(entrada.nome), entrada.caminho))
+            for entrada in grupo:
+                if entrada is not manter:
+                    status[posicoes[entrada.caminho]] = STATUS_CANONICO
+
+    resultado = ResultadoAnalise(
+        registros, status, varias_pastas, conteudo, erros, chave_acesso, canonico, list(pastas), membros_zip,
+        originais
+    )
+    capturar_alocacoes()
+    metricas.incrementar("arquivos_vistos", total)
+    metricas.incrementar("arquivos_marcados", resultado.total_para_excluir())
+    for pasta, mensagem in erros:
+        logger.warning(f"Erro ao ler a pasta {pasta}: {mensagem}", extra={"pasta": pasta})
+    logger.info(
+        "Análise concluída",
+        extra={"arquivos": total, "para_excluir": resultado.total_para_excluir(), "pastas": len(pastas)}
+    )
+    return resultado
@@ -0,0 +1,118 @@
+"""Leitura do cabeçalho de documentos fiscais eletrônicos (NF-e e CT-e).
+
+Extrai a chave de acesso e, para eventos, o tipo (tpEvento), a sequência
+(nSeqEvento) e a data de registro (dhRegEvento) com um iterparse que para
+assim que esses elementos são encontrados, sem montar o DOM do documento.
+"""
+from collections import namedtuple
+import xml.etree.ElementTree as ET
+
+# Elementos raiz reconhecidos; as versões "proc" trazem o protocolo da SEFAZ
+RAIZES_DOCUMENTO = {"NFe": False, "nfeProc": True, "CTe": False, "cteProc": True}
+RAIZES_EVENTO = {"evento": False, "procEventoNFe": True, "eventoCTe": False, "procEventoCTe": True}
+
+# Elementos que carregam o Id com a chave de acesso do documento
+ELEMENTOS_INFO = ("infNFe", "infCte")
+ELEMENTOS_CHAVE = ("chNFe", "chCTe")
+
+TAMANHO_CHAVE = 44
+
+CabecalhoFiscal = namedtuple(
+    "CabecalhoFiscal",
+    ["chave", "tipo_evento", "sequencia", "data_registro", "protocolado"]
+)
+
+
+def _nome_local(tag):
+    """Remove o namespace de uma tag do ElementTree"""
+    return tag.rpartition("}")[2]
+
+
+def ler_cabecalho(caminho):
+    """Lê a chave de acesso e os dados de evento do XML, parando no cabeçalho
+
+    Documentos (NFe/CTe) param no início de infNFe/infCte, já que a raiz
+    informa se há protocolo. Eventos param em dhRegEvento, que fica no
+    retorno da SEFAZ. Retorna um CabecalhoFiscal, ou None se o arquivo não
+    for um documento fiscal reconhecido ou não puder ser lido.
+    """
+    raiz = None
+    evento_fiscal = False
+    protocolado = False
+    chave = tipo_evento = data_registro = None
+    sequencia = 0
+    try:
+        for evento, elemento in ET.iterparse(caminho, events=("start", "end")):
+            tag = _nome_local(elemento.tag)
+            if raiz is None:
+                raiz = tag
+                if raiz in RAIZES_DOCUMENTO:
+                    protocolado = RAIZES_DOCUMENTO[raiz]
+                elif raiz in RAIZES_EVENTO:
+                    protocolado = RAIZES_EVENTO[raiz]
+                    evento_fiscal = True
+                else:
+                    return None
+                continue
+
+            if evento == "start":
+                if not evento_fiscal and tag in ELEMENTOS_INFO:
+                    identificador = elemento.get("Id", "")
+                    chave = identificador[-TAMANHO_CHAVE:]
+                    break
+                continue
+
+            texto = (elemento.text or "").strip()
+            if tag in ELEMENTOS_CHAVE and chave is None:
+                chave = texto
+            elif tag == "tpEvento" and tipo_evento is None:
+                tipo_evento = texto
+            elif tag == "nSeqEvento" and not sequencia:
+                sequencia = int(texto) if texto.isdigit() else 0
+            elif tag == "dhRegEvento":
+                data_registro = texto
+                break
+            # Elementos já lidos não são necessários
+            elemento.clear()
+    except (ET.ParseError, OSError, ValueError):
+        return None
+
+    if not chave or len(chave) != TAMANHO_CHAVE:
+        return None
+    return CabecalhoFiscal(chave, tipo_evento or "", sequencia, data_registro or "", protocolado)
+
+
+def serializar(cabecalho):
+    """Converte o cabeçalho em texto para o cache (texto vazio = não é documento fiscal)"""
+    if cabecalho is None:
+        return ""
+    return "|".join([
+        cabecalho.chave,
+        cabecalho.tipo_evento,
+        str(cabecalho.sequencia),
+        cabecalho.data_registro,
+        "1" if cabecalho.protocolado else "0",
+    ])
+
+
+def desserializar(texto):
+    """Reconstrói o cabeçalho gravado por serializar"""
+    if not texto:
+        return None
+    chave, tipo_evento, sequencia, data_registro, protocolado = texto.split("|")
+    return CabecalhoFiscal(chave, tipo_evento, int(sequencia), data_registro, protocolado == "1")
+
+
+def ler_cabecalho_serializado(caminho):
+    """Versão de ler_cabecalho usada no pool de processos e no cache"""
+    return serializar(ler_cabecalho(caminho))
+
+
+def chave_documento(cabecalho):
+    """Identifica o documento ou evento: chave de acesso, tipo de evento e sequência"""
+    return (cabecalho.chave, cabecalho.tipo_evento, cabecalho.sequencia)
+
+
+def prioridade(cabecalho):
+    """Ordem de preferência entre cópias: com protocolo e, depois, registro mais recente"""
+    return (cabecalho.protocolado, cabecalho.data_registro)
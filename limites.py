@@ -0,0 +1,226 @@
+"""Limites de taxa de E/S e concorrência adaptativa para armazenamento compartilhado.
+
+Em um servidor de arquivos usado por outras pessoas, uma rajada de
+listagens, leituras e exclusões deixa o compartilhamento lento para
+todos. O `regulador` do processo limita, com baldes de fichas (token
+bucket), os arquivos por segundo e os bytes lidos por segundo, somados
+entre varredura, hashes e exclusões. Com a concorrência adaptativa, cada
+etapa começa com uma operação por vez, para medir a latência do servidor
+sem disputa, e ajusta o limite pela latência por operação, como o
+controle de congestionamento do TCP: enquanto a latência fica perto da
+melhor já vista, o limite dobra (partida lenta) e, depois da primeira
+redução, sobe de um em um; quando ela passa de TOLERANCIA_LATENCIA vezes
+a referência, o limite cai pela metade.
+
+Sem limites configurados (o padrão), o regulador só conta os arquivos
+processados para mostrar a taxa atual, em lotes, sem custo perceptível.
+"""
+from collections import deque, namedtuple
+import logging
+import threading
+import time
+
+# Espera máxima entre verificações de cancelamento
+INTERVALO_ESPERA = 0.1
+
+# Segundos de taxa que podem ser usados de uma vez depois de uma pausa
+RAJADA_SEGUNDOS = 1.0
+
+# Janela (segundos) e fatia (segundos) da taxa mostrada na interface
+JANELA_TAXA = 5.0
+FATIA_TAXA = 0.25
+
+# Concorrência adaptativa: operações por ajuste, latência (em múltiplos
+# da referência) a partir da qual o limite é reduzido, fator de redução e
+# quanto a referência pode subir por ajuste, para acompanhar um servidor
+# que ficou mais lento de forma duradoura
+AMOSTRA_LATENCIA = 32
+TOLERANCIA_LATENCIA = 2.0
+FATOR_REDUCAO = 0.5
+ENVELHECIMENTO_REFERENCIA = 1.05
+
+BYTES_POR_MB = 1024 * 1024
+
+# Taxa atual; `concorrencia` e `maximo` são None sem a concorrência adaptativa
+EstadoRegulador = namedtuple(
+    "EstadoRegulador", ["arquivos_por_segundo", "mb_por_segundo", "concorrencia", "maximo"]
+)
+
+logger = logging.getLogger("exclusao_xml.limites")
+
+
+class LimiteTaxa:
+    """Balde de fichas seguro entre threads, reabastecido a `por_segundo` fichas por segundo"""
+
+    def __init__(self, por_segundo, rajada=None):
+        self.por_segundo = por_segundo
+        self.capacidade = rajada or por_segundo * RAJADA_SEGUNDOS
+        self._fichas = self.capacidade
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reservar(self, quantidade):
+        """Retira `quantidade` fichas e retorna quantos segundos esperar até que elas existam
+
+        O saldo pode ficar negativo: cada chamada reserva a sua vez, então
+        threads concorrentes são atendidas na ordem e uma quantidade maior
+        que a capacidade (um arquivo grande) não bloqueia para sempre.
+        """
+        with self._lock:
+            agora = time.monotonic()
+            self._fichas = min(self.capacidade, self._fichas + (agora - self._ultimo) * self.por_segundo)
+            self._ultimo = agora
+            self._fichas -= quantidade
+            return max(0.0, -self._fichas / self.por_segundo)
+
+
+class ControleConcorrencia:
+    """Limita as operações simultâneas de uma etapa e, se `adaptativo`, ajusta o limite pela latência"""
+
+    def __init__(self, nome, maximo, adaptativo=False, minimo=1):
+        self.nome = nome
+        self.maximo = max(maximo, minimo)
+        self.minimo = minimo
+        self.adaptativo = adaptativo
+        self.limite = minimo if adaptativo else self.maximo
+        self.em_andamento = 0
+        self.referencia = None
+        self._partida = True
+        self._latencias = []
+        self._saturado = False
+        self._condicao = threading.Condition()
+
+    def entrar(self, cancelar=None):
+        """Aguarda uma vaga; retorna False, sem ocupá-la, se `cancelar` for acionado antes"""
+        with self._condicao:
+            while self.em_andamento >= self.limite:
+                if cancelar is not None and cancelar.is_set():
+                    return False
+                self._condicao.wait(INTERVALO_ESPERA)
+            self.em_andamento += 1
+            if self.em_andamento >= self.limite:
+                self._saturado = True
+            return True
+
+    def sair(self, latencia):
+        """Libera a vaga e registra a latência (segundos por arquivo) da operação"""
+        with self._condicao:
+            self.em_andamento -= 1
+            if self.adaptativo:
+                self._latencias.append(latencia)
+                if len(self._latencias) >= AMOSTRA_LATENCIA:
+                    self._ajustar()
+            self._condicao.notify_all()
+
+    def _ajustar(self):
+        # Chamado com a condição adquirida
+        latencias = sorted(self._latencias)
+        mediana = latencias[len(latencias) // 2]
+        anterior = self.limite
+        if self.referencia is None:
+            self.referencia = mediana
+        if mediana > self.referencia * TOLERANCIA_LATENCIA:
+            self.limite = max(self.minimo, int(self.limite * FATOR_REDUCAO))
+            self._partida = False
+        elif self._saturado:
+            # Só cresce se o limite atual chegou a ser usado por inteiro
+            self.limite = min(self.maximo, self.limite * 2 if self._partida else self.limite + 1)
+        self.referencia = min(mediana, self.referencia * ENVELHECIMENTO_REFERENCIA)
+        self._latencias = []
+        self._saturado = False
+        if self.limite != anterior:
+            logger.debug(
+                "Concorrência ajustada",
+                extra={"etapa": self.nome, "limite": self.limite, "mediana_s": mediana, "referencia_s": self.referencia}
+            )
+
+
+class Regulador:
+    """Limites de taxa do processo, controles de concorrência das etapas e taxa atual"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fatias = deque()
+        self._inicio = time.monotonic()
+        self._controle = None
+        self.arquivos_por_segundo = self.mb_por_segundo = None
+        self.adaptativo = False
+        self._arquivos = self._bytes = None
+
+    def configurar(self, arquivos_por_segundo=None, mb_por_segundo=None, adaptativo=False):
+        """Define os limites (None ou 0 = sem limite); os baldes novos valem já para as etapas em andamento"""
+        self.arquivos_por_segundo = arquivos_por_segundo or None
+        self.mb_por_segundo = mb_por_segundo or None
+        self.adaptativo = adaptativo
+        self._arquivos = LimiteTaxa(arquivos_por_segundo) if arquivos_por_segundo else None
+        self._bytes = LimiteTaxa(mb_por_segundo * BYTES_POR_MB) if mb_por_segundo else None
+        logger.info(
+            "Limites de E/S configurados",
+            extra={"arquivos_por_segundo": arquivos_por_segundo, "mb_por_segundo": mb_por_segundo,
+                   "adaptativo": adaptativo}
+        )
+
+    @property
+    def ativo(self):
+        """Indica se há limite de taxa ou concorrência adaptativa a aplicar"""
+        return self._arquivos is not None or self._bytes is not None or self.adaptativo
+
+    def controle(self, nome, maximo):
+        """Cria o ControleConcorrencia de uma etapa com até `maximo` operações simultâneas
+
+        O controle criado por último é o mostrado em estado(), e a taxa
+        passa a ser medida a partir do início da etapa.
+        """
+        controle = ControleConcorrencia(nome, maximo, self.adaptativo)
+        with self._lock:
+            self._controle = controle
+            self._fatias.clear()
+            self._inicio = time.monotonic()
+        return controle
+
+    def reservar(self, arquivos=1, tamanho=0, cancelar=None):
+        """Aguarda a vez de processar `arquivos` com `tamanho` bytes lidos; retorna os segundos esperados
+
+        A espera termina antes se `cancelar` for acionado.
+        """
+        espera = 0.0
+        if self._arquivos is not None and arquivos:
+            espera = self._arquivos.reservar(arquivos)
+        if self._bytes is not None and tamanho:
+            espera = max(espera, self._bytes.reservar(tamanho))
+        if espera > 0:
+            if cancelar is not None:
+                cancelar.wait(espera)
+            else:
+                time.sleep(espera)
+        return espera
+
+    def registrar(self, arquivos, tamanho=0):
+        """Soma arquivos e bytes processados à taxa atual"""
+        with self._lock:
+            agora = time.monotonic()
+            fatia = agora - agora % FATIA_TAXA
+            if self._fatias and self._fatias[-1][0] == fatia:
+                self._fatias[-1][1] += arquivos
+                self._fatias[-1][2] += tamanho
+            else:
+                self._fatias.append([fatia, arquivos, tamanho])
+            while self._fatias[0][0] < agora - JANELA_TAXA:
+                self._fatias.popleft()
+
+    def estado(self):
+        """Taxa dos últimos JANELA_TAXA segundos e, com a concorrência adaptativa, o limite atual"""
+        with self._lock:
+            agora = time.monotonic()
+            limite = agora - JANELA_TAXA
+            arquivos = sum(quantidade for fatia, quantidade, _ in self._fatias if fatia >= limite)
+            tamanho = sum(lidos for fatia, _, lidos in self._fatias if fatia >= limite)
+            decorrido = max(min(JANELA_TAXA, agora - self._inicio), FATIA_TAXA)
+            controle = self._controle
+        concorrencia = maximo = None
+        if controle is not None and controle.adaptativo:
+            concorrencia, maximo = controle.limite, controle.maximo
+        return EstadoRegulador(arquivos / decorrido, tamanho / BYTES_POR_MB / decorrido, concorrencia, maximo)
+
+
+regulador = Regulador()
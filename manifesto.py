@@ -0,0 +1,292 @@
+"""Manifesto dos arquivos de um servidor e mesclagem entre servidores.
+
+O manifesto é um texto compactado com gzip, uma linha por arquivo, com o
+hash BLAKE2 do conteúdo, o tamanho, o cabeçalho fiscal (chave de acesso,
+evento e sequência), a identificação do arquivo (st_dev:st_ino) se ele
+tiver mais de um link físico e o caminho no servidor de origem. As linhas
+são ordenadas pela identidade usada para agrupar as cópias (o hash ou,
+com a chave de acesso, o documento fiscal), que não é gravada, mas
+recalculada a partir do hash e do cabeçalho, com uma ordenação externa:
+cada trecho de até LOTE_MANIFESTO arquivos é ordenado em memória e
+gravado em um arquivo temporário, e os trechos são intercalados no
+arquivo final, então a memória não depende da quantidade de arquivos.
+
+A mesclagem intercala (k-way merge) os manifestos de vários servidores,
+lendo uma linha de cada por vez, e grava para cada servidor uma lista
+com as cópias que ele pode excluir ou mover para a quarentena, executada
+depois, sem rede, por `cli.py delete --from-list`. Nomes com links
+físicos (como os deixados por `cli.py link`) nunca entram nas listas:
+excluir um deles não libera espaço e tiraria um nome que foi mantido de
+propósito.
+"""
+from collections import namedtuple
+import gzip
+import heapq
+import itertools
+import logging
+import os
+import re
+import shutil
+import socket
+import tempfile
+
+import fiscal
+from engine import (
+    LOTE_MANIFESTO,
+    MAX_WORKERS_EXCLUSAO,
+    calcular_hash_arquivo,
+    executar_em_lotes,
+    registros_manifesto,
+)
+from telemetria import etapa
+
+ASSINATURA = "#manifesto-xml"
+VERSAO = "3"
+
+# Agrupamento das cópias: pelo conteúdo (hash) ou, com a chave de acesso,
+# pelo documento ou evento fiscal (e pelo conteúdo nos demais arquivos)
+AGRUPAR_CONTEUDO = "conteudo"
+AGRUPAR_DOCUMENTO = "documento"
+
+# Prefixos da identidade de cada arquivo
+PREFIXO_HASH = "h:"
+PREFIXO_DOCUMENTO = "d:"
+
+# Nível do gzip no manifesto final e nos trechos temporários (que só são
+# lidos uma vez, pela intercalação)
+NIVEL_MANIFESTO = 6
+NIVEL_TRECHO = 1
+
+EXTENSAO_LISTA = ".lista.tsv"
+
+# Linha do manifesto já interpretada; `ordem` é a posição do manifesto na
+# mesclagem, usada como preferência entre servidores
+LinhaManifesto = namedtuple(
+    "LinhaManifesto", ["identidade", "ordem", "hash", "tamanho", "cabecalho", "vinculo", "caminho"]
+)
+
+# Item de uma lista de exclusão gerada pela mesclagem
+ItemLista = namedtuple("ItemLista", ["caminho", "tamanho", "hash"])
+
+logger = logging.getLogger("exclusao_xml.manifesto")
+
+
+def _escapar(texto):
+    return texto.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def _desescapar(texto):
+    if "\\" not in texto:
+        return texto
+    partes = texto.split("\\\\")
+    return "\\".join(parte.replace("\\t", "\t").replace("\\n", "\n") for parte in partes)
+
+
+def _abrir_texto(caminho, modo, nivel=NIVEL_MANIFESTO):
+    # surrogateescape preserva nomes que o sistema de arquivos não decodifica
+    if "w" in modo:
+        return gzip.open(caminho, modo, compresslevel=nivel, encoding="utf-8", errors="surrogateescape", newline="\n")
+    return gzip.open(caminho, modo, encoding="utf-8", errors="surrogateescape", newline="\n")
+
+
+def _identidade(digest, cabecalho, agrupamento):
+    """Identidade que agrupa as cópias: o hash ou, com a chave de acesso, o documento ou evento fiscal"""
+    if agrupamento == AGRUPAR_DOCUMENTO and cabecalho:
+        chave, tipo_evento, sequencia = fiscal.chave_documento(fiscal.desserializar(cabecalho))
+        return f"{PREFIXO_DOCUMENTO}{chave}|{tipo_evento}|{sequencia}"
+    return PREFIXO_HASH + digest
+
+
+def _identidade_linha(texto, agrupamento):
+    digest, _, cabecalho, _ = texto.split("\t", 3)
+    return _identidade(digest, cabecalho, agrupamento)
+
+
+def _linha(registro, agrupamento):
+    """(identidade, linha do manifesto) de um RegistroManifesto"""
+    texto = "\t".join([registro.hash, str(registro.tamanho), registro.cabecalho, registro.vinculo,
+                       _escapar(os.path.abspath(registro.caminho))]) + "\n"
+    return _identidade(registro.hash, registro.cabecalho, agrupamento), texto
+
+
+def exportar(pastas, destino, host=None, recursivo=False, chave_acesso=False, cache=None, cancelar=None,
+             notificar=None, lote=LOTE_MANIFESTO, erros=None):
+    """Grava o manifesto das pastas em `destino`, ordenado pela identidade e compactado
+
+    Com `chave_acesso`, documentos e eventos fiscais são agrupados pela
+    chave (como na análise com a chave de acesso). O arquivo é gravado com
+    nome temporário e só substitui `destino` no fim. Retorna a quantidade
+    de arquivos no manifesto, ou None se `cancelar` for acionado.
+    """
+    host = host or socket.gethostname()
+    agrupamento = AGRUPAR_DOCUMENTO if chave_acesso else AGRUPAR_CONTEUDO
+    pasta_destino = os.path.dirname(os.path.abspath(destino))
+    temporario = f"{destino}.{os.getpid()}.tmp"
+    pasta_trechos = tempfile.mkdtemp(prefix=".manifesto_", dir=pasta_destino)
+    total = 0
+    try:
+        with etapa("manifesto", pastas=len(pastas)):
+            trechos = []
+            for registros in registros_manifesto(pastas, recursivo, chave_acesso, cache, cancelar, notificar, lote,
+                                                 erros):
+                linhas = sorted(_linha(registro, agrupamento) for registro in registros)
+                trecho = os.path.join(pasta_trechos, f"{len(trechos)}.gz")
+                with _abrir_texto(trecho, "wt", NIVEL_TRECHO) as f:
+                    f.writelines(texto for _, texto in linhas)
+                trechos.append(trecho)
+                total += len(linhas)
+            if cancelar is not None and cancelar.is_set():
+                return None
+
+            abertos = [_abrir_texto(trecho, "rt") for trecho in trechos]
+            try:
+                with _abrir_texto(temporario, "wt") as f:
+                    f.write("\t".join([ASSINATURA, VERSAO, _escapar(host), agrupamento]) + "\n")
+                    f.writelines(heapq.merge(*abertos, key=lambda texto: _identidade_linha(texto, agrupamento)))
+            finally:
+                for arquivo in abertos:
+                    arquivo.close()
+            os.replace(temporario, destino)
+    finally:
+        shutil.rmtree(pasta_trechos, ignore_errors=True)
+        if os.path.exists(temporario):
+            os.remove(temporario)
+    logger.info("Manifesto gravado", extra={"arquivo": destino, "arquivos": total, "host": host})
+    return total
+
+
+def _ler_cabecalho(arquivo, caminho):
+    """Lê a primeira linha do manifesto e retorna (host, agrupamento); lança ValueError se não for um manifesto"""
+    campos = arquivo.readline().rstrip("\n").split("\t")
+    if len(campos) != 4 or campos[0] != ASSINATURA:
+        raise ValueError(f"{caminho} não é um manifesto")
+    if campos[1] != VERSAO:
+        raise ValueError(f"{caminho}: versão de manifesto {campos[1]} não suportada")
+    return _desescapar(campos[2]), campos[3]
+
+
+def _linhas(arquivo, ordem, agrupamento):
+    for texto in arquivo:
+        digest, tamanho, cabecalho, vinculo, caminho = texto.rstrip("\n").split("\t")
+        yield LinhaManifesto(
+            _identidade(digest, cabecalho, agrupamento), ordem, digest, int(tamanho), cabecalho, vinculo,
+            _desescapar(caminho)
+        )
+
+
+def _escolher(grupo, agrupamento):
+    """Linha mantida no grupo: a versão fiscal preferida, depois o primeiro manifesto e o nome mais curto"""
+    if agrupamento == AGRUPAR_DOCUMENTO and grupo[0].identidade.startswith(PREFIXO_DOCUMENTO):
+        prioridades = [fiscal.prioridade(fiscal.desserializar(linha.cabecalho)) for linha in grupo]
+        melhor = max(prioridades)
+        grupo = [linha for linha, prioridade in zip(grupo, prioridades) if prioridade == melhor]
+    return min(grupo, key=lambda linha: (linha.ordem, len(os.path.basename(linha.caminho)), linha.caminho))
+
+
+def caminho_lista(pasta_saida, host):
+    """Arquivo da lista de exclusão de um servidor, com o nome do servidor reduzido a caracteres seguros"""
+    return os.path.join(pasta_saida, re.sub(r"[^\w.-]", "_", host) + EXTENSAO_LISTA)
+
+
+def mesclar(manifestos, pasta_saida, cancelar=None):
+    """Intercala os manifestos e grava em `pasta_saida` a lista de exclusão de cada servidor
+
+    Em cada grupo de cópias (mesma identidade), em qualquer servidor, uma
+    é mantida: com a chave de acesso, a versão com protocolo e registro
+    mais recente; depois, a do manifesto informado primeiro e a de nome
+    mais curto. As demais vão para a lista `<host>.lista.tsv` do seu
+    servidor, com tamanho e hash para conferência e a cópia mantida,
+    exceto os nomes com links físicos, que nunca são listados.
+    Só uma linha de cada manifesto e o grupo atual ficam em memória.
+    Retorna {host: [arquivos, bytes]} das listas, ou None se `cancelar` for
+    acionado. Lança ValueError se os manifestos forem incompatíveis.
+    """
+    abertos = []
+    listas = {}
+    cancelado = False
+    try:
+        hosts = []
+        agrupamentos = set()
+        for caminho in manifestos:
+            arquivo = _abrir_texto(caminho, "rt")
+            abertos.append(arquivo)
+            host, agrupamento = _ler_cabecalho(arquivo, caminho)
+            if host in hosts:
+                raise ValueError(f"Há mais de um manifesto do servidor {host}")
+            hosts.append(host)
+            agrupamentos.add(agrupamento)
+        if len(agrupamentos) > 1:
+            raise ValueError("Os manifestos foram gerados com agrupamentos diferentes (com e sem a chave de acesso)")
+        agrupamento = agrupamentos.pop() if agrupamentos else AGRUPAR_CONTEUDO
+
+        os.makedirs(pasta_saida, exist_ok=True)
+        totais = {host: [0, 0] for host in hosts}
+        fluxo = heapq.merge(
+            *(_linhas(arquivo, ordem, agrupamento) for ordem, arquivo in enumerate(abertos)),
+            key=lambda linha: linha.identidade
+        )
+        with etapa("mesclagem", manifestos=len(manifestos)):
+            for grupos, (_, grupo) in enumerate(itertools.groupby(fluxo, key=lambda linha: linha.identidade)):
+                if grupos % 10000 == 0 and cancelar is not None and cancelar.is_set():
+                    cancelado = True
+                    return None
+                grupo = list(grupo)
+                if len(grupo) < 2:
+                    continue
+                mantida = _escolher(grupo, agrupamento)
+                for linha in grupo:
+                    if linha is mantida or linha.vinculo:
+                        continue
+                    host = hosts[linha.ordem]
+                    if host not in listas:
+                        listas[host] = open(
+                            caminho_lista(pasta_saida, host), "w", encoding="utf-8", errors="surrogateescape",
+                            newline="\n"
+                        )
+                        listas[host].write("# caminho\ttamanho\thash\tservidor mantido\tcaminho mantido\n")
+                    listas[host].write("\t".join([
+                        _escapar(linha.caminho), str(linha.tamanho), linha.hash,
+                        _escapar(hosts[mantida.ordem]), _escapar(mantida.caminho)
+                    ]) + "\n")
+                    totais[host][0] += 1
+                    totais[host][1] += linha.tamanho
+    finally:
+        for arquivo in abertos:
+            arquivo.close()
+        for lista in listas.values():
+            lista.close()
+            if cancelado:
+                os.remove(lista.name)
+    logger.info("Manifestos mesclados", extra={"manifestos": len(manifestos), "listas": len(listas)})
+    return totais
+
+
+def ler_lista(caminho):
+    """Lê os itens de uma lista de exclusão gerada por mesclar"""
+    itens = []
+    with open(caminho, encoding="utf-8", errors="surrogateescape", newline="\n") as f:
+        for texto in f:
+            if texto.startswith("#") or not texto.strip():
+                continue
+            campos = texto.rstrip("\n").split("\t")
+            itens.append(ItemLista(_desescapar(campos[0]), int(campos[1]), campos[2]))
+    return itens
+
+
+def conferir(itens, max_workers=MAX_WORKERS_EXCLUSAO, cancelar=None, progresso=None):
+    """Confere, em paralelo, se cada arquivo da lista ainda tem o tamanho e o hash do manifesto
+
+    Retorna (caminhos conferidos, erros, cancelado), com `erros` como lista
+    de tuplas (caminho, mensagem).
+    """
+    def conferir_item(item):
+        try:
+            tamanho = os.path.getsize(item.caminho)
+        except OSError as e:
+            return e.strerror or str(e)
+        if tamanho != item.tamanho or calcular_hash_arquivo(item.caminho) != item.hash:
+            return "o arquivo mudou desde o manifesto"
+        return None
+
+    conferidos, erros, cancelado = executar_em_lotes(itens, conferir_item, max_workers, cancelar, progresso)
+    return [item.caminho for item in conferidos], [(item.caminho, mensagem) for item, mensagem in erros], cancelado
@@ -0,0 +1,435 @@
+"""Monitoramento de pastas: classifica os XMLs novos assim que chegam.
+
+No Linux, os eventos vêm do inotify (via ctypes, sem dependências): um
+arquivo é considerado pronto quando é fechado após a escrita
+(IN_CLOSE_WRITE) ou movido para a pasta (IN_MOVED_TO). Nos demais
+sistemas, ou se o inotify não estiver disponível, as pastas são relidas
+periodicamente e um arquivo só é considerado pronto quando tamanho e data
+não mudam entre duas leituras, para não pegar arquivos ainda sendo
+gravados. Cada arquivo novo é classificado pelas regras de sufixo em O(1)
+e os marcados podem ser movidos para a quarentena ou excluídos em lotes
+pequenos. A latência (da gravação do arquivo ao seu tratamento) e a vazão
+são acompanhadas e publicadas nas métricas.
+"""
+from collections import deque
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+from engine import NOME_QUARENTENA, EntradaXml, compilar_regras, excluir_arquivos
+from quarentena import mover_para_quarentena, novo_lote
+from telemetria import etapa, exportar_prometheus, metricas
+
+# O que fazer com os arquivos marcados
+ACAO_LISTAR = "listar"
+ACAO_QUARENTENA = "quarentena"
+ACAO_EXCLUIR = "excluir"
+ACOES_MONITOR = (ACAO_LISTAR, ACAO_QUARENTENA, ACAO_EXCLUIR)
+
+# Segundos entre as leituras das pastas no modo de leitura periódica e
+# leituras entre as releituras completas (mesmo sem mudança na data da
+# pasta, que alguns servidores de arquivos não atualizam)
+INTERVALO_POLLING = 2.0
+RELEITURA_COMPLETA = 30
+
+# Espera máxima (s) por eventos antes de verificar o cancelamento
+ESPERA_CANCELAMENTO = 0.5
+
+# Janela (s) em que eventos seguidos do inotify são juntados em um lote
+ESPERA_EVENTOS = 0.2
+
+# Segundos entre os relatórios de latência e vazão e amostras de latência
+# mantidas para os percentis
+INTERVALO_RELATORIO = 5.0
+AMOSTRAS_LATENCIA = 1000
+
+# Constantes do inotify (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+MASCARA_INOTIFY = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+CABECALHO_EVENTO = struct.Struct("iIII")
+TAMANHO_LEITURA = 64 * 1024
+
+logger = logging.getLogger("exclusao_xml.monitor")
+
+
+def _eh_xml(nome):
+    """Mesmo critério da varredura: .xml não oculto"""
+    return not nome.startswith(".") and os.path.normcase(nome).endswith(".xml")
+
+
+def _subpastas(pasta):
+    """Pasta e todas as subpastas, sem seguir links e sem a quarentena"""
+    for atual, pastas, _ in os.walk(pasta):
+        pastas[:] = [nome for nome in pastas if nome != NOME_QUARENTENA]
+        yield atual
+
+
+class FonteInotify:
+    """Eventos de arquivos fechados ou movidos para as pastas, lidos do inotify"""
+
+    nome = "inotify"
+
+    def __init__(self, pastas, recursivo=False):
+        self.recursivo = recursivo
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            numero = ctypes.get_errno()
+            raise OSError(numero, os.strerror(numero))
+        self.pastas_wd = {}
+        self._ultimo_lote_ns = time.time_ns()
+        try:
+            for raiz in pastas:
+                for pasta in (_subpastas(raiz) if recursivo else [raiz]):
+                    self._observar(pasta)
+        except OSError:
+            self.fechar()
+            raise
+
+    def _observar(self, pasta):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(pasta), MASCARA_INOTIFY)
+        if wd < 0:
+            # ENOSPC: limite de fs.inotify.max_user_watches atingido
+            numero = ctypes.get_errno()
+            raise OSError(numero, os.strerror(numero), pasta)
+        self.pastas_wd[wd] = pasta
+
+    def aguardar(self, timeout):
+        """Espera até `timeout` segundos e retorna os caminhos dos XMLs prontos"""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        # Eventos que chegam em sequência (cópia de vários arquivos) vão no mesmo lote
+        caminhos = {}
+        fim = time.monotonic() + ESPERA_EVENTOS
+        while True:
+            try:
+                self._processar(os.read(self.fd, TAMANHO_LEITURA), caminhos)
+            except BlockingIOError:
+                pass
+            restante = fim - time.monotonic()
+            if restante <= 0 or not select.select([self.fd], [], [], restante)[0]:
+                break
+        self._ultimo_lote_ns = time.time_ns()
+        return list(caminhos)
+
+    def _processar(self, dados, caminhos):
+        posicao = 0
+        while posicao < len(dados):
+            wd, mascara, _, tamanho = CABECALHO_EVENTO.unpack_from(dados, posicao)
+            nome = os.fsdecode(dados[posicao + CABECALHO_EVENTO.size:posicao + CABECALHO_EVENTO.size + tamanho].rstrip(b"\0"))
+            posicao += CABECALHO_EVENTO.size + tamanho
+
+            if mascara & IN_Q_OVERFLOW:
+                logger.warning("Fila do inotify cheia; relendo as pastas monitoradas")
+                self._reler(caminhos)
+                continue
+            if mascara & IN_IGNORED:
+                self.pastas_wd.pop(wd, None)
+                continue
+            pasta = self.pastas_wd.get(wd)
+            if pasta is None:
+                continue
+            caminho = os.path.join(pasta, nome)
+            if mascara & IN_ISDIR:
+                if self.recursivo and nome != NOME_QUARENTENA:
+                    self._nova_pasta(caminho, caminhos)
+            elif mascara & (IN_CLOSE_WRITE | IN_MOVED_TO) and _eh_xml(nome):
+                caminhos[caminho] = None
+
+    def _nova_pasta(self, caminho, caminhos):
+        """Observa uma subpasta criada ou movida e inclui os XMLs que chegaram antes da observação"""
+        try:
+            for pasta in _subpastas(caminho):
+                self._observar(pasta)
+                with os.scandir(pasta) as entradas:
+                    for entrada in entradas:
+                        if _eh_xml(entrada.name) and entrada.is_file():
+                            caminhos[entrada.path] = None
+        except OSError as e:
+            logger.warning(f"Não foi possível observar a pasta {caminho}: {e}", extra={"pasta": caminho})
+
+    def _reler(self, caminhos):
+        """Após eventos perdidos, inclui os XMLs modificados desde o último lote (com folga de 2 s)"""
+        desde = self._ultimo_lote_ns - 2_000_000_000
+        for pasta in list(self.pastas_wd.values()):
+            try:
+                with os.scandir(pasta) as entradas:
+                    for entrada in entradas:
+                        if _eh_xml(entrada.name) and entrada.is_file() and entrada.stat().st_mtime_ns >= desde:
+                            caminhos[entrada.path] = None
+            except OSError:
+                continue
+
+    def fechar(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class FontePolling:
+    """Leitura periódica das pastas; um XML fica pronto quando tamanho e data se repetem em duas leituras
+
+    Pastas cuja data de modificação não mudou e que não têm arquivos
+    aguardando estabilizar não são listadas de novo, exceto a cada
+    RELEITURA_COMPLETA leituras.
+    """
+
+    nome = "polling"
+
+    def __init__(self, pastas, recursivo=False, intervalo=INTERVALO_POLLING, cancelar=None):
+        self.recursivo = recursivo
+        self.intervalo = intervalo
+        self.cancelar = cancelar or threading.Event()
+        # pasta -> nomes já conhecidos, data da pasta e {nome: (tamanho, data)} aguardando
+        self.conhecidos = {}
+        self.datas = {}
+        self.aguardando = {}
+        self.leituras = 0
+        self._proxima = time.monotonic() + intervalo
+        for raiz in pastas:
+            for pasta in (_subpastas(raiz) if recursivo else [raiz]):
+                # O que já existe ao iniciar não é tratado como novo
+                self.conhecidos[pasta] = set(self._listar(pasta)[1])
+
+    def _listar(self, pasta):
+        """Retorna (subpastas, {nome: (tamanho, mtime_ns)}) dos XMLs da pasta"""
+        subpastas = []
+        arquivos = {}
+        with os.scandir(pasta) as entradas:
+            for entrada in entradas:
+                try:
+                    if entrada.is_dir(follow_symlinks=False):
+                        if entrada.name != NOME_QUARENTENA:
+                            subpastas.append(entrada.path)
+                    elif _eh_xml(entrada.name) and entrada.is_file():
+                        info = entrada.stat()
+                        arquivos[entrada.name] = (info.st_size, info.st_mtime_ns)
+                except OSError:
+                    continue
+        return subpastas, arquivos
+
+    def aguardar(self, timeout):
+        """Espera até `timeout` segundos e retorna os caminhos dos XMLs prontos"""
+        espera = self._proxima - time.monotonic()
+        if espera > timeout:
+            self.cancelar.wait(timeout)
+            return []
+        if espera > 0 and self.cancelar.wait(espera):
+            return []
+        self._proxima = time.monotonic() + self.intervalo
+        self.leituras += 1
+        completa = self.leituras % RELEITURA_COMPLETA == 0
+
+        prontos = []
+        pendentes = list(self.conhecidos)
+        while pendentes:
+            pasta = pendentes.pop()
+            try:
+                data = os.stat(pasta).st_mtime_ns
+                if data == self.datas.get(pasta) and not self.aguardando.get(pasta) and not completa:
+                    continue
+                subpastas, arquivos = self._listar(pasta)
+            except OSError:
+                # Pasta removida
+                self.conhecidos.pop(pasta)
+                self.datas.pop(pasta, None)
+                self.aguardando.pop(pasta, None)
+                continue
+            self.datas[pasta] = data
+
+            conhecidos = self.conhecidos[pasta]
+            conhecidos.intersection_update(arquivos)
+            anteriores = self.aguardando.get(pasta, {})
+            aguardando = {}
+            for nome, assinatura in arquivos.items():
+                if nome in conhecidos:
+                    continue
+                if anteriores.get(nome) == assinatura:
+                    conhecidos.add(nome)
+                    prontos.append(os.path.join(pasta, nome))
+                else:
+                    aguardando[nome] = assinatura
+            self.aguardando[pasta] = aguardando
+
+            if self.recursivo:
+                for subpasta in subpastas:
+                    if subpasta not in self.conhecidos:
+                        # Os arquivos de uma subpasta nova são novos; ela é lida já nesta passagem
+                        self.conhecidos[subpasta] = set()
+                        pendentes.append(subpasta)
+        return prontos
+
+    def fechar(self):
+        pass
+
+
+class EstatisticasMonitor:
+    """Contagens, latência (gravação do arquivo até o tratamento) e vazão do monitoramento"""
+
+    def __init__(self):
+        self.inicio = time.monotonic()
+        self.vistos = 0
+        self.marcados = 0
+        self.tratados = 0
+        self.erros = 0
+        self.ocupado = 0.0
+        self.latencias = deque(maxlen=AMOSTRAS_LATENCIA)
+
+    def registrar_latencia(self, mtime_ns):
+        # Relógios diferentes entre o servidor de arquivos e esta máquina
+        # podem dar valores negativos
+        self.latencias.append(max(0.0, time.time() - mtime_ns / 1e9))
+
+    def resumo(self):
+        ordenadas = sorted(self.latencias)
+
+        def percentil(fracao):
+            return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * fracao))] if ordenadas else 0.0
+
+        return {
+            "segundos": time.monotonic() - self.inicio,
+            "vistos": self.vistos,
+            "marcados": self.marcados,
+            "tratados": self.tratados,
+            "erros": self.erros,
+            "arquivos_por_segundo": self.vistos / self.ocupado if self.ocupado > 0 else 0.0,
+            "latencia_p50_s": percentil(0.5),
+            "latencia_p95_s": percentil(0.95),
+            "latencia_max_s": ordenadas[-1] if ordenadas else 0.0,
+        }
+
+
+def abrir_fonte(pastas, recursivo=False, polling=False, intervalo=INTERVALO_POLLING, cancelar=None):
+    """Usa o inotify no Linux e, sem ele (ou com `polling`), a leitura periódica"""
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return FonteInotify(pastas, recursivo)
+        except (OSError, AttributeError) as e:
+            logger.warning(f"inotify indisponível ({e}); usando leitura periódica das pastas")
+    return FontePolling(pastas, recursivo, intervalo, cancelar)
+
+
+class Monitor:
+    """Observa as pastas até `cancelar` ser acionado, classificando cada XML novo
+
+    `obter_regras()` é chamado a cada ciclo e deve ser barato (como
+    engine.carregar_sufixos, que só relê o arquivo alterado), para que
+    mudanças nas regras valham sem reiniciar. `notificar(tipo, *dados)`
+    recebe "monitor_inicio" (nome da fonte), "monitor_arquivo" (caminho,
+    regra e ação de cada marcado) e "monitor" (resumo das estatísticas).
+    """
+
+    def __init__(self, pastas, obter_regras, recursivo=False, acao=ACAO_LISTAR, cancelar=None, notificar=None,
+                 polling=False, intervalo=INTERVALO_POLLING, arquivo_metricas=None):
+        if acao not in ACOES_MONITOR:
+            raise ValueError(f"Ação de monitoramento inválida: {acao}")
+        self.pastas = list(pastas)
+        self.obter_regras = obter_regras
+        self.recursivo = recursivo
+        self.acao = acao
+        self.cancelar = cancelar or threading.Event()
+        self.notificar = notificar or (lambda *evento: None)
+        self.polling = polling
+        self.intervalo = intervalo
+        self.arquivo_metricas = arquivo_metricas
+        # Um único lote de quarentena por sessão, restaurável de uma vez
+        self.lote = novo_lote() if acao == ACAO_QUARENTENA else None
+        self.estatisticas = EstatisticasMonitor()
+        self._marcados = []
+
+    def executar(self):
+        """Laço do monitoramento; retorna as estatísticas ao ser cancelado"""
+        fonte = abrir_fonte(self.pastas, self.recursivo, self.polling, self.intervalo, self.cancelar)
+        logger.info(
+            "Monitoramento iniciado",
+            extra={"pastas": self.pastas, "fonte": fonte.nome, "acao": self.acao, "lote": self.lote}
+        )
+        self.notificar("monitor_inicio", fonte.nome)
+        proximo_relatorio = time.monotonic() + INTERVALO_RELATORIO
+        try:
+            while not self.cancelar.is_set():
+                caminhos = fonte.aguardar(ESPERA_CANCELAMENTO)
+                if caminhos:
+                    # Cada retorno da fonte já é um lote (eventos de uma janela
+                    # de ESPERA_EVENTOS ou de uma leitura das pastas)
+                    self.classificar(caminhos)
+                    if self._marcados:
+                        self.tratar_marcados()
+                if time.monotonic() >= proximo_relatorio:
+                    self.relatar()
+                    proximo_relatorio = time.monotonic() + INTERVALO_RELATORIO
+        finally:
+            fonte.fechar()
+            self.relatar()
+            logger.info("Monitoramento encerrado", extra=self.estatisticas.resumo())
+        return self.estatisticas
+
+    def classificar(self, caminhos):
+        """Classifica os caminhos prontos pelas regras de sufixo (uma consulta por nome)"""
+        inicio = time.perf_counter()
+        regras = compilar_regras(tuple(self.obter_regras()))
+        for caminho in caminhos:
+            try:
+                info = os.stat(caminho)
+            except OSError:
+                # Removido ou movido antes de ser classificado
+                continue
+            pasta, nome = os.path.split(caminho)
+            entrada = EntradaXml(caminho, nome, info.st_size, info.st_mtime_ns, pasta)
+            self.estatisticas.vistos += 1
+            regra = regras.corresponde(nome)
+            if regra is None:
+                self.estatisticas.registrar_latencia(entrada.mtime_ns)
+                continue
+            self.estatisticas.marcados += 1
+            self._marcados.append((entrada, regra))
+            if self.acao == ACAO_LISTAR:
+                self.estatisticas.registrar_latencia(entrada.mtime_ns)
+        metricas.incrementar("monitor_arquivos_vistos", len(caminhos))
+        self.estatisticas.ocupado += time.perf_counter() - inicio
+
+    def tratar_marcados(self):
+        """Aplica a ação configurada aos marcados da última classificação"""
+        inicio = time.perf_counter()
+        marcados, self._marcados = self._marcados, []
+        metricas.incrementar("monitor_arquivos_marcados", len(marcados))
+        caminhos = [entrada.caminho for entrada, _ in marcados]
+        with etapa("monitor_lote", arquivos=len(marcados), acao=self.acao):
+            if self.acao == ACAO_QUARENTENA:
+                feitos, erros, _ = mover_para_quarentena(caminhos, self.pastas, self.lote)
+            elif self.acao == ACAO_EXCLUIR:
+                tamanhos = {entrada.caminho: entrada.tamanho for entrada, _ in marcados}
+                feitos, erros, _ = excluir_arquivos(caminhos, tamanho=tamanhos.get)
+            else:
+                feitos, erros = caminhos, []
+
+        falhas = {caminho for caminho, _ in erros}
+        for entrada, regra in marcados:
+            if self.acao != ACAO_LISTAR:
+                self.estatisticas.registrar_latencia(entrada.mtime_ns)
+            self.notificar("monitor_arquivo", entrada.caminho, regra, "erro" if entrada.caminho in falhas else self.acao)
+        self.estatisticas.tratados += len(feitos)
+        self.estatisticas.erros += len(erros)
+        self.estatisticas.ocupado += time.perf_counter() - inicio
+
+    def relatar(self):
+        """Publica o resumo das estatísticas nas métricas, no log e para quem chamou"""
+        resumo = self.estatisticas.resumo()
+        metricas.definir("monitor_latencia_p50_segundos", resumo["latencia_p50_s"])
+        metricas.definir("monitor_latencia_p95_segundos", resumo["latencia_p95_s"])
+        metricas.definir("monitor_vazao_arquivos_por_segundo", resumo["arquivos_por_segundo"])
+        exportar_prometheus(self.arquivo_metricas)
+        self.notificar("monitor", resumo)
@@ -0,0 +1,178 @@
+"""Filtro, ordenação e paginação da lista de resultados.
+
+Separado da interface para que a lógica da lista possa ser usada (e
+medida nos benchmarks) sem Tk nem customtkinter instalados.
+"""
+from array import array
+
+from engine import (
+    ROTULOS_STATUS,
+    STATUS_CANONICO,
+    STATUS_CONTEUDO,
+    STATUS_FISCAL,
+    STATUS_MANTER,
+    STATUS_REMOVIDO,
+    STATUS_REPETIDO,
+    STATUS_SUFIXO,
+    STATUS_VINCULADO,
+    RegistrosXml,
+    ResultadoAnalise,
+)
+
+# Linhas materializadas por página na lista de resultados
+TAMANHO_PAGINA = 200
+
+
+class PaginacaoResultados:
+    """Filtro, ordenação e paginação da lista de resultados, sem dependência de interface
+
+    As subclasses criam `tree` (com a interface de ttk.Treeview), `pagina_label`,
+    `anterior_button` e `proxima_button` antes de chamar renderizar().
+    """
+
+    COLUNAS = (
+        ("status", "Situação", 190),
+        ("nome", "Arquivo", 420),
+        ("pasta", "Pasta", 280),
+        ("tamanho", "Tamanho (bytes)", 110),
+    )
+
+    FILTROS = {
+        "Todos": None,
+        "Para exclusão": {STATUS_SUFIXO, STATUS_REPETIDO, STATUS_FISCAL, STATUS_CONTEUDO, STATUS_CANONICO},
+        "Sufixo cadastrado": {STATUS_SUFIXO},
+        "Repetidos em outra pasta": {STATUS_REPETIDO},
+        "Mesmo documento fiscal": {STATUS_FISCAL},
+        "Conteúdo idêntico": {STATUS_CONTEUDO},
+        "XML equivalente": {STATUS_CANONICO},
+        "Links para o original": {STATUS_VINCULADO},
+        "Mantidos": {STATUS_MANTER},
+    }
+
+    def __init__(self, tamanho_pagina=TAMANHO_PAGINA):
+        self.tamanho_pagina = tamanho_pagina
+        self.entradas = RegistrosXml()
+        self.status = bytearray()
+        self.indices = array("I")
+        self.removidos_visiveis = 0
+        self.pagina = 0
+        self.filtro = None
+        self.coluna_ordem = "nome"
+        self.ordem_reversa = False
+
+    def carregar(self, resultado):
+        """Exibe um ResultadoAnalise, voltando para a primeira página"""
+        self.entradas = resultado.entradas
+        self.status = resultado.status
+        self.aplicar()
+
+    def limpar(self):
+        """Remove todos os resultados"""
+        self.carregar(ResultadoAnalise())
+
+    def remover(self, removidos):
+        """Retira as linhas removidas do resultado, em O(removidos)
+
+        Recebe os pares (índice, situação anterior) de ResultadoAnalise.remover.
+        Apenas os itens da página atual são apagados do Treeview; a lista de
+        índices é compactada na próxima troca de página, filtro ou ordenação.
+        """
+        for i, anterior in removidos:
+            iid = str(i)
+            if self.tree.exists(iid):
+                self.tree.delete(iid)
+            if self.filtro is None or anterior in self.filtro:
+                self.removidos_visiveis += 1
+        self.atualizar_rotulo_pagina()
+
+    def chave_ordenacao(self, coluna):
+        """Retorna a função de ordenação por índice para a coluna informada, ou None para o nome
+
+        Exceto pelo tamanho, os índices partem da ordem dos nomes (calculada
+        uma vez por resultado) e a ordenação estável por uma chave inteira
+        mantém os nomes em ordem dentro de cada situação ou pasta.
+        """
+        entradas = self.entradas
+        if coluna == "status":
+            return self.status.__getitem__
+        if coluna == "tamanho":
+            return entradas.tamanhos.__getitem__
+        if coluna == "pasta":
+            pastas, id_pasta = entradas.ordem_pastas(), entradas.id_pasta
+            return lambda i: pastas[id_pasta[i]]
+        return None
+
+    def aplicar(self):
+        """Recalcula os índices visíveis (filtro e ordenação) sem copiar as entradas"""
+        chave = self.chave_ordenacao(self.coluna_ordem)
+        ordem = range(len(self.entradas)) if self.coluna_ordem == "tamanho" else self.entradas.ordem_nomes()
+        status = self.status
+        if self.filtro is None:
+            indices = [i for i in ordem if status[i] != STATUS_REMOVIDO]
+        else:
+            indices = [i for i in ordem if status[i] in self.filtro]
+        if chave is not None:
+            indices.sort(key=chave)
+        if self.ordem_reversa:
+            indices.reverse()
+        self.indices = array("I", indices)
+        self.removidos_visiveis = 0
+        self.pagina = 0
+        self.renderizar()
+
+    def total_paginas(self):
+        return max(1, -(-len(self.indices) // self.tamanho_pagina))
+
+    def renderizar(self):
+        """Materializa no Treeview apenas as linhas da página atual"""
+        if self.removidos_visiveis:
+            # Compactação adiada das linhas excluídas desde a última renderização
+            self.indices = array("I", (i for i in self.indices if self.status[i] != STATUS_REMOVIDO))
+            self.removidos_visiveis = 0
+            self.pagina = min(self.pagina, self.total_paginas() - 1)
+
+        self.tree.delete(*self.tree.get_children())
+        inicio = self.pagina * self.tamanho_pagina
+        for i in self.indices[inicio:inicio + self.tamanho_pagina]:
+            entrada = self.entradas[i]
+            self.tree.insert(
+                "",
+                "end",
+                iid=str(i),
+                values=(ROTULOS_STATUS[self.status[i]], entrada.nome, entrada.pasta, entrada.tamanho)
+            )
+
+        self.atualizar_rotulo_pagina()
+
+    def atualizar_rotulo_pagina(self):
+        """Atualiza o indicador de página e o estado dos botões de navegação"""
+        total = len(self.indices) - self.removidos_visiveis
+        self.pagina_label.configure(
+            text=f"Página {self.pagina + 1} de {self.total_paginas()} ({total} arquivos)"
+        )
+        self.anterior_button.configure(state="normal" if self.pagina > 0 else "disabled")
+        self.proxima_button.configure(state="normal" if self.pagina + 1 < self.total_paginas() else "disabled")
+
+    def ordenar(self, coluna):
+        """Ordena pela coluna clicada; um novo clique inverte a ordem"""
+        if coluna == self.coluna_ordem:
+            self.ordem_reversa = not self.ordem_reversa
+        else:
+            self.coluna_ordem = coluna
+            self.ordem_reversa = False
+        self.aplicar()
+
+    def filtrar(self, escolha):
+        """Filtra as linhas pela situação escolhida no menu"""
+        self.filtro = self.FILTROS[escolha]
+        self.aplicar()
+
+    def pagina_anterior(self):
+        if self.pagina > 0:
+            self.pagina -= 1
+            self.renderizar()
+
+    def proxima_pagina(self):
+        if self.pagina + 1 < self.total_paginas():
+            self.pagina += 1
+            self.renderizar()
@@ -0,0 +1,278 @@
+"""Quarentena: move os arquivos marcados para uma pasta datada em vez de excluí-los.
+
+Cada arquivo é movido com os.rename para
+`<pasta analisada>/_quarentena_xml/<lote>/<caminho relativo>`. Como a
+quarentena fica no mesmo sistema de arquivos, cada movimentação é O(1) e
+não copia dados. Antes de cada lote de movimentações, os pares origem e
+destino são acrescentados ao diário do lote (diario.jsonl) e gravados em
+disco de uma só vez. A restauração relê o diário e desfaz as
+movimentações em paralelo; pode ser repetida sem efeito colateral se for
+interrompida.
+
+Para tirar membros de um ZIP, o ZIP original é movido para a quarentena e
+a versão sem os membros é gravada no caminho original; a restauração
+devolve o original por cima dela.
+"""
+import errno
+import json
+import logging
+import os
+import threading
+import time
+
+from engine import MAX_WORKERS_EXCLUSAO, NOME_QUARENTENA, executar_em_lotes, reescrever_compactados
+from telemetria import etapa, metricas
+
+ARQUIVO_DIARIO = "diario.jsonl"
+
+# Nome de cada lote: data e hora da movimentação
+FORMATO_LOTE = "%Y%m%d_%H%M%S"
+
+logger = logging.getLogger("exclusao_xml.quarentena")
+
+
+def novo_lote():
+    """Nome para um novo lote de quarentena"""
+    return time.strftime(FORMATO_LOTE)
+
+
+def pasta_quarentena(raiz):
+    return os.path.join(raiz, NOME_QUARENTENA)
+
+
+def listar_lotes(raiz):
+    """Pastas dos lotes na quarentena da pasta analisada, do mais antigo ao mais recente"""
+    pasta = pasta_quarentena(raiz)
+    try:
+        nomes = sorted(os.listdir(pasta))
+    except OSError:
+        return []
+    return [
+        os.path.join(pasta, nome) for nome in nomes
+        if os.path.isfile(os.path.join(pasta, nome, ARQUIVO_DIARIO))
+    ]
+
+
+def planejar(caminhos, raizes, lote):
+    """Retorna tuplas (origem, destino, pasta do lote) para cada caminho
+
+    O destino fica na quarentena da pasta analisada mais interna que contém
+    o arquivo (ou, se nenhuma o contém, na da própria pasta do arquivo),
+    preservando o caminho relativo para que nomes iguais em subpastas
+    diferentes não colidam.
+    """
+    raizes = sorted({os.path.abspath(raiz) for raiz in raizes}, key=len, reverse=True)
+    prefixos = [(os.path.join(os.path.normcase(raiz), ""), raiz) for raiz in raizes]
+    itens = []
+    for caminho in caminhos:
+        absoluto = os.path.abspath(caminho)
+        normalizado = os.path.normcase(absoluto)
+        raiz = next(
+            (raiz for prefixo, raiz in prefixos if normalizado.startswith(prefixo)),
+            os.path.dirname(absoluto)
+        )
+        pasta_lote = os.path.join(pasta_quarentena(raiz), lote)
+        itens.append((caminho, os.path.join(pasta_lote, os.path.relpath(absoluto, raiz)), pasta_lote))
+    return itens
+
+
+class Diario:
+    """Diário de um lote, aberto apenas para acréscimo
+
+    Cada chamada a `registrar` grava um bloco de linhas JSON e força a
+    escrita em disco (fsync), uma vez por lote de movimentações. Entradas
+    com "substituir" (ZIPs regravados) sobrescrevem, ao restaurar, o
+    arquivo que ficou no caminho original.
+    """
+
+    def __init__(self, pasta_lote):
+        os.makedirs(pasta_lote, exist_ok=True)
+        self.caminho = os.path.join(pasta_lote, ARQUIVO_DIARIO)
+        self._arquivo = open(self.caminho, "a", encoding="utf-8")
+
+    def registrar(self, pares, substituir=False):
+        extra = {"substituir": True} if substituir else {}
+        self._arquivo.write("".join(
+            json.dumps({"origem": origem, "destino": destino, **extra}, ensure_ascii=False) + "\n"
+            for origem, destino in pares
+        ))
+        self._arquivo.flush()
+        os.fsync(self._arquivo.fileno())
+
+    def fechar(self):
+        self._arquivo.close()
+
+
+def ler_diario(pasta_lote):
+    """Lê as tuplas (origem, destino, substituir) do diário do lote
+
+    Uma linha incompleta (interrupção durante a gravação) é ignorada; as
+    movimentações dela ainda não tinham começado.
+    """
+    pares = []
+    with open(os.path.join(pasta_lote, ARQUIVO_DIARIO), encoding="utf-8") as f:
+        for numero, linha in enumerate(f, 1):
+            try:
+                registro = json.loads(linha)
+                pares.append((registro["origem"], registro["destino"], registro.get("substituir", False)))
+            except (ValueError, KeyError):
+                logger.warning(f"Linha {numero} inválida no diário de {pasta_lote}", extra={"lote": pasta_lote})
+    return pares
+
+
+def _mensagem(erro):
+    if erro.errno == errno.EXDEV:
+        return "a quarentena está em outro sistema de arquivos"
+    return erro.strerror or str(erro)
+
+
+def mover_para_quarentena(caminhos, raizes, lote=None, max_workers=MAX_WORKERS_EXCLUSAO, cancelar=None,
+                          progresso=None, substituir=False):
+    """Move os arquivos para a quarentena das pastas analisadas, em lotes canceláveis
+
+    Mesmo contrato de engine.excluir_arquivos: retorna (movidos, erros,
+    cancelado), com `erros` como lista de tuplas (caminho, mensagem). Um
+    arquivo só é movido depois que o seu par origem/destino está no diário
+    (marcado com `substituir`, se informado).
+    """
+    lote = lote or novo_lote()
+    itens = planejar(caminhos, raizes, lote)
+    diarios = {}
+    pastas_criadas = set()
+    trava = threading.Lock()
+
+    def preparar(lote_itens):
+        por_lote = {}
+        for origem, destino, pasta_lote in lote_itens:
+            # Caminhos absolutos, para restaurar a partir de qualquer pasta de trabalho
+            por_lote.setdefault(pasta_lote, []).append((os.path.abspath(origem), destino))
+        for pasta_lote, pares in por_lote.items():
+            if pasta_lote not in diarios:
+                diarios[pasta_lote] = Diario(pasta_lote)
+            diarios[pasta_lote].registrar(pares, substituir)
+
+    def mover(item):
+        origem, destino, _ = item
+        pasta = os.path.dirname(destino)
+        try:
+            with trava:
+                criada = pasta in pastas_criadas
+            if not criada:
+                os.makedirs(pasta, exist_ok=True)
+                with trava:
+                    pastas_criadas.add(pasta)
+            # No POSIX, os.rename substituiria um arquivo já existente no destino
+            if os.path.lexists(destino):
+                return "já existe um arquivo com este caminho na quarentena"
+            os.rename(origem, destino)
+        except OSError as e:
+            return _mensagem(e)
+        return None
+
+    try:
+        with etapa("quarentena", arquivos=len(itens)):
+            movidos, erros, cancelado = executar_em_lotes(itens, mover, max_workers, cancelar, progresso, preparar)
+    finally:
+        for diario in diarios.values():
+            diario.fechar()
+
+    movidos = [origem for origem, _, _ in movidos]
+    erros = [(origem, mensagem) for (origem, _, _), mensagem in erros]
+    for caminho, erro in erros:
+        logger.warning(f"Erro ao mover {caminho} para a quarentena: {erro}", extra={"caminho": caminho})
+    metricas.incrementar("arquivos_quarentena", len(movidos))
+    metricas.incrementar("falhas_exclusao", len(erros))
+    logger.info(
+        "Quarentena concluída",
+        extra={"lote": lote, "movidos": len(movidos), "erros": len(erros), "cancelado": cancelado}
+    )
+    return movidos, erros, cancelado
+
+
+def _restaurar(item):
+    origem, destino, substituir = item
+    try:
+        if substituir and os.path.lexists(destino):
+            # ZIP regravado no caminho original: o original volta por cima
+            os.replace(destino, origem)
+            return None
+        if os.path.lexists(origem):
+            # Sem o arquivo na quarentena, ele já foi restaurado antes
+            if os.path.lexists(destino):
+                return "já existe um arquivo no caminho original"
+            return None
+        os.makedirs(os.path.dirname(origem), exist_ok=True)
+        os.rename(destino, origem)
+    except OSError as e:
+        return _mensagem(e)
+    return None
+
+
+def _apagar_lote(pasta_lote):
+    """Remove o diário e as pastas vazias do lote restaurado (e a quarentena, se ficar vazia)"""
+    try:
+        os.remove(os.path.join(pasta_lote, ARQUIVO_DIARIO))
+        for pasta, _, _ in os.walk(pasta_lote, topdown=False):
+            os.rmdir(pasta)
+        os.rmdir(os.path.dirname(pasta_lote))
+    except OSError:
+        # Arquivos que sobraram no lote ou outros lotes na quarentena
+        pass
+
+
+def restaurar_lote(pasta_lote, max_workers=MAX_WORKERS_EXCLUSAO, cancelar=None, progresso=None):
+    """Devolve os arquivos de um lote ao caminho original, seguindo o diário em paralelo
+
+    Retorna (restaurados, erros, cancelado), com `erros` como lista de
+    tuplas (caminho original, mensagem). Um arquivo que já existe no
+    caminho original não é sobrescrito. Quando tudo é restaurado, o lote é
+    apagado; caso contrário, uma nova restauração retoma de onde parou.
+    """
+    pares = ler_diario(pasta_lote)
+    with etapa("restauracao", arquivos=len(pares)):
+        restaurados, erros, cancelado = executar_em_lotes(pares, _restaurar, max_workers, cancelar, progresso)
+
+    restaurados = [origem for origem, _, _ in restaurados]
+    erros = [(origem, mensagem) for (origem, _, _), mensagem in erros]
+    for caminho, erro in erros:
+        logger.warning(f"Erro ao restaurar {caminho}: {erro}", extra={"caminho": caminho})
+    if not erros and not cancelado:
+        _apagar_lote(pasta_lote)
+    metricas.incrementar("arquivos_restaurados", len(restaurados))
+    logger.info(
+        "Restauração concluída",
+        extra={"lote": pasta_lote, "restaurados": len(restaurados), "erros": len(erros), "cancelado": cancelado}
+    )
+    return restaurados, erros, cancelado
+
+
+def mover_compactados_para_quarentena(por_zip, raizes, lote, max_workers=None, cancelar=None, progresso=None):
+    """Tira os membros marcados dos ZIPs, guardando os ZIPs originais na quarentena
+
+    `por_zip` segue ResultadoAnalise.separar_compactados. Cada ZIP original
+    é movido para o lote (O(1), com "substituir" no diário) e a versão sem
+    os membros é gravada no caminho original a partir da cópia movida, em
+    uma só passagem. Se a regravação falhar ou for cancelada, o original
+    volta ao lugar. Mesmo retorno de engine.reescrever_compactados.
+    """
+    zips = list(por_zip)
+    destinos = {origem: destino for origem, destino, _ in planejar(zips, raizes, lote)}
+    movidos, falhas, cancelado = mover_para_quarentena(zips, raizes, lote, cancelar=cancelar, substituir=True)
+    erros = [(virtual, mensagem) for caminho, mensagem in falhas for virtual, _ in por_zip[caminho]]
+
+    excluidos, falhas, cancelado_reescrita = reescrever_compactados(
+        {caminho: por_zip[caminho] for caminho in movidos},
+        {caminho: destinos[caminho] for caminho in movidos},
+        max_workers,
+        cancelar,
+        progresso
+    )
+    erros += falhas
+    concluidos = set(excluidos)
+    for caminho in movidos:
+        if por_zip[caminho][0][0] not in concluidos:
+            try:
+                os.rename(destinos[caminho], caminho)
+            except OSError as e:
+                logger.error(f"Erro ao devolver {caminho} da quarentena: {_mensagem(e)}", extra={"caminho": caminho})
+    return excluidos, erros, cancelado or cancelado_reescrita
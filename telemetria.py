@@ -0,0 +1,319 @@
+"""Log estruturado, medição de etapas e contadores do processamento.
+
+O log é gravado em JSON, um registro por linha, em arquivos rotativos na
+pasta de dados do usuário. `etapa()` mede a duração de cada fase do
+processamento e `metricas` acumula contadores (arquivos vistos, marcados,
+excluídos, movidos para a quarentena, restaurados, trocados por links
+físicos, falhas e bytes recuperados), que podem ser exportados no formato de arquivo texto do
+Prometheus (textfile collector do node_exporter). `Perfil` executa um
+trecho sob cProfile e tracemalloc e grava os resultados ao lado do log.
+"""
+from collections import Counter
+from contextlib import contextmanager
+import cProfile
+import io
+import json
+import logging
+import logging.handlers
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+# Pasta e arquivo de log; ao atingir o tamanho máximo, o arquivo é
+# renomeado e até QUANTIDADE_LOGS arquivos antigos são mantidos
+NOME_LOG = "exclusao_xml.log"
+TAMANHO_MAXIMO_LOG = 5 * 1024 * 1024
+QUANTIDADE_LOGS = 5
+
+# Variável de ambiente com o arquivo .prom a ser gerado (opcional)
+VARIAVEL_PROMETHEUS = "EXCLUSAO_XML_PROMETHEUS"
+PREFIXO_METRICAS = "exclusao_xml"
+
+# Perfil de execução: quadros guardados por alocação e linhas de cada
+# seção do relatório
+QUADROS_ALOCACAO = 10
+LINHAS_RELATORIO = 30
+
+# Contadores acumulados e sua descrição na exportação
+CONTADORES = {
+    "arquivos_vistos": "Arquivos XML encontrados nas análises",
+    "arquivos_marcados": "Arquivos marcados para exclusão nas análises",
+    "arquivos_excluidos": "Arquivos excluídos",
+    "falhas_exclusao": "Arquivos que não puderam ser excluídos",
+    "bytes_recuperados": "Bytes liberados pela exclusão e pelos links físicos",
+    "arquivos_quarentena": "Arquivos movidos para a quarentena",
+    "arquivos_restaurados": "Arquivos restaurados da quarentena",
+    "arquivos_vinculados": "Cópias idênticas substituídas por links físicos para o original",
+    "monitor_arquivos_vistos": "XMLs novos vistos pelo monitoramento de pastas",
+    "monitor_arquivos_marcados": "XMLs novos marcados para exclusão pelo monitoramento",
+}
+
+# Medidas instantâneas (gauges) e sua descrição na exportação
+MEDIDAS = {
+    "monitor_latencia_p50_segundos": "Latência mediana entre a gravação de um XML e o seu tratamento pelo monitoramento",
+    "monitor_latencia_p95_segundos": "Percentil 95 da latência entre a gravação de um XML e o seu tratamento",
+    "monitor_vazao_arquivos_por_segundo": "Arquivos tratados por segundo de processamento no monitoramento",
+}
+
+# Campos padrão do LogRecord, que não são repetidos no JSON
+_CAMPOS_PADRAO = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+logger = logging.getLogger("exclusao_xml")
+_arquivo_log = None
+_perfis_ativos = []
+
+
+def pasta_dados():
+    """Pasta de dados do usuário (log, perfis), em LOCALAPPDATA ou ~/.cache"""
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "exclusao_xml_duplicados")
+
+
+def pasta_log():
+    return os.path.join(pasta_dados(), "logs")
+
+
+class FormatadorJson(logging.Formatter):
+    """Formata cada registro como um objeto JSON, incluindo os campos passados em `extra`"""
+
+    def format(self, record):
+        dados = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensagem": record.getMessage(),
+        }
+        for campo, valor in vars(record).items():
+            if campo not in _CAMPOS_PADRAO:
+                dados[campo] = valor
+        if record.exc_info:
+            dados["excecao"] = self.formatException(record.exc_info)
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+def configurar_log(caminho=None, nivel=logging.INFO):
+    """Configura o log rotativo em JSON; retorna o caminho do arquivo, ou None se não for possível
+
+    Sem arquivo de log (pasta sem permissão), os registros de aviso e erro
+    continuam indo para a saída de erro, como os antigos print().
+    """
+    global _arquivo_log
+    if logger.handlers:
+        return _arquivo_log
+    logger.setLevel(nivel)
+    logger.propagate = False
+
+    console = logging.StreamHandler()
+    console.setLevel(logging.WARNING)
+    console.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(console)
+
+    caminho = caminho or os.path.join(pasta_log(), NOME_LOG)
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        arquivo = logging.handlers.RotatingFileHandler(
+            caminho,
+            maxBytes=TAMANHO_MAXIMO_LOG,
+            backupCount=QUANTIDADE_LOGS,
+            encoding="utf-8",
+            delay=True
+        )
+    except OSError as e:
+        logger.warning(f"Não foi possível abrir o log {caminho}: {e}")
+        return None
+    arquivo.setFormatter(FormatadorJson())
+    logger.addHandler(arquivo)
+    _arquivo_log = caminho
+    return caminho
+
+
+def arquivo_log():
+    """Caminho do arquivo de log configurado, ou None"""
+    return _arquivo_log
+
+
+class Metricas:
+    """Contadores, medidas e durações acumulados no processo, seguros entre threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.contadores = Counter()
+        self.medidas = {}
+        # etapa -> [execuções, segundos acumulados, segundos da última execução]
+        self.etapas = {}
+
+    def incrementar(self, contador, valor=1):
+        with self._lock:
+            self.contadores[contador] += valor
+
+    def definir(self, medida, valor):
+        with self._lock:
+            self.medidas[medida] = valor
+
+    def registrar_etapa(self, nome, segundos):
+        with self._lock:
+            registro = self.etapas.setdefault(nome, [0, 0.0, 0.0])
+            registro[0] += 1
+            registro[1] += segundos
+            registro[2] = segundos
+
+    def texto_prometheus(self):
+        """Contadores e durações no formato de exposição em texto do Prometheus"""
+        with self._lock:
+            contadores = dict(self.contadores)
+            medidas = dict(self.medidas)
+            etapas = {nome: list(registro) for nome, registro in self.etapas.items()}
+
+        linhas = []
+        for contador, descricao in CONTADORES.items():
+            nome = f"{PREFIXO_METRICAS}_{contador}_total"
+            linhas += [
+                f"# HELP {nome} {descricao}",
+                f"# TYPE {nome} counter",
+                f"{nome} {contadores.get(contador, 0)}",
+            ]
+        for medida, descricao in MEDIDAS.items():
+            if medida in medidas:
+                nome = f"{PREFIXO_METRICAS}_{medida}"
+                linhas += [f"# HELP {nome} {descricao}", f"# TYPE {nome} gauge", f"{nome} {medidas[medida]:.6f}"]
+        if etapas:
+            nome = f"{PREFIXO_METRICAS}_etapa_segundos"
+            linhas += [f"# HELP {nome} Duração das etapas do processamento", f"# TYPE {nome} summary"]
+            for etapa, (execucoes, total, _) in sorted(etapas.items()):
+                linhas.append(f'{nome}_sum{{etapa="{etapa}"}} {total:.6f}')
+                linhas.append(f'{nome}_count{{etapa="{etapa}"}} {execucoes}')
+            nome = f"{PREFIXO_METRICAS}_etapa_ultima_segundos"
+            linhas += [f"# HELP {nome} Duração da última execução de cada etapa", f"# TYPE {nome} gauge"]
+            for etapa, (_, _, ultima) in sorted(etapas.items()):
+                linhas.append(f'{nome}{{etapa="{etapa}"}} {ultima:.6f}')
+        nome = f"{PREFIXO_METRICAS}_ultima_exportacao_timestamp_segundos"
+        linhas += [f"# TYPE {nome} gauge", f"{nome} {time.time():.0f}"]
+        return "\n".join(linhas) + "\n"
+
+
+metricas = Metricas()
+
+
+@contextmanager
+def etapa(nome, **campos):
+    """Mede a duração de uma etapa, acumulando-a nas métricas e registrando-a no log"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        segundos = time.perf_counter() - inicio
+        metricas.registrar_etapa(nome, segundos)
+        logger.info(f"Etapa {nome} concluída", extra={"etapa": nome, "duracao_s": round(segundos, 6), **campos})
+
+
+def exportar_prometheus(caminho=None):
+    """Grava as métricas no arquivo .prom informado (ou em $EXCLUSAO_XML_PROMETHEUS)
+
+    A gravação é atômica (arquivo temporário e os.replace), como exige o
+    textfile collector. Sem destino configurado, não faz nada.
+    """
+    caminho = caminho or os.environ.get(VARIAVEL_PROMETHEUS)
+    if not caminho:
+        return
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    try:
+        with open(temporario, "w", encoding="utf-8") as f:
+            f.write(metricas.texto_prometheus())
+        os.replace(temporario, caminho)
+    except OSError as e:
+        logger.warning(f"Não foi possível exportar as métricas para {caminho}: {e}")
+
+
+class Perfil:
+    """Executa um bloco sob cProfile e tracemalloc e grava o resultado ao lado do log
+
+    Ao sair do bloco são gravados `<nome>_<data>.pstats` (abrir com
+    `python -m pstats` ou snakeviz) e `<nome>_<data>_alocacoes.txt`, com o
+    pico de memória, as linhas que mais alocaram e as funções de maior
+    tempo acumulado. cProfile mede apenas a thread em que o bloco roda;
+    os caminhos gravados ficam em `arquivos`.
+    """
+
+    def __init__(self, nome, pasta=None):
+        self.nome = nome
+        self.pasta = pasta
+        self.arquivos = []
+        self._perfil = cProfile.Profile()
+        self._iniciou_tracemalloc = False
+        self._instantaneo = None
+        self._tamanho_instantaneo = -1
+
+    def __enter__(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(QUADROS_ALOCACAO)
+            self._iniciou_tracemalloc = True
+        tracemalloc.reset_peak()
+        _perfis_ativos.append(self)
+        self._inicio = time.perf_counter()
+        self._perfil.enable()
+        return self
+
+    def capturar(self):
+        """Guarda um instantâneo das alocações se houver mais memória em uso que no anterior"""
+        atual, _ = tracemalloc.get_traced_memory()
+        if atual > self._tamanho_instantaneo:
+            self._tamanho_instantaneo = atual
+            self._instantaneo = tracemalloc.take_snapshot()
+
+    def __exit__(self, *exc):
+        self._perfil.disable()
+        duracao = time.perf_counter() - self._inicio
+        _perfis_ativos.remove(self)
+        _, pico = tracemalloc.get_traced_memory()
+        self.capturar()
+        instantaneo = self._instantaneo.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+        if self._iniciou_tracemalloc:
+            tracemalloc.stop()
+
+        pasta = self.pasta or os.path.dirname(arquivo_log() or os.path.join(pasta_log(), NOME_LOG))
+        base = os.path.join(pasta, f"{self.nome}_{time.strftime('%Y%m%d_%H%M%S')}")
+        try:
+            os.makedirs(pasta, exist_ok=True)
+            self._perfil.dump_stats(base + ".pstats")
+            with open(base + "_alocacoes.txt", "w", encoding="utf-8") as f:
+                f.write(self.relatorio(duracao, pico, instantaneo))
+        except OSError as e:
+            logger.warning(f"Não foi possível gravar o perfil em {pasta}: {e}")
+            return False
+        self.arquivos = [base + ".pstats", base + "_alocacoes.txt"]
+        logger.info(
+            f"Perfil {self.nome} gravado",
+            extra={"perfil": self.nome, "duracao_s": round(duracao, 6), "pico_bytes": pico, "arquivos": self.arquivos}
+        )
+        return False
+
+    def relatorio(self, duracao, pico, instantaneo):
+        """Texto com o pico de memória, as maiores alocações e as funções mais custosas"""
+        linhas = [
+            f"Perfil: {self.nome}",
+            f"Duração: {duracao:.3f} s",
+            f"Pico de memória rastreada: {pico / (1024 * 1024):.1f} MB",
+            "",
+            f"Maiores alocações no instantâneo de maior uso (top {LINHAS_RELATORIO}):",
+        ]
+        for estatistica in instantaneo.statistics("lineno")[:LINHAS_RELATORIO]:
+            quadro = estatistica.traceback[0]
+            linhas.append(
+                f"{estatistica.size / 1024:10.1f} KiB {estatistica.count:8d} blocos  {quadro.filename}:{quadro.lineno}"
+            )
+
+        tempos = io.StringIO()
+        pstats.Stats(self._perfil, stream=tempos).sort_stats("cumulative").print_stats(LINHAS_RELATORIO)
+        linhas += ["", f"Funções por tempo acumulado (top {LINHAS_RELATORIO}):", tempos.getvalue()]
+        return "\n".join(linhas)
+
+
+def capturar_alocacoes():
+    """Marca um ponto de uso alto de memória para os perfis em andamento (sem perfil, não faz nada)"""
+    for perfil in list(_perfis_ativos):
+        perfil.capturar()
@@ -0,0 +1,99 @@
+"""Consolidação por links físicos: troca cada cópia idêntica por um link para o original.
+
+Para ferramentas que esperam encontrar todos os nomes de arquivo, a cópia
+não é excluída: o seu nome passa a apontar para os mesmos dados do
+arquivo mantido no grupo, e o espaço da cópia é liberado. Antes de cada
+troca, os dois arquivos são conferidos (mesmo sistema de arquivos, mesmo
+tamanho e mesmo BLAKE2b), já que podem ter mudado desde a análise. A
+troca é atômica: o link é criado com um nome temporário oculto na pasta
+da cópia e então renomeado por cima dela, então o nome nunca deixa de
+existir, nem fica apontando para um arquivo pela metade.
+"""
+import logging
+import os
+import threading
+
+from engine import MAX_WORKERS_EXCLUSAO, calcular_hash_arquivo, executar_em_lotes
+from telemetria import etapa, metricas
+
+logger = logging.getLogger("exclusao_xml.vinculos")
+
+
+def _temporario(caminho):
+    # Oculto (começa com "."), para não ser visto pela varredura
+    pasta, nome = os.path.split(caminho)
+    return os.path.join(pasta, f".{nome}.{os.getpid()}.{threading.get_ident()}.link")
+
+
+def consolidar(pares, max_workers=MAX_WORKERS_EXCLUSAO, cancelar=None, progresso=None):
+    """Troca cada cópia por um link físico para o original, em lotes paralelos e canceláveis
+
+    `pares` são tuplas (cópia, original), como em
+    ResultadoAnalise.pares_para_vincular. O hash de cada original é
+    calculado uma única vez, mesmo que ele tenha várias cópias. Uma cópia
+    que já é link para o original conta como vinculada, sem bytes
+    recuperados. Retorna (vinculados, erros, cancelado, bytes_recuperados),
+    com `erros` como lista de tuplas (cópia, mensagem); os bytes só contam
+    cópias que eram o último nome dos seus dados.
+    """
+    hashes_originais = {}
+    recuperados = [0]
+    trava = threading.Lock()
+
+    def hash_original(original):
+        with trava:
+            if original in hashes_originais:
+                return hashes_originais[original]
+        digest = calcular_hash_arquivo(original)
+        with trava:
+            hashes_originais[original] = digest
+        return digest
+
+    def vincular(par):
+        copia, original = par
+        try:
+            info_copia = os.stat(copia)
+            info_original = os.stat(original)
+        except OSError as e:
+            return e.strerror or str(e)
+        if info_copia.st_dev != info_original.st_dev:
+            return "o original está em outro sistema de arquivos"
+        if info_copia.st_ino == info_original.st_ino:
+            return None
+        if info_copia.st_size != info_original.st_size:
+            return "o arquivo mudou desde a análise"
+        digest = calcular_hash_arquivo(copia)
+        digest_original = hash_original(original)
+        if digest is None or digest_original is None:
+            return "não foi possível ler o arquivo para conferir o conteúdo"
+        if digest != digest_original:
+            return "o conteúdo é diferente do original"
+
+        temporario = _temporario(copia)
+        try:
+            os.link(original, temporario)
+            os.replace(temporario, copia)
+        except OSError as e:
+            if os.path.lexists(temporario):
+                os.remove(temporario)
+            return e.strerror or str(e)
+        if info_copia.st_nlink == 1:
+            with trava:
+                recuperados[0] += info_copia.st_size
+        return None
+
+    with etapa("vinculos", arquivos=len(pares)):
+        vinculados, erros, cancelado = executar_em_lotes(pares, vincular, max_workers, cancelar, progresso)
+
+    vinculados = [copia for copia, _ in vinculados]
+    erros = [(copia, mensagem) for (copia, _), mensagem in erros]
+    for caminho, erro in erros:
+        logger.warning(f"Erro ao trocar {caminho} por um link físico: {erro}", extra={"caminho": caminho})
+    metricas.incrementar("arquivos_vinculados", len(vinculados))
+    metricas.incrementar("falhas_exclusao", len(erros))
+    metricas.incrementar("bytes_recuperados", recuperados[0])
+    logger.info(
+        "Consolidação por links concluída",
+        extra={"vinculados": len(vinculados), "erros": len(erros), "bytes": recuperados[0], "cancelado": cancelado}
+    )
+    return vinculados, erros, cancelado, recuperados[0]